@@ -0,0 +1,1067 @@
+"""Benchmarks for the PDF processing code, run from the command line.
+
+    python benchmark.py export --pages 1000 --workers 1 2 4
+    python benchmark.py qimage --pages 50 --zoom 2
+    python benchmark.py viewport --pages 10 --dpi 600
+    python benchmark.py open --pages 10000
+    python benchmark.py profiles --pages 30 --dpi 300
+    python benchmark.py coldstart --runs 10
+    python benchmark.py boundaries --pages 1000 --workers 1 2 4
+    python benchmark.py writer --outputs 300 --folder /mnt/share/benchmark
+    python benchmark.py incremental --pages 1000 --workers 1 4
+    python benchmark.py nearduplicates --pages 500 --corpus-pages 1000000
+    python benchmark.py orientation --pages 300 --workers 1 4
+    python benchmark.py append --target-pages 100 1000 10000 --pages 3
+    python benchmark.py service --clients 8 --requests 4000 --max-documents 16 0
+
+The suite measures open time, get_page_image latency, get_page_text throughput,
+save_page_as_pdf and full export on synthetic text and scan documents of
+10 to 10000 pages, without Qt. Save a baseline, then compare later runs to it:
+
+    python benchmark.py suite --output baseline.json
+    python benchmark.py suite --baseline baseline.json --tolerance 0.1
+"""
+import argparse
+import filecmp
+import http.client
+import json
+import multiprocessing
+import os
+import platform
+import random
+import resource
+import shutil
+import statistics
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import urllib.parse
+
+import fitz  # PyMuPDF
+import numpy as np
+
+import export_engine
+import export_index
+import near_duplicates
+import output_writer
+import page_boundaries
+import page_orientation
+import split_service
+from document_cache import get_document_cache_dir
+from page_config_store import PageConfigStore
+from pdf_processor import DOC_TYPE_DICTIONARY, SAVE_PROFILES, PDFProcessor, snap_clip, write_output
+
+
+def make_text_pdf(path, pages):
+    """Write a synthetic PDF with a few lines of text on every page.
+
+    The file is written directly rather than through fitz so that documents of
+    tens of thousands of pages take about a second to build."""
+    offsets = []
+    body = bytearray(b"%PDF-1.7\n")
+
+    def add_object(content):
+        offsets.append(len(body))
+        body.extend(f"{len(offsets)} 0 obj\n".encode() + content + b"\nendobj\n")
+
+    # Objects 1-3: catalog, page tree and the font every page shares; pages start at 4.
+    kids = " ".join(f"{4 + 2 * page_number} 0 R" for page_number in range(pages))
+    add_object(b"<< /Type /Catalog /Pages 2 0 R >>")
+    add_object(f"<< /Type /Pages /Count {pages} /Kids [{kids}] >>".encode())
+    add_object(b"<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica >>")
+    for page_number in range(pages):
+        lines = " T* ".join(f"(Synthetic page {page_number + 1}, line {line + 1}) Tj" for line in range(20))
+        stream = f"BT /F1 11 Tf 14 TL 72 720 Td {lines} ET".encode()
+        add_object(f"<< /Type /Page /Parent 2 0 R /MediaBox [0 0 612 792] /Resources << /Font << /F1 3 0 R >> >> /Contents {5 + 2 * page_number} 0 R >>".encode())
+        add_object(f"<< /Length {len(stream)} >>\nstream\n".encode() + stream + b"\nendstream")
+
+    xref_offset = len(body)
+    body.extend(f"xref\n0 {len(offsets) + 1}\n0000000000 65535 f \n".encode())
+    body.extend(b"".join(f"{offset:010d} 00000 n \n".encode() for offset in offsets))
+    body.extend(f"trailer\n<< /Size {len(offsets) + 1} /Root 1 0 R >>\nstartxref\n{xref_offset}\n%%EOF\n".encode())
+    with open(path, "wb") as pdf_file:
+        pdf_file.write(body)
+
+
+def make_scan_pdf(path, pages, dpi=300, noise=False, distinct_images=None):
+    """Write a synthetic scanned PDF: one full-page grayscale image per page at the given dpi.
+
+    The images hold dark bars laid out like lines of text so they compress like real scans.
+    With noise the paper gets the grain of a real scanner, which lossless compression
+    handles far worse than clean white. With distinct_images only that many images
+    are drawn and the pages cycle through them, so long documents build quickly."""
+    width, height = int(8.5 * dpi), int(11 * dpi)
+    line_height = max(2, dpi // 8)
+    paper_grain = bytes(235 + value % 21 for value in range(256))
+    document = fitz.open()
+    image_xrefs = []
+    for page_number in range(pages):
+        if distinct_images and len(image_xrefs) == distinct_images:
+            page = document.new_page(width=612, height=792)
+            page.insert_image(page.rect, xref=image_xrefs[page_number % distinct_images])
+            continue
+        if noise:
+            samples = bytearray(os.urandom(width * height).translate(paper_grain))
+        else:
+            samples = bytearray(b"\xff" * (width * height))
+        for line in range(dpi, height - dpi, line_height * 2):
+            line_width = width - 2 * dpi - ((line + page_number * 37) % (width // 3))
+            for row in range(line, line + line_height):
+                samples[row * width + dpi:row * width + dpi + line_width] = b"\x1e" * line_width
+        pix = fitz.Pixmap(fitz.csGRAY, width, height, bytes(samples), False)
+        page = document.new_page(width=612, height=792)
+        image_xrefs.append(page.insert_image(page.rect, pixmap=pix))
+    document.save(path, deflate=True)
+    document.close()
+
+
+def make_page_configurations(pages, pages_per_output=3):
+    """Label pages in groups of pages_per_output, cycling through the doc types."""
+    doc_types = list(DOC_TYPE_DICTIONARY)
+    return [
+        {"file_name": f"output_{page // pages_per_output:05d}",
+         "doc_type": doc_types[(page // pages_per_output) % len(doc_types)]}
+        for page in range(pages)
+    ]
+
+
+def make_output_folder(root):
+    for doc_type_folder in DOC_TYPE_DICTIONARY.values():
+        os.makedirs(os.path.join(root, doc_type_folder), exist_ok=True)
+    return root
+
+
+def bench_export(pages, worker_counts):
+    with tempfile.TemporaryDirectory() as work_dir:
+        source_path = os.path.join(work_dir, "source.pdf")
+        make_text_pdf(source_path, pages)
+        page_configurations = make_page_configurations(pages)
+
+        reference_folder = None
+        for workers in worker_counts:
+            folder_path = make_output_folder(os.path.join(work_dir, f"workers_{workers}"))
+            start = time.perf_counter()
+            results = export_engine.export_outputs(source_path, folder_path, page_configurations, workers, use_index=False)
+            elapsed = time.perf_counter() - start
+
+            identical = ""
+            if reference_folder is None:
+                reference_folder = folder_path
+            else:
+                identical = all(
+                    filecmp.cmp(result["file_path"], result["file_path"].replace(folder_path, reference_folder, 1), shallow=False)
+                    for result in results
+                )
+                identical = f"  identical to {worker_counts[0]} worker(s): {identical}"
+            print(f"{workers:>3} worker(s): {len(results)} files in {elapsed:.3f}s ({pages / elapsed:.0f} pages/s){identical}")
+            if folder_path != reference_folder:
+                shutil.rmtree(folder_path)
+
+
+def bench_profiles(pages, dpi, pages_per_output):
+    """Output size and time of every save profile, on synthetic scans and on text pages."""
+    with tempfile.TemporaryDirectory() as work_dir:
+        sources = {"scan": os.path.join(work_dir, "scan.pdf"), "text": os.path.join(work_dir, "text.pdf")}
+        make_scan_pdf(sources["scan"], pages, dpi, noise=True)
+        make_text_pdf(sources["text"], pages)
+        page_configurations = make_page_configurations(pages, pages_per_output)
+
+        for kind, source_path in sources.items():
+            source_bytes = os.path.getsize(source_path)
+            print(f"{kind} source: {pages} pages, {source_bytes / 1024:.0f} KB")
+            for save_profile in SAVE_PROFILES:
+                folder_path = make_output_folder(os.path.join(work_dir, f"{kind}_{save_profile}"))
+                start = time.perf_counter()
+                results = export_engine.export_outputs(source_path, folder_path, page_configurations, 1,
+                                                       save_profile=save_profile, use_index=False)
+                elapsed = time.perf_counter() - start
+                errors = [result["error"] for result in results if result["error"]]
+                bytes_out = sum(result["bytes_out"] for result in results)
+                print(f"  {save_profile:>8}: {len(results)} files, {bytes_out / 1024:8.0f} KB "
+                      f"({bytes_out / source_bytes:6.1%} of source) in {elapsed:.3f}s"
+                      + (f"  {len(errors)} errors, e.g. {errors[0]}" if errors else ""))
+                shutil.rmtree(folder_path)
+
+
+def make_batch_pdf(path, pages, dpi=200, distinct_images=None):
+    """Write a synthetic scanned batch and return its (separator_pages, blank_pages).
+
+    Documents of 1 to 8 pages of grainy text are divided alternately by a coloured
+    separator sheet and by a blank sheet scanned on both sides (two blank pages),
+    and some documents hold a single blank back. Blank pages carry scanner speckle,
+    faint bleed-through and punched holes near the edge. Images are JPEG like a
+    real scanner's. With distinct_images each kind of page cycles through that
+    many images, which builds faster but lets MuPDF reuse decoded images."""
+    width, height = int(8.5 * dpi), int(11 * dpi)
+    line_height = max(2, dpi // 8)
+    random = np.random.default_rng(0)
+    rows, columns = np.ogrid[:height, :width]
+
+    def paper(level):
+        return random.integers(level - 15, level + 1, size=(height, width), dtype=np.uint8)
+
+    def content(variant):
+        samples = paper(250)
+        lines = range(dpi, height - dpi, line_height * 2)[:1 + variant * 7 % 40]  # Some pages have a line or two.
+        for line in lines:
+            samples[line:line + line_height, dpi:width - dpi - (line * 7 + variant * 37) % (width // 3)] = 30
+        return samples
+
+    def blank(variant):
+        samples = paper(250)
+        for line in range(dpi, height - dpi, line_height * 2):  # Bleed-through from the other side.
+            samples[line:line + line_height, dpi:width - dpi - (line * 5 + variant * 11) % (width // 3)] -= 20
+        specks = random.integers(0, samples.size, size=samples.size // 2000)
+        samples.flat[specks] = random.integers(20, 120, size=specks.size, dtype=np.uint8)
+        for hole_row in (height // 4, height * 3 // 4):
+            samples[(rows - hole_row) ** 2 + (columns - dpi // 2) ** 2 <= (dpi // 8) ** 2] = 20
+        return samples
+
+    def coloured(variant):
+        samples = paper(150 + variant % 3 * 5)
+        samples[height // 2:height // 2 + line_height * 3, width // 4:width * 3 // 4] = 20
+        return samples
+
+    document = fitz.open()
+    image_xrefs = {}
+
+    def add_page(kind, make_samples, page_number):
+        variant = page_number % distinct_images if distinct_images else page_number
+        page = document.new_page(width=612, height=792)
+        if (kind, variant) in image_xrefs:
+            page.insert_image(page.rect, xref=image_xrefs[kind, variant])
+            return
+        pix = fitz.Pixmap(fitz.csGRAY, width, height, make_samples(variant).tobytes(), False)
+        image_xrefs[kind, variant] = page.insert_image(page.rect, stream=pix.tobytes("jpg", jpg_quality=75))
+
+    separator_pages, blank_pages = [], []
+    document_number = 0
+    while document.page_count < pages:
+        for index in range(1 + document_number * 5 % 8):
+            add_page("content", content, document.page_count)
+            if index == 0 and document_number % 4 == 1:
+                blank_pages.append(document.page_count)
+                add_page("blank", blank, document.page_count)
+        if document_number % 2:
+            separator_pages.append(document.page_count)
+            add_page("coloured", coloured, document.page_count)
+        else:
+            separator_pages.extend([document.page_count, document.page_count + 1])
+            add_page("blank", blank, document.page_count)
+            add_page("blank", blank, document.page_count)
+        document_number += 1
+    document.save(path, deflate=True)
+    document.close()
+    return separator_pages, blank_pages
+
+
+def bench_boundaries(pages, dpi, worker_counts, distinct_images=None):
+    """Time blank and separator page detection across worker counts and check it against the known layout."""
+    with tempfile.TemporaryDirectory() as work_dir:
+        source_path = os.path.join(work_dir, "batch.pdf")
+        start = time.perf_counter()
+        expected_separators, expected_blanks = make_batch_pdf(source_path, pages, dpi, distinct_images)
+        with fitz.open(source_path) as document:
+            total_pages = document.page_count
+        print(f"Built a {total_pages}-page batch at {dpi} dpi in {time.perf_counter() - start:.1f}s: "
+              f"{len(expected_separators)} separator and {len(expected_blanks)} blank pages")
+
+        for workers in worker_counts:
+            start = time.perf_counter()
+            measurements = page_boundaries.measure_pages(source_path, workers)
+            elapsed = time.perf_counter() - start
+            separator_pages, blank_pages = page_boundaries.classify_measurements(measurements)
+            wrong = (set(separator_pages) ^ set(expected_separators)) | (set(blank_pages) ^ set(expected_blanks))
+            print(f"workers={workers:>2}: {elapsed:.2f}s ({elapsed / total_pages * 1000:.2f} ms/page), "
+                  f"{len(separator_pages)} separators, {len(blank_pages)} blanks, {len(wrong)} pages misclassified"
+                  + (f" e.g. {sorted(wrong)[:10]}" if wrong else ""))
+
+
+def bench_writer(outputs, folder, batch_sizes):
+    """Time writing single-page outputs directly, and through OutputWriter unsynced and with each batch size.
+
+    Run it with --folder on the disk or network share that matters; fsync and
+    rename costs there are what the batches are meant to cut."""
+    with tempfile.TemporaryDirectory(dir=folder) as work_dir:
+        source_path = os.path.join(work_dir, "source.pdf")
+        make_text_pdf(source_path, outputs)
+        source_document = fitz.open(source_path)
+        modes = [("direct", None, None), ("unsynced", False, outputs)]
+        modes += [(f"batch {batch_files}", True, batch_files) for batch_files in batch_sizes]
+        for label, sync, batch_files in modes:
+            folder_path = os.path.join(work_dir, label.replace(" ", "_"))
+            os.makedirs(folder_path)
+            start = time.perf_counter()
+            if sync is None:
+                for page_number in range(outputs):
+                    write_output(source_document, [page_number], os.path.join(folder_path, f"{page_number}.pdf"))
+            else:
+                with output_writer.OutputWriter(sync, batch_files) as writer:
+                    for page_number in range(outputs):
+                        writer.write(source_document, [page_number], os.path.join(folder_path, f"{page_number}.pdf"))
+            elapsed = time.perf_counter() - start
+            print(f"{label:>10}: {outputs} outputs in {elapsed:.3f}s ({elapsed / outputs * 1000:.2f} ms/output)")
+        source_document.close()
+
+
+def bench_incremental(pages, dpi, worker_counts):
+    """Page hashing throughput against rendering, and full export against re-export after a label change."""
+    with tempfile.TemporaryDirectory() as work_dir:
+        sources = {"text": os.path.join(work_dir, "text.pdf"), "scan": os.path.join(work_dir, "scan.pdf")}
+        make_text_pdf(sources["text"], pages)
+        # Every scanned page has its own image, as in a real scan, so fewer are built.
+        make_scan_pdf(sources["scan"], min(pages, 200), dpi)
+
+        for kind, source_path in sources.items():
+            with fitz.open(source_path) as document:
+                source_pages = document.page_count
+                render_pages = sample_pages(source_pages, 50)
+                start = time.perf_counter()
+                for page_number in render_pages:
+                    document[page_number].get_pixmap()
+                render_rate = len(render_pages) / (time.perf_counter() - start)
+            for workers in worker_counts:
+                shutil.rmtree(get_document_cache_dir(source_path, "page_hashes"))
+                start = time.perf_counter()
+                export_index.page_hashes(source_path, workers)
+                hash_rate = source_pages / (time.perf_counter() - start)
+                print(f"{kind}: hashed {hash_rate:.0f} pages/s with {workers} worker(s), rendered {render_rate:.0f} pages/s "
+                      f"at zoom 1 in one thread")
+
+        page_configurations = make_page_configurations(pages)
+        folder_path = make_output_folder(os.path.join(work_dir, "out"))
+        runs = [("first export", page_configurations), ("unchanged", page_configurations)]
+        changed = list(page_configurations)
+        changed[pages // 2] = dict(changed[pages // 2], file_name="relabelled")
+        runs.append(("one label changed", changed))
+        for label, configurations in runs:
+            start = time.perf_counter()
+            results = export_engine.export_outputs(sources["text"], folder_path, configurations, 1)
+            elapsed = time.perf_counter() - start
+            rewritten = sum(not result["unchanged"] for result in results)
+            print(f"{label:>18}: {elapsed:.3f}s, {rewritten} of {len(results)} outputs written")
+
+
+def bench_append(target_sizes, pages, appends):
+    """Time appending pages to outputs of several sizes, against rewriting each output with the pages added.
+
+    Each target is written as an export writes it, appended to appends times
+    and then compacted; the median append is reported, with the bytes it added."""
+    with tempfile.TemporaryDirectory() as work_dir:
+        source_path = os.path.join(work_dir, "source.pdf")
+        make_text_pdf(source_path, pages * appends)
+        source_document = fitz.open(source_path)
+        save_options = dict(SAVE_PROFILES["compact"])
+        for target_pages in target_sizes:
+            target_path = os.path.join(work_dir, f"target_{target_pages}.pdf")
+            make_text_pdf(target_path + ".source", target_pages)
+            with fitz.open(target_path + ".source") as target_source:
+                write_output(target_source, list(range(target_pages)), target_path)
+            target_bytes = os.path.getsize(target_path)
+
+            append_times, added = [], []
+            with output_writer.OutputWriter() as writer:
+                for append in range(appends):
+                    start = time.perf_counter()
+                    added.append(writer.append(source_document, list(range(append * pages, (append + 1) * pages)), target_path))
+                    append_times.append(time.perf_counter() - start)
+
+            rewrite_times = []
+            for append in range(appends):
+                start = time.perf_counter()
+                with fitz.open(target_path) as target:
+                    target.insert_pdf(source_document, from_page=append * pages, to_page=(append + 1) * pages - 1)
+                    target.save(target_path + ".rewrite", **save_options)
+                rewrite_times.append(time.perf_counter() - start)
+            os.remove(target_path + ".rewrite")
+
+            start = time.perf_counter()
+            bytes_before, bytes_after = output_writer.compact_output(target_path)
+            compact_time = time.perf_counter() - start
+            print(f"{target_pages:>6}-page target ({target_bytes / 1024:.0f} KB): append {pages} pages "
+                  f"{statistics.median(append_times) * 1000:.1f} ms, {statistics.median(added) / 1024:.1f} KB added; "
+                  f"rewrite {statistics.median(rewrite_times) * 1000:.1f} ms; compacting {appends} appends "
+                  f"{compact_time * 1000:.0f} ms, {bytes_before / 1024:.0f} -> {bytes_after / 1024:.0f} KB")
+        source_document.close()
+
+
+def bench_service(documents, pages, clients, requests, max_documents_options, workers):
+    """Load-test split_service on localhost: concurrent clients ask for page counts, text and renders of a few sources.
+
+    Each client keeps one connection open and sends its requests back to back.
+    Latency percentiles are reported per endpoint, for each pool size in
+    max_documents_options (0 reopens the source for every request), followed
+    by one batch export through the export queue."""
+    endpoints = {"page_count": 2, "text": 3, "render": 5}  # Relative share of the requests
+    with tempfile.TemporaryDirectory() as work_dir:
+        sources = []
+        for number in range(documents):
+            sources.append(os.path.join(work_dir, f"source_{number}.pdf"))
+            make_text_pdf(sources[-1], pages)
+        with open(os.path.join(work_dir, "source_0.json"), "w", encoding="utf-8") as manifest_file:
+            json.dump([{"pages": f"{page + 1}-{min(pages, page + 3)}", "file_name": f"output_{page // 3:05d}",
+                        "doc_type": "Referrals"} for page in range(0, pages, 3)], manifest_file)
+        folder_path = make_output_folder(os.path.join(work_dir, "out"))
+
+        for max_documents in max_documents_options:
+            service = split_service.SplitService([work_dir], workers, max_documents=max_documents)
+            server = split_service.make_server(service, 0)
+            threading.Thread(target=server.serve_forever, daemon=True).start()
+            port = server.server_address[1]
+            latencies = {endpoint: [] for endpoint in endpoints}
+            failures = []
+
+            def client(seed):
+                rng = random.Random(seed)
+                connection = http.client.HTTPConnection("127.0.0.1", port, timeout=split_service.REQUEST_TIMEOUT)
+                for _ in range(requests // clients):
+                    endpoint = rng.choices(list(endpoints), weights=list(endpoints.values()))[0]
+                    query = urllib.parse.urlencode({"path": rng.choice(sources), "page": rng.randrange(pages), "zoom": 1})
+                    start = time.perf_counter()
+                    connection.request("GET", f"/{endpoint}?{query}")
+                    response = connection.getresponse()
+                    response.read()
+                    latencies[endpoint].append(time.perf_counter() - start)
+                    if response.status != 200:
+                        failures.append(response.status)
+                connection.close()
+
+            threads = [threading.Thread(target=client, args=(seed,)) for seed in range(clients)]
+            start = time.perf_counter()
+            for thread in threads:
+                thread.start()
+            for thread in threads:
+                thread.join()
+            elapsed = time.perf_counter() - start
+            total = sum(len(values) for values in latencies.values())
+            pool = service.documents.stats()
+            print(f"max documents {max_documents}: {total} requests from {clients} clients in {elapsed:.2f}s "
+                  f"({total / elapsed:.0f} requests/s), {len(failures)} failed, "
+                  f"{pool['opened']} opens, {pool['reused']} reuses")
+            for endpoint, values in latencies.items():
+                print(f"  {endpoint:>10}: p50 {percentile(values, 0.5) * 1000:6.1f} ms, "
+                      f"p99 {percentile(values, 0.99) * 1000:6.1f} ms ({len(values)} requests)")
+
+            connection = http.client.HTTPConnection("127.0.0.1", port, timeout=split_service.REQUEST_TIMEOUT)
+            start = time.perf_counter()
+            connection.request("POST", "/export", json.dumps({"source": sources[0], "output": folder_path,
+                                                              "on_conflict": "overwrite", "index": False}))
+            job = json.loads(connection.getresponse().read())["job"]
+            state = None
+            while state not in ("done", "failed"):
+                connection.request("GET", f"/jobs/{job}?wait=10")
+                state = json.loads(connection.getresponse().read())["state"]
+            print(f"      export: {pages} pages {state} in {time.perf_counter() - start:.2f}s")
+            connection.close()
+            server.shutdown()
+            server.server_close()
+            service.close()
+
+
+def make_rescan_pdf(path, pages, rescans, dpi=100):
+    """Write a scanned PDF of distinct pages followed by re-scans of some of them; return the re-scanned pages.
+
+    Pages hold varied lines of text, indents and blocks like forms and letters.
+    A re-scan is the same sheet turned by up to 1.5 degrees, shifted a few
+    pixels, with new scanner grain and stronger JPEG compression."""
+    width, height = int(8.5 * dpi), int(11 * dpi)
+    line_height = max(2, dpi // 10)
+    random = np.random.default_rng(0)
+
+    def sheet():
+        samples = random.integers(235, 251, size=(height, width), dtype=np.uint8)
+        indent = int(random.integers(dpi // 2, dpi * 3 // 2))
+        top = int(random.integers(dpi // 2, height // 3))
+        for line in range(top, int(random.integers(top + dpi, height - dpi // 2)), line_height * 2):
+            if random.random() < 0.15:
+                continue  # A paragraph break.
+            samples[line:line + line_height, indent:indent + int(random.integers(width // 5, width - indent - dpi // 2))] = 30
+        for _ in range(int(random.integers(0, 3))):  # Logos, photos and table cells.
+            block_height, block_width = int(random.integers(dpi // 2, dpi * 2)), int(random.integers(dpi // 2, dpi * 3))
+            row, column = int(random.integers(0, height - block_height)), int(random.integers(0, width - block_width))
+            samples[row:row + block_height, column:column + block_width] = int(random.integers(40, 180))
+        return samples
+
+    document = fitz.open()
+    for _ in range(pages):
+        pix = fitz.Pixmap(fitz.csGRAY, width, height, sheet().tobytes(), False)
+        page = document.new_page(width=612, height=792)
+        page.insert_image(page.rect, stream=pix.tobytes("jpg", jpg_quality=80))
+
+    rescanned = sorted(random.choice(pages, size=min(rescans, pages), replace=False).tolist())
+    matrix = fitz.Matrix(dpi / 72, dpi / 72)
+    for page_number in rescanned:
+        turned = fitz.open()
+        turned.new_page(width=612, height=792).show_pdf_page(fitz.Rect(0, 0, 612, 792), document, page_number,
+                                                            rotate=float(random.uniform(-1.5, 1.5)))
+        pix = turned[0].get_pixmap(matrix=matrix, colorspace=fitz.csGRAY)
+        samples = np.frombuffer(pix.samples, dtype=np.uint8).reshape(pix.height, pix.width)
+        samples = np.roll(samples, tuple(random.integers(-dpi // 20, dpi // 20 + 1, size=2)), axis=(0, 1))
+        samples = np.clip(samples.astype(np.int16) + random.integers(-12, 13, size=samples.shape), 0, 255).astype(np.uint8)
+        rescan = fitz.Pixmap(fitz.csGRAY, pix.width, pix.height, samples.tobytes(), False)
+        page = document.new_page(width=612, height=792)
+        page.insert_image(page.rect, stream=rescan.tobytes("jpg", jpg_quality=50))
+        turned.close()
+    document.save(path, deflate=True)
+    document.close()
+    return rescanned
+
+
+def bench_near_duplicates(pages, rescans, corpus_pages, queries, workers):
+    """Check near-duplicate detection on synthetic re-scans and time corpus queries against a linear scan."""
+    with tempfile.TemporaryDirectory() as work_dir:
+        source_path = os.path.join(work_dir, "rescans.pdf")
+        rescanned = make_rescan_pdf(source_path, pages, rescans)
+        start = time.perf_counter()
+        groups = near_duplicates.find_near_duplicates(source_path, workers=workers)
+        elapsed = time.perf_counter() - start
+        total_pages = pages + len(rescanned)
+        expected = {frozenset((original, pages + copy)) for copy, original in enumerate(rescanned)}
+        found = {frozenset(group["pages"]) for group in groups}
+        print(f"{total_pages} pages hashed and grouped in {elapsed:.2f}s ({elapsed / total_pages * 1000:.2f} ms/page) "
+              f"with {workers or os.cpu_count()} worker(s): {len(expected & found)} of {len(expected)} re-scans found, "
+              f"{len(found - expected)} wrong groups")
+
+        # A corpus of random hashes, with a near-duplicate of every query planted in it.
+        random = np.random.default_rng(1)
+        corpus_phashes = random.integers(0, 1 << 63, size=corpus_pages, dtype=np.int64).astype(np.uint64) << np.uint64(1)
+        query_phashes = random.integers(0, 1 << 63, size=queries, dtype=np.int64).astype(np.uint64)
+        flips = np.uint64(1) << random.integers(0, 64, size=(queries, 3)).astype(np.uint64)
+        corpus_phashes[:queries] = query_phashes ^ np.bitwise_or.reduce(flips, axis=1)
+        query_fine_hashes = [int.from_bytes(random.bytes(32), "big") for _ in range(queries)]
+        folder_path = os.path.join(work_dir, "out")
+        os.makedirs(folder_path)
+        with near_duplicates.CorpusIndex(folder_path) as index:
+            start = time.perf_counter()
+            for first in range(0, corpus_pages, 100000):
+                index.add_pages("corpus.pdf", (
+                    (row, phash, query_fine_hashes[row] ^ 0b10110 if row < queries else int.from_bytes(random.bytes(32), "big"))
+                    for row, phash in enumerate(corpus_phashes[first:first + 100000].tolist(), first)
+                ))
+            index.connection.commit()
+            print(f"Indexed {corpus_pages} corpus pages in {time.perf_counter() - start:.1f}s")
+
+            start = time.perf_counter()
+            index.query(0, 0)  # Reads the corpus into memory
+            print(f"Loaded the multi-index in {time.perf_counter() - start:.2f}s")
+
+            start = time.perf_counter()
+            matched = sum(bool(index.query(phash, fine_hash))
+                          for phash, fine_hash in zip(query_phashes.tolist(), query_fine_hashes))
+            indexed_ms = (time.perf_counter() - start) / queries * 1000
+        start = time.perf_counter()
+        for phash in query_phashes.tolist():
+            np.flatnonzero(near_duplicates.hamming_distances(phash, corpus_phashes) <= near_duplicates.MAX_PHASH_DISTANCE)
+        linear_ms = (time.perf_counter() - start) / queries * 1000
+        print(f"Corpus of {corpus_pages} pages: {indexed_ms:.2f} ms/query with the multi-index, "
+              f"{linear_ms:.2f} ms/query scanning every pHash in memory with NumPy; "
+              f"{matched} of {queries} planted matches found")
+
+
+WORDS = ("the of and to in is was for that with as on by at from this be which or are an have not but had his they "
+         "were been their has more one all would there when who will other its what about into than them can only "
+         "policy payment patient request referral account balance quarterly report signed copy enclosed please "
+         "hospital physician typing judge property deputy equity quickly yearly applying highlight background").split()
+
+
+def make_rotated_pdf(path, pages, dpi=150, max_skew=4.0, text_layer_every=5):
+    """Write scanned letters turned by a random quarter turn and skew; return the correction each page needs.
+
+    Pages are rendered from real text (ragged right, with a heading) and placed
+    turned as a scanner would: sideways pages are landscape. Every
+    text_layer_every-th page keeps its text layer and is turned with /Rotate only."""
+    random = np.random.default_rng(0)
+    document = fitz.open()
+    expected = []
+    for page_number in range(pages):
+        letter = fitz.open()
+        letter_page = letter.new_page(width=612, height=792)
+        letter_page.insert_text((72, 90), " ".join(random.choice(WORDS, 4)).title(), fontsize=16, fontname="helv")
+        y = 130
+        while y < 720:
+            if random.random() < 0.15:
+                y += 14  # A paragraph break
+            width = int(random.integers(5, 13))
+            letter_page.insert_text((72, y), " ".join(random.choice(WORDS, width)).capitalize(), fontsize=11, fontname="helv")
+            y += 14
+        quarter_turns = int(random.integers(0, 4))
+        if text_layer_every and page_number % text_layer_every == 0:
+            document.insert_pdf(letter)
+            # /Rotate turns clockwise, so the page needs turning back counterclockwise.
+            document[-1].set_rotation(90 * quarter_turns)
+            expected.append(((-90 * quarter_turns) % 360, 0.0))
+            continue
+        skew = round(float(random.uniform(-max_skew, max_skew)), 2)
+        image = fitz.open()
+        image_page = image.new_page(width=612, height=792)
+        pix = letter_page.get_pixmap(matrix=fitz.Matrix(dpi / 72, dpi / 72), colorspace=fitz.csGRAY)
+        image_page.insert_image(image_page.rect, stream=pix.tobytes("jpg", jpg_quality=75))
+        # show_pdf_page turns counterclockwise, so the correction is the same turn clockwise.
+        width, height = (792, 612) if quarter_turns % 2 else (612, 792)
+        page = document.new_page(width=width, height=height)
+        page.show_pdf_page(page.rect, image, 0, rotate=90 * quarter_turns + skew)
+        expected.append(((90 * quarter_turns) % 360, skew))
+    document.save(path, deflate=True)
+    document.close()
+    return expected
+
+
+def bench_orientation(pages, worker_counts, tolerance):
+    """Pages/s of rotation and skew detection, its accuracy on synthetic turned scans, and a check of the written fix."""
+    with tempfile.TemporaryDirectory() as work_dir:
+        source_path = os.path.join(work_dir, "turned.pdf")
+        expected = make_rotated_pdf(source_path, pages)
+        for workers in worker_counts:
+            start = time.perf_counter()
+            corrections = page_orientation.detect_orientation(source_path, workers)
+            elapsed = time.perf_counter() - start
+            wrong_rotation = [page for page, (found, wanted) in enumerate(zip(corrections, expected)) if found[0] != wanted[0]]
+            skew_errors = [abs(found[1] - wanted[1]) for found, wanted in zip(corrections, expected) if found[0] == wanted[0]]
+            print(f"workers={workers:>2}: {pages / elapsed:.1f} pages/s, {len(wrong_rotation)} of {pages} rotations wrong"
+                  + (f" e.g. pages {wrong_rotation[:10]}" if wrong_rotation else "")
+                  + f", skew error median {statistics.median(skew_errors):.2f} max {max(skew_errors):.2f} degrees, "
+                  f"{sum(error > tolerance for error in skew_errors)} above {tolerance}")
+
+        # Write the corrections and measure the output again: it should need none.
+        output_path = os.path.join(work_dir, "straightened.pdf")
+        with fitz.open(source_path) as source_document:
+            start = time.perf_counter()
+            write_output(source_document, list(range(pages)), output_path,
+                         corrections=dict(enumerate(corrections)))
+            elapsed = time.perf_counter() - start
+        remaining = page_orientation.detect_orientation(output_path, 1)
+        still_turned = sum(rotation != 0 or abs(skew) > tolerance for rotation, skew in remaining)
+        print(f"Wrote the straightened pages in {elapsed:.3f}s; {still_turned} of {pages} still need a correction")
+
+
+def percentile(values, fraction):
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(fraction * len(ordered)))]
+
+
+def _convert_pages(source_path, zoom, conversion, results):
+    """Render every page and convert it to a QPixmap, in a fresh process so its peak RSS is its own."""
+    os.environ.setdefault("QT_QPA_PLATFORM", "offscreen")
+    from PyQt6.QtCore import QByteArray
+    from PyQt6.QtGui import QPixmap
+    from PyQt6.QtWidgets import QApplication
+    from processing_page import pixmap_to_qimage
+
+    app = QApplication([])
+    document = fitz.open(source_path)
+    baseline_rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    latencies = []
+    for page in document:
+        pix = page.get_pixmap(matrix=fitz.Matrix(zoom, zoom))
+        start = time.perf_counter()
+        if conversion == "ppm":
+            qpixmap = QPixmap()
+            qpixmap.loadFromData(QByteArray(pix.tobytes("ppm")))
+        else:
+            qpixmap = QPixmap.fromImage(pixmap_to_qimage(pix))
+        latencies.append(time.perf_counter() - start)
+        del qpixmap, pix
+    peak_rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    results.put((conversion, latencies, (peak_rss - baseline_rss) / 1024))
+    del app
+
+
+def bench_qimage(pages, zoom):
+    with tempfile.TemporaryDirectory() as work_dir:
+        source_path = os.path.join(work_dir, "source.pdf")
+        make_text_pdf(source_path, pages)
+        context = multiprocessing.get_context("spawn")
+        for conversion in ("ppm", "qimage"):
+            results = context.Queue()
+            process = context.Process(target=_convert_pages, args=(source_path, zoom, conversion, results))
+            process.start()
+            conversion, latencies, peak_mb = results.get()
+            process.join()
+            print(f"{conversion:>7}: median {statistics.median(latencies) * 1000:.2f} ms, "
+                  f"p95 {percentile(latencies, 0.95) * 1000:.2f} ms per page, peak RSS +{peak_mb:.1f} MB")
+
+
+def bench_viewport(pages, dpi, view_width, view_height, draft_zoom):
+    """Time the draft and visible-region renders the preview uses against a full high-dpi render."""
+    with tempfile.TemporaryDirectory() as work_dir:
+        source_path = os.path.join(work_dir, "source.pdf")
+        make_scan_pdf(source_path, pages, dpi)
+        processor = PDFProcessor(source_path, work_dir, render_cache_bytes=0)
+        timings = {"draft": [], "visible region": [], "full page at 300 dpi": []}
+        for page_number in range(pages):
+            page_rect = processor.get_page_rect(page_number)
+            display_zoom = round(2 * view_width / page_rect.width, 2)  # zoomed in 2x past fit-to-width
+            visible = snap_clip(fitz.Rect(0, 0, view_width, view_height) / display_zoom, page_rect)
+
+            for name, zoom, clip in (("draft", draft_zoom, None),
+                                     ("visible region", display_zoom, visible),
+                                     ("full page at 300 dpi", 300 / 72, None)):
+                start = time.perf_counter()
+                processor.render_page(page_number, zoom, clip=clip)
+                timings[name].append(time.perf_counter() - start)
+        processor.close()
+
+    for name, latencies in timings.items():
+        print(f"{name:>21}: median {statistics.median(latencies) * 1000:.1f} ms, "
+              f"p95 {percentile(latencies, 0.95) * 1000:.1f} ms")
+
+
+def _open_document(source_path, mode, results, memory_map=False):
+    """Open a document and time how long until page 1 is rendered.
+
+    "eager" is the open this replaced: every page is loaded and given its
+    configuration before the first one is drawn. "lazy" is the GUI's open."""
+    baseline_rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    start = time.perf_counter()
+    if mode == "eager":
+        document = fitz.open(source_path)
+        pages = [document.load_page(page_number) for page_number in range(document.page_count)]
+        page_configurations = [{"file_name" : "Enter file name", "doc_type": "Choose file type", "size": tuple(page.rect)}
+                               for page in pages]
+        page_configurations[0]
+        pages[0].get_pixmap()
+        first_page = time.perf_counter() - start
+        peak_rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        del pages
+        document.close()
+    else:
+        processor = PDFProcessor(source_path, os.path.dirname(source_path), memory_map=memory_map)
+        page_configurations = PageConfigStore(processor.get_total_pages())
+        page_configurations[0]
+        processor.render_page(0)
+        first_page = time.perf_counter() - start
+        peak_rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        processor.close()
+    results.put((mode, first_page, (peak_rss - baseline_rss) / 1024))
+
+
+def bench_open(pages, memory_map=False):
+    with tempfile.TemporaryDirectory() as work_dir:
+        source_path = os.path.join(work_dir, "source.pdf")
+        make_text_pdf(source_path, pages)
+        context = multiprocessing.get_context("spawn")
+        for mode in ("eager", "lazy"):
+            results = context.Queue()
+            process = context.Process(target=_open_document, args=(source_path, mode, results, memory_map))
+            process.start()
+            mode, first_page, peak_mb = results.get()
+            process.join()
+            print(f"{mode:>5} open: first page after {first_page * 1000:.1f} ms, peak RSS +{peak_mb:.1f} MB")
+
+
+# Suite metrics ending in these are better when lower or higher respectively;
+# a baseline comparison flags a change in the wrong direction past the tolerance.
+LOWER_IS_BETTER = "_ms"
+HIGHER_IS_BETTER = "_per_second"
+SUITE_SIZES = [10, 100, 1000, 10000]
+SUITE_SCAN_DPI = 150
+SUITE_SCAN_IMAGES = 20
+# Changes smaller than this are timer noise, whatever their relative size.
+SUITE_MIN_DELTA_MS = 1.0
+
+
+def suite_source(fixtures_dir, kind, pages):
+    """Path of a synthetic source PDF for the suite, built the first time it is needed."""
+    source_path = os.path.join(fixtures_dir, f"{kind}_{pages}.pdf")
+    if not os.path.exists(source_path):
+        if kind == "text":
+            make_text_pdf(source_path, pages)
+        else:
+            make_scan_pdf(source_path, pages, SUITE_SCAN_DPI, distinct_images=SUITE_SCAN_IMAGES)
+    return source_path
+
+
+def sample_pages(pages, count):
+    """Up to count page numbers spread evenly over the document."""
+    step = max(1, pages // count)
+    return list(range(0, pages, step))[:count]
+
+
+def measure_document(source_path, folder_path, pages, repeat):
+    """Time the main PDFProcessor operations on one document."""
+    results = {}
+    open_times = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        processor = PDFProcessor(source_path, folder_path)
+        open_times.append(time.perf_counter() - start)
+        processor.close()
+    results["open_ms"] = statistics.median(open_times) * 1000
+
+    # No render cache, so every get_page_image call renders.
+    processor = PDFProcessor(source_path, folder_path, render_cache_bytes=0)
+    latencies = []
+    for page_number in sample_pages(pages, 50):
+        start = time.perf_counter()
+        processor.get_page_image(page_number)
+        latencies.append(time.perf_counter() - start)
+    results["page_image_p50_ms"] = percentile(latencies, 0.5) * 1000
+    results["page_image_p90_ms"] = percentile(latencies, 0.9) * 1000
+    results["page_image_p99_ms"] = percentile(latencies, 0.99) * 1000
+
+    text_pages = sample_pages(pages, 500)
+    text_times = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        for page_number in text_pages:
+            processor.get_page_text(page_number)
+        text_times.append(time.perf_counter() - start)
+    results["page_text_pages_per_second"] = len(text_pages) / statistics.median(text_times)
+
+    doc_type = next(iter(DOC_TYPE_DICTIONARY))
+    save_times = []
+    for page_number in sample_pages(pages, 10):
+        start = time.perf_counter()
+        processor.save_page_as_pdf(page_number, f"single_{page_number}", doc_type)
+        save_times.append(time.perf_counter() - start)
+    results["save_page_ms"] = statistics.median(save_times) * 1000
+    processor.close()
+
+    export_times = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        export_results = export_engine.export_outputs(source_path, folder_path, make_page_configurations(pages), workers=1,
+                                                      collision_policy="overwrite", use_index=False)
+        export_times.append(time.perf_counter() - start)
+        errors = [result["error"] for result in export_results if result["error"]]
+        if errors:
+            raise RuntimeError(f"Export of {source_path} failed: {errors[0]}")
+    elapsed = statistics.median(export_times)
+    results["export_ms"] = elapsed * 1000
+    results["export_pages_per_second"] = pages / elapsed
+    return results
+
+
+def run_suite(sizes, kinds, repeat, fixtures_dir=None):
+    """Run every measurement on every synthetic document and return the report."""
+    report = {
+        "environment": {
+            "python": platform.python_version(),
+            "pymupdf": fitz.VersionBind,
+            "platform": platform.platform(),
+            "cpus": os.cpu_count(),
+        },
+        "settings": {"sizes": sizes, "kinds": kinds, "repeat": repeat,
+                     "scan_dpi": SUITE_SCAN_DPI, "scan_images": SUITE_SCAN_IMAGES},
+        "results": {},
+    }
+    with tempfile.TemporaryDirectory() as work_dir:
+        fixtures_dir = fixtures_dir or work_dir
+        os.makedirs(fixtures_dir, exist_ok=True)
+        for kind in kinds:
+            for pages in sizes:
+                source_path = suite_source(fixtures_dir, kind, pages)
+                folder_path = make_output_folder(os.path.join(work_dir, f"out_{kind}_{pages}"))
+                name = f"{kind}/{pages}"
+                report["results"][name] = measure_document(source_path, folder_path, pages, repeat)
+                shutil.rmtree(folder_path)
+                print(f"{name:>12}: " + ", ".join(f"{metric} {value:.1f}" for metric, value in report["results"][name].items()),
+                      flush=True)
+    return report
+
+
+def compare_reports(report, baseline, tolerance, min_delta_ms=SUITE_MIN_DELTA_MS):
+    """Print every metric next to its baseline value and return the ones that got worse by more than tolerance.
+
+    Times that changed by less than min_delta_ms are not counted."""
+    regressions = []
+    for name, metrics in report["results"].items():
+        for metric, value in metrics.items():
+            baseline_value = baseline["results"].get(name, {}).get(metric)
+            if not baseline_value:
+                continue
+            change = value / baseline_value - 1
+            if metric.endswith(LOWER_IS_BETTER):
+                worse = change > tolerance and value - baseline_value >= min_delta_ms
+            else:
+                worse = change < -tolerance
+            flag = "  REGRESSION" if worse else ""
+            print(f"{name:>12} {metric:<28} {baseline_value:12.2f} -> {value:12.2f} ({change:+7.1%}){flag}")
+            if worse:
+                regressions.append((name, metric, baseline_value, value))
+    return regressions
+
+
+def bench_suite(sizes, kinds, repeat, output_path, baseline_path, tolerance, min_delta_ms, fixtures_dir):
+    report = run_suite(sizes, kinds, repeat, fixtures_dir)
+    if output_path:
+        with open(output_path, "w", encoding="utf-8") as output_file:
+            json.dump(report, output_file, indent=2)
+    if baseline_path:
+        with open(baseline_path, encoding="utf-8") as baseline_file:
+            baseline = json.load(baseline_file)
+        regressions = compare_reports(report, baseline, tolerance, min_delta_ms)
+        print(f"{len(regressions)} regression(s) beyond {tolerance:.0%}")
+        return 1 if regressions else 0
+    return 0
+
+
+# Run in a fresh interpreter per launch; prints one line once the main window has been painted.
+COLD_START_SCRIPT = """
+import sys
+from PyQt6.QtCore import QTimer
+from PyQt6.QtWidgets import QApplication
+import main
+
+app = QApplication(sys.argv)
+window = main.MainWindow()
+if sys.argv[1] == "eager":
+    window.get_pdf_page()
+window.show()
+
+def report():
+    print("shown", "fitz" in sys.modules, flush=True)
+    app.quit()
+
+QTimer.singleShot(0, report)
+app.exec()
+"""
+
+
+def bench_cold_start(runs):
+    """Time from launching the interpreter until the main window is shown, with the processing
+    dialog (and fitz) loaded lazily as the app does, or up front as it used to."""
+    environment = dict(os.environ)
+    if sys.platform.startswith("linux") and not environment.get("DISPLAY") and not environment.get("WAYLAND_DISPLAY"):
+        environment["QT_QPA_PLATFORM"] = "offscreen"
+    app_folder = os.path.dirname(os.path.abspath(__file__))
+    for mode in ("lazy", "eager"):
+        times = []
+        for _ in range(runs):
+            start = time.perf_counter()
+            child = subprocess.Popen([sys.executable, "-c", COLD_START_SCRIPT, mode], cwd=app_folder, env=environment,
+                                     stdout=subprocess.PIPE, stderr=subprocess.DEVNULL, text=True)
+            line = ""
+            for line in child.stdout:
+                if line.startswith("shown"):
+                    break
+            times.append(time.perf_counter() - start)
+            child.wait()
+        fitz_loaded = line.split()[-1] if line.startswith("shown") else "?"
+        print(f"{mode:>5}: main window shown after median {statistics.median(times) * 1000:.0f} ms, "
+              f"max {max(times) * 1000:.0f} ms over {runs} launches (fitz imported: {fitz_loaded})")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    subparsers = parser.add_subparsers(dest="benchmark", required=True)
+
+    export_parser = subparsers.add_parser("export", help="Compare export times across worker counts.")
+    export_parser.add_argument("--pages", type=int, default=1000)
+    export_parser.add_argument("--workers", type=int, nargs="+", default=[1, 2, 4, os.cpu_count() or 1])
+
+    qimage_parser = subparsers.add_parser("qimage", help="Compare the PPM and zero-copy QImage preview paths.")
+    qimage_parser.add_argument("--pages", type=int, default=50)
+    qimage_parser.add_argument("--zoom", type=float, default=2.0)
+
+    viewport_parser = subparsers.add_parser("viewport", help="Time first paint and refinement on high-dpi scans.")
+    viewport_parser.add_argument("--pages", type=int, default=10)
+    viewport_parser.add_argument("--dpi", type=int, default=600)
+    viewport_parser.add_argument("--view-width", type=int, default=640)
+    viewport_parser.add_argument("--view-height", type=int, default=480)
+    viewport_parser.add_argument("--draft-zoom", type=float, default=0.5)
+
+    open_parser = subparsers.add_parser("open", help="Time to first page and memory of eager vs lazy open.")
+    open_parser.add_argument("--pages", type=int, default=10000)
+    open_parser.add_argument("--memory-map", action="store_true",
+                             help="Map the source into memory for the lazy open instead of reading it through a handle.")
+
+    profiles_parser = subparsers.add_parser("profiles", help="Output size and time of each save profile.")
+    profiles_parser.add_argument("--pages", type=int, default=30)
+    profiles_parser.add_argument("--dpi", type=int, default=300)
+    profiles_parser.add_argument("--pages-per-output", type=int, default=3)
+
+    coldstart_parser = subparsers.add_parser("coldstart", help="Time from launch until the main window is shown.")
+    coldstart_parser.add_argument("--runs", type=int, default=10)
+
+    boundaries_parser = subparsers.add_parser("boundaries", help="Time and check blank and separator page detection.")
+    boundaries_parser.add_argument("--pages", type=int, default=1000)
+    boundaries_parser.add_argument("--dpi", type=int, default=200)
+    boundaries_parser.add_argument("--workers", type=int, nargs="+", default=[1, 2, 4, os.cpu_count() or 1])
+    boundaries_parser.add_argument("--distinct-images", type=int,
+                                   help="Reuse this many images per kind of page to build the batch faster.")
+
+    writer_parser = subparsers.add_parser("writer", help="Time atomic, synced output writing at several batch sizes.")
+    writer_parser.add_argument("--outputs", type=int, default=300)
+    writer_parser.add_argument("--folder", help="Write the outputs under this folder (default: the temporary folder).")
+    writer_parser.add_argument("--batch-sizes", type=int, nargs="+", default=[1, 8, output_writer.COMMIT_BATCH_FILES])
+
+    incremental_parser = subparsers.add_parser("incremental", help="Page hashing speed and incremental re-export.")
+    incremental_parser.add_argument("--pages", type=int, default=1000)
+    incremental_parser.add_argument("--dpi", type=int, default=200)
+    incremental_parser.add_argument("--workers", type=int, nargs="+", default=[1, os.cpu_count() or 1])
+
+    near_duplicates_parser = subparsers.add_parser("nearduplicates", help="Check re-scan detection and time corpus queries.")
+    near_duplicates_parser.add_argument("--pages", type=int, default=500)
+    near_duplicates_parser.add_argument("--rescans", type=int, default=100)
+    near_duplicates_parser.add_argument("--corpus-pages", type=int, default=1000000)
+    near_duplicates_parser.add_argument("--queries", type=int, default=200)
+    near_duplicates_parser.add_argument("--workers", type=int)
+
+    orientation_parser = subparsers.add_parser("orientation", help="Time and check rotation and skew detection.")
+    orientation_parser.add_argument("--pages", type=int, default=300)
+    orientation_parser.add_argument("--workers", type=int, nargs="+", default=[1, os.cpu_count() or 1])
+    orientation_parser.add_argument("--tolerance", type=float, default=0.3, help="Skew error in degrees counted as a miss.")
+
+    append_parser = subparsers.add_parser("append", help="Cost of appending to outputs of several sizes.")
+    append_parser.add_argument("--target-pages", type=int, nargs="+", default=[100, 1000, 10000])
+    append_parser.add_argument("--pages", type=int, default=3, help="Pages added by each append.")
+    append_parser.add_argument("--appends", type=int, default=20)
+
+    service_parser = subparsers.add_parser("service", help="Load-test the local split service.")
+    service_parser.add_argument("--documents", type=int, default=4)
+    service_parser.add_argument("--pages", type=int, default=2000)
+    service_parser.add_argument("--clients", type=int, default=8)
+    service_parser.add_argument("--requests", type=int, default=4000)
+    service_parser.add_argument("--max-documents", type=int, nargs="+", default=[split_service.MAX_OPEN_DOCUMENTS, 0],
+                                help="Pool sizes to compare; 0 reopens the source for every request.")
+    service_parser.add_argument("--workers", type=int, help="Service worker threads (default: one per CPU).")
+
+    suite_parser = subparsers.add_parser("suite", help="Measure the main operations and compare against a baseline.")
+    suite_parser.add_argument("--sizes", type=int, nargs="+", default=SUITE_SIZES)
+    suite_parser.add_argument("--kinds", nargs="+", choices=["text", "scan"], default=["text", "scan"])
+    suite_parser.add_argument("--repeat", type=int, default=5, help="Runs of each timing per document (the median is kept).")
+    suite_parser.add_argument("--output", help="Write the results to this JSON file.")
+    suite_parser.add_argument("--baseline", help="Compare against results written earlier with --output.")
+    suite_parser.add_argument("--tolerance", type=float, default=0.1,
+                              help="Relative change counted as a regression (default 0.1 = 10%%).")
+    suite_parser.add_argument("--min-delta-ms", type=float, default=SUITE_MIN_DELTA_MS,
+                              help="Ignore time changes smaller than this, which are noise on small documents.")
+    suite_parser.add_argument("--fixtures", help="Keep the synthetic PDFs in this folder and reuse them on later runs.")
+
+    args = parser.parse_args()
+    if args.benchmark == "export":
+        bench_export(args.pages, args.workers)
+    elif args.benchmark == "qimage":
+        bench_qimage(args.pages, args.zoom)
+    elif args.benchmark == "viewport":
+        bench_viewport(args.pages, args.dpi, args.view_width, args.view_height, args.draft_zoom)
+    elif args.benchmark == "open":
+        bench_open(args.pages, args.memory_map)
+    elif args.benchmark == "profiles":
+        bench_profiles(args.pages, args.dpi, args.pages_per_output)
+    elif args.benchmark == "coldstart":
+        bench_cold_start(args.runs)
+    elif args.benchmark == "boundaries":
+        bench_boundaries(args.pages, args.dpi, args.workers, args.distinct_images)
+    elif args.benchmark == "writer":
+        bench_writer(args.outputs, args.folder, args.batch_sizes)
+    elif args.benchmark == "incremental":
+        bench_incremental(args.pages, args.dpi, args.workers)
+    elif args.benchmark == "nearduplicates":
+        bench_near_duplicates(args.pages, args.rescans, args.corpus_pages, args.queries, args.workers)
+    elif args.benchmark == "orientation":
+        bench_orientation(args.pages, args.workers, args.tolerance)
+    elif args.benchmark == "append":
+        bench_append(args.target_pages, args.pages, args.appends)
+    elif args.benchmark == "service":
+        bench_service(args.documents, args.pages, args.clients, args.requests, args.max_documents, args.workers)
+    elif args.benchmark == "suite":
+        sys.exit(bench_suite(args.sizes, args.kinds, args.repeat, args.output, args.baseline, args.tolerance,
+                             args.min_delta_ms, args.fixtures))
+
+
+if __name__ == "__main__":
+    main()
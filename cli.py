@@ -0,0 +1,274 @@
+"""Split PDFs from the command line, without the GUI.
+
+Split one PDF using a manifest:
+
+    python cli.py source.pdf output_folder --manifest source.csv
+
+or every PDF in a folder, each with a manifest of the same name (source.csv or
+source.json) next to it or in --manifest-dir:
+
+    python cli.py scans/ output_folder --jobs 4
+
+A CSV manifest has the columns pages, file_name and doc_type; a JSON manifest
+is a list of objects with those keys. Pages are 1-based, e.g. "3", "1-4" or
+"1-4, 7". Pages not listed in the manifest are not exported. Unknown doc types
+and invalid file names fail the whole source before anything is written, and
+--on-conflict decides what happens to outputs whose file already exists.
+
+An index in the output root remembers what was written. Running the same
+manifest again only rewrites outputs whose pages or labels changed, and pages
+already saved from another source are listed under "duplicates".
+
+With --on-conflict append, the pages of outputs whose file exists are added to
+the end of it with an incremental save. Files appended to many times can be
+rewritten in full, whenever no export is running, with:
+
+    python cli.py compact output_folder
+
+With --straighten, sideways, upside-down and skewed pages are detected and
+written straightened (see page_orientation).
+
+A JSON summary is printed to stdout and the exit status is 1 if anything failed.
+This module must not import PyQt6, and fitz is only imported once the
+arguments have been checked, so a bad command line fails in milliseconds.
+"""
+import argparse
+import contextlib
+import csv
+import json
+import os
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import instrumentation
+from page_config_store import parse_page_ranges
+
+
+def read_manifest(manifest_path):
+    """Read a CSV or JSON manifest into a list of {"pages", "file_name", "doc_type"} rows."""
+    with open(manifest_path, newline="", encoding="utf-8") as manifest_file:
+        if manifest_path.lower().endswith(".json"):
+            rows = json.load(manifest_file)
+        else:
+            rows = list(csv.DictReader(manifest_file))
+    manifest = []
+    for row_number, row in enumerate(rows, start=1):
+        try:
+            manifest.append({
+                "pages": parse_page_ranges(row["pages"]),
+                "file_name": str(row["file_name"]).strip(),
+                "doc_type": str(row["doc_type"]).strip(),
+            })
+        except (KeyError, ValueError) as e:
+            raise ValueError(f"{manifest_path}, row {row_number}: {e}")
+    return manifest
+
+
+def manifest_to_page_configurations(manifest, total_pages):
+    """Expand manifest rows into one configuration per page (None for pages left out)."""
+    page_configurations = [None] * total_pages
+    for row in manifest:
+        for page_number in row["pages"]:
+            if page_number >= total_pages:
+                raise ValueError(f"Page {page_number + 1} is past the end of the document ({total_pages} pages)")
+            page_configurations[page_number] = {"file_name": row["file_name"], "doc_type": row["doc_type"]}
+    return page_configurations
+
+
+def find_manifest(source_path, manifest_dir=None):
+    stem = os.path.splitext(os.path.basename(source_path))[0]
+    for folder in filter(None, (manifest_dir, os.path.dirname(source_path))):
+        for extension in (".json", ".csv"):
+            candidate = os.path.join(folder, stem + extension)
+            if os.path.isfile(candidate):
+                return candidate
+    return None
+
+
+def split_document(source_path, folder_path, manifest_path, workers=1, save_profile=None, collision_policy=None,
+                   use_index=True, straighten=False):
+    """Export one source PDF as described by its manifest and summarise the result."""
+    # stdout is reserved for the summary, so anything printed along the way
+    # (including fitz's own import warnings) goes to stderr.
+    with contextlib.redirect_stdout(sys.stderr):
+        return export_document(source_path, folder_path, manifest_path, workers, save_profile, collision_policy,
+                               use_index, straighten)
+
+
+def export_document(source_path, folder_path, manifest_path, workers=1, save_profile=None, collision_policy=None,
+                    use_index=True, straighten=False, mp_context=None):
+    """split_document without redirecting stdout, for callers that run several exports in threads at once.
+
+    Such callers should pass a "spawn" or "forkserver" mp_context, so worker
+    processes are not forked while other threads are inside MuPDF."""
+    import fitz  # PyMuPDF
+    import export_engine
+    import page_orientation
+    from pdf_processor import DEFAULT_COLLISION_POLICY, DEFAULT_SAVE_PROFILE
+
+    start = time.perf_counter()
+    summary = {"source": source_path, "manifest": manifest_path, "pages": 0, "files": 0, "unchanged": 0, "appended": 0,
+               "existing": 0, "bytes_in": 0, "bytes_out": 0, "duplicates": [], "failures": []}
+    try:
+        manifest = read_manifest(manifest_path)
+        with fitz.open(source_path) as source_document:
+            total_pages = source_document.page_count
+        page_configurations = manifest_to_page_configurations(manifest, total_pages)
+        if straighten:
+            corrections = page_orientation.detect_orientation(source_path, workers, mp_context=mp_context)
+            for configuration, correction in zip(page_configurations, corrections):
+                if configuration is not None and correction != page_orientation.NO_CORRECTION:
+                    configuration["correction"] = correction
+
+        results = export_engine.export_outputs(source_path, folder_path, page_configurations, workers,
+                                               save_profile=save_profile or DEFAULT_SAVE_PROFILE,
+                                               collision_policy=collision_policy or DEFAULT_COLLISION_POLICY,
+                                               use_index=use_index, mp_context=mp_context)
+        for result in results:
+            if result["duplicates"]:
+                summary["duplicates"].append({"pages": [page + 1 for page in result["pages"]],
+                                              "existing": result["duplicates"]})
+            if result["error"]:
+                summary["failures"].append({"pages": [page + 1 for page in result["pages"]], "error": result["error"]})
+            elif result["skipped"]:
+                summary["existing"] += 1
+            else:
+                summary["files"] += 1
+                summary["unchanged"] += result["unchanged"]
+                summary["appended"] += result["appended"] and not result["unchanged"]
+                summary["pages"] += len(result["pages"])
+                summary["bytes_in"] += result["bytes_in"]
+                summary["bytes_out"] += result["bytes_out"]
+    except Exception as e:
+        summary["failures"].append({"pages": [], "error": f"{type(e).__name__}: {e}"})
+
+    summary["seconds"] = round(time.perf_counter() - start, 3)
+    return summary
+
+
+def find_sources(input_path, manifest_path=None, manifest_dir=None):
+    """Pair each source PDF with its manifest; a missing manifest is reported as a failure later."""
+    if os.path.isdir(input_path):
+        sources = sorted(
+            os.path.join(input_path, name) for name in os.listdir(input_path) if name.lower().endswith(".pdf")
+        )
+        return [(source, find_manifest(source, manifest_dir)) for source in sources]
+    return [(input_path, manifest_path or find_manifest(input_path, manifest_dir))]
+
+
+def compact_main(argv):
+    """The "compact" command: rewrite the outputs of an output root that pages were appended to."""
+    parser = argparse.ArgumentParser(prog="cli.py compact",
+                                     description="Rewrite each PDF in an output root that pages were appended to as a "
+                                                 "single revision, dropping what the incremental saves left behind.")
+    parser.add_argument("output", help="Output root holding the doc type subfolders.")
+    parser.add_argument("--profile", choices=["fast", "compact", "scan"], default="compact",
+                        help="Save profile whose options the files are rewritten with; images are not recompressed.")
+    parser.add_argument("--min-revisions", type=int, default=2,
+                        help="Only rewrite files with at least this many revisions (1 plus one per append).")
+    parser.add_argument("--log-level", help="Logging level for messages on stderr (default INFO).")
+    args = parser.parse_args(argv)
+    if not os.path.isdir(args.output):
+        parser.error(f"{args.output} is not a folder")
+    instrumentation.configure_logging(args.log_level)
+
+    start = time.perf_counter()
+    with contextlib.redirect_stdout(sys.stderr):
+        import export_engine
+        results = export_engine.compact_outputs(args.output, args.profile, args.min_revisions)
+    failures = [result for result in results if result["error"]]
+    summary = {
+        "files": [result for result in results if not result["error"]],
+        "bytes_before": sum(result["bytes_before"] for result in results),
+        "bytes_after": sum(result["bytes_after"] for result in results),
+        "failures": failures,
+        "seconds": round(time.perf_counter() - start, 3),
+    }
+    json.dump(summary, sys.stdout, indent=2)
+    sys.stdout.write("\n")
+    return 1 if failures else 0
+
+
+def main(argv=None):
+    argv = sys.argv[1:] if argv is None else argv
+    if argv[:1] == ["compact"]:
+        return compact_main(argv[1:])
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("input", help="Source PDF, or a folder of source PDFs.")
+    parser.add_argument("output", help="Output root holding the doc type subfolders.")
+    parser.add_argument("--manifest", help="Manifest for a single source PDF.")
+    parser.add_argument("--manifest-dir", help="Folder to look for <source name>.csv/.json manifests in.")
+    parser.add_argument("--jobs", type=int, default=os.cpu_count() or 1,
+                        help="Source PDFs split at once, or worker processes for a single PDF.")
+    # The names of pdf_processor.SAVE_PROFILES, listed here so fitz is not imported yet.
+    parser.add_argument("--profile", choices=["fast", "compact", "scan"], default="compact",
+                        help="Save profile: no optimisation, lossless size reduction, or also recompress scanned images.")
+    # The names of pdf_processor.COLLISION_POLICIES.
+    parser.add_argument("--on-conflict", choices=["rename", "overwrite", "skip", "append", "error"], default="rename",
+                        help="When an output file exists: save as \"name (2)\", replace it, leave it, add the pages to "
+                             "its end, or fail the source.")
+    parser.add_argument("--no-index", action="store_true",
+                        help="Neither read nor update the output root's index; rewrite every output.")
+    parser.add_argument("--straighten", action="store_true",
+                        help="Detect sideways, upside-down and skewed pages and save them straightened.")
+    parser.add_argument("--trace", help="Write a Chrome trace of the work done in this process to this file.")
+    parser.add_argument("--log-level", help="Logging level for messages on stderr (default INFO).")
+    args = parser.parse_args(argv)
+
+    if not os.path.exists(args.input):
+        parser.error(f"{args.input} does not exist")
+    if not os.path.isdir(args.output):
+        parser.error(f"{args.output} is not a folder")
+    instrumentation.configure_logging(args.log_level)
+    if args.trace:
+        instrumentation.enable_tracing()
+
+    start = time.perf_counter()
+    sources = find_sources(args.input, args.manifest, args.manifest_dir)
+    documents = []
+    missing = [source for source, manifest in sources if manifest is None]
+    for source in missing:
+        documents.append({"source": source, "manifest": None, "pages": 0, "files": 0, "unchanged": 0, "appended": 0,
+                          "existing": 0, "bytes_in": 0, "bytes_out": 0, "duplicates": [], "seconds": 0.0,
+                          "failures": [{"pages": [], "error": "No manifest found"}]})
+    sources = [(source, manifest) for source, manifest in sources if manifest is not None]
+
+    if len(sources) == 1:
+        documents.append(split_document(sources[0][0], args.output, sources[0][1], workers=args.jobs,
+                                        save_profile=args.profile, collision_policy=args.on_conflict,
+                                        use_index=not args.no_index, straighten=args.straighten))
+    elif sources:
+        with ProcessPoolExecutor(max_workers=max(1, min(args.jobs, len(sources)))) as executor:
+            futures = [executor.submit(split_document, source, args.output, manifest, 1, args.profile, args.on_conflict,
+                                       not args.no_index, args.straighten)
+                       for source, manifest in sources]
+            documents.extend(future.result() for future in futures)
+
+    elapsed = time.perf_counter() - start
+    pages = sum(document["pages"] for document in documents)
+    failures = sum(len(document["failures"]) for document in documents)
+    summary = {
+        "documents": documents,
+        "pages": pages,
+        "files": sum(document["files"] for document in documents),
+        "unchanged": sum(document["unchanged"] for document in documents),
+        "appended": sum(document["appended"] for document in documents),
+        "existing": sum(document["existing"] for document in documents),
+        "duplicates": sum(len(document["duplicates"]) for document in documents),
+        "bytes_in": sum(document["bytes_in"] for document in documents),
+        "bytes_out": sum(document["bytes_out"] for document in documents),
+        "failures": failures,
+        "seconds": round(elapsed, 3),
+        "pages_per_second": round(pages / elapsed, 1) if elapsed else 0.0,
+    }
+    json.dump(summary, sys.stdout, indent=2)
+    sys.stdout.write("\n")
+    if args.trace:
+        # Worker processes keep their own spans, so with several jobs this only covers the coordinating process.
+        instrumentation.write_chrome_trace(args.trace)
+    return 1 if failures else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
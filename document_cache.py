@@ -0,0 +1,182 @@
+import hashlib
+import json
+import logging
+import os
+import shutil
+import sys
+import threading
+from concurrent.futures import FIRST_COMPLETED, CancelledError, ProcessPoolExecutor, wait
+
+import fitz  # PyMuPDF
+
+from instrumentation import span
+
+logger = logging.getLogger(__name__)
+
+CACHE_FOLDER_NAME = "PDF-Page-Splitter"
+HASH_CHUNK_BYTES = 1024 * 1024
+PAGES_PER_CHUNK = 50
+
+# The per-document caches of these kinds share CACHE_MAX_BYTES. Every time a
+# document's folder is asked for it is marked as used, and whenever a new
+# folder is made the least recently used ones are deleted until the rest fit.
+CACHE_KINDS = ("thumbnails", "text", "page_hashes", "perceptual_hashes")
+CACHE_MAX_BYTES = 2 * 1024 * 1024 * 1024
+
+# Content hashes already computed this session, keyed by (path, size, mtime).
+_content_hashes = {}
+
+# Each pool process opens the source once and keeps it for every chunk it is
+# handed, since fitz documents cannot be shared between processes.
+_worker_document = None
+
+
+def get_cache_root():
+    """Per-user cache folder for data derived from source PDFs."""
+    if sys.platform == "win32":
+        base = os.environ.get("LOCALAPPDATA") or os.path.expanduser("~\\AppData\\Local")
+    elif sys.platform == "darwin":
+        base = os.path.expanduser("~/Library/Caches")
+    else:
+        base = os.environ.get("XDG_CACHE_HOME") or os.path.expanduser("~/.cache")
+    return os.path.join(base, CACHE_FOLDER_NAME)
+
+
+def file_content_hash(file_path, cancelled=None):
+    """SHA-256 of a file's contents, so caches follow the document rather than its name or location.
+
+    cancelled, if given, is checked before each chunk read; once it returns
+    True the hash is abandoned with concurrent.futures.CancelledError."""
+    stat = os.stat(file_path)
+    key = (os.path.abspath(file_path), stat.st_size, stat.st_mtime_ns)
+    if key not in _content_hashes:
+        digest = hashlib.sha256()
+        with open(file_path, "rb") as source:
+            for chunk in iter(lambda: source.read(HASH_CHUNK_BYTES), b""):
+                if cancelled is not None and cancelled():
+                    raise CancelledError()
+                digest.update(chunk)
+        _content_hashes[key] = digest.hexdigest()
+    return _content_hashes[key]
+
+
+def get_document_cache_dir(file_path, kind, cancelled=None):
+    """Folder holding one kind of cached data (one of CACHE_KINDS) for the given source PDF.
+
+    This hashes the whole file the first time, so keep it off the GUI thread;
+    cancelled is passed on to file_content_hash."""
+    cache_dir = os.path.join(get_cache_root(), kind, file_content_hash(file_path, cancelled))
+    if os.path.isdir(cache_dir):
+        os.utime(cache_dir)  # Recently used, as far as prune_cache is concerned
+    else:
+        os.makedirs(cache_dir, exist_ok=True)
+        prune_cache(keep=(cache_dir,))
+    return cache_dir
+
+
+def prune_cache(max_bytes=CACHE_MAX_BYTES, keep=()):
+    """Delete the least recently used document folders of the caches until they hold at most max_bytes.
+
+    Folders in keep are left alone. Returns how many folders were deleted."""
+    folders = []
+    for kind in CACHE_KINDS:
+        try:
+            entries = list(os.scandir(os.path.join(get_cache_root(), kind)))
+        except OSError:
+            continue
+        for entry in entries:
+            try:
+                if entry.is_dir(follow_symlinks=False):
+                    size = sum(item.stat().st_size for item in os.scandir(entry.path) if item.is_file(follow_symlinks=False))
+                    folders.append((entry.stat().st_mtime_ns, entry.path, size))
+            except OSError:
+                continue  # Deleted by another process meanwhile
+    total_bytes = sum(size for _, _, size in folders)
+    deleted = 0
+    for _, path, size in sorted(folders):
+        if total_bytes <= max_bytes:
+            break
+        if path in keep:
+            continue
+        shutil.rmtree(path, ignore_errors=True)
+        total_bytes -= size
+        deleted += 1
+    if deleted:
+        logger.info("Deleted %d cache folders to keep the cache under %d MB", deleted, max_bytes // (1024 * 1024))
+    return deleted
+
+
+def read_cache(cache_path):
+    """The JSON data cached at cache_path, or None if there is none."""
+    if not os.path.exists(cache_path):
+        return None
+    with open(cache_path, encoding="utf-8") as cache_file:
+        return json.load(cache_file)
+
+
+def write_cache_atomically(cache_path, data):
+    """Write data (bytes as they are, anything else as JSON) to cache_path.
+
+    It goes to a temporary name first, so a half-written file is never read back."""
+    # The folder may have been pruned by another process since it was asked for.
+    os.makedirs(os.path.dirname(cache_path), exist_ok=True)
+    temporary_path = f"{cache_path}.{os.getpid()}.{threading.get_ident()}.tmp"
+    if isinstance(data, bytes):
+        with open(temporary_path, "wb") as cache_file:
+            cache_file.write(data)
+    else:
+        with open(temporary_path, "w", encoding="utf-8") as cache_file:
+            json.dump(data, cache_file)
+    os.replace(temporary_path, cache_path)
+
+
+def _open_worker_document(file_path):
+    global _worker_document
+    _worker_document = fitz.open(file_path)
+
+
+def _run_chunk(function, page_numbers, args):
+    return function(_worker_document, page_numbers, *args)
+
+
+def map_page_chunks(file_path, page_count, function, args=(), pages_per_chunk=PAGES_PER_CHUNK, workers=None,
+                    span_name="page_chunk", mp_context=None, cancelled=None):
+    """Yield (page_numbers, function(document, page_numbers, *args)) for every chunk of pages, as chunks finish.
+
+    The chunks are spread over a pool of workers processes (one per CPU by
+    default), each of which opens file_path once. Asking for a single worker
+    runs them in this process instead, which saves starting the pool but
+    holds the GIL. function must be a module-level function so it can be
+    sent to the pool. mp_context sets how the pool's processes are started
+    (see multiprocessing.get_context). The wait for each chunk is timed as
+    span_name. Closing the generator early drops the chunks not yet started,
+    as does cancelled (a function checked as each chunk finishes) returning
+    True, which also raises concurrent.futures.CancelledError."""
+    chunks = [range(start, min(start + pages_per_chunk, page_count)) for start in range(0, page_count, pages_per_chunk)]
+    if not chunks:
+        return
+    if workers == 1:
+        with fitz.open(file_path) as document:
+            for chunk in chunks:
+                if cancelled is not None and cancelled():
+                    raise CancelledError()
+                with span(span_name, pages=len(chunk)):
+                    result = function(document, chunk, *args)
+                yield chunk, result
+        return
+
+    workers = max(1, min(workers or os.cpu_count() or 1, len(chunks)))
+    executor = ProcessPoolExecutor(max_workers=workers, mp_context=mp_context, initializer=_open_worker_document,
+                                   initargs=(file_path,))
+    try:
+        futures = {executor.submit(_run_chunk, function, chunk, args): chunk for chunk in chunks}
+        pending = set(futures)
+        while pending:
+            with span(span_name):
+                done, pending = wait(pending, return_when=FIRST_COMPLETED)
+            if cancelled is not None and cancelled():
+                raise CancelledError()
+            for future in done:
+                yield futures[future], future.result()
+    finally:
+        executor.shutdown(wait=True, cancel_futures=True)
@@ -0,0 +1,157 @@
+import logging
+import threading
+from collections import deque
+from concurrent.futures import CancelledError
+
+import export_index
+import text_index
+from pdf_processor import PDFProcessor, RenderCache
+
+logger = logging.getLogger(__name__)
+
+# Memory shared by the page renders of every open document, and how many
+# upcoming documents are prepared ahead of the one being worked on.
+SHARED_RENDER_CACHE_BYTES = 512 * 1024 * 1024
+LOOKAHEAD = 2
+PRERENDER_PAGES = 3
+
+# close() runs on the GUI thread when the application quits, so it waits at
+# most this long for a document being prepared to notice it was stopped (text
+# and hashes are checked between chunks of pages). The preparer is a daemon
+# thread, so one still busy after that does not hold up the exit.
+CLOSE_TIMEOUT_SECONDS = 2.0
+
+
+class DocumentQueue:
+    """Queue of source PDFs whose next few entries are prepared in the background.
+
+    Preparing a document opens it, counts its pages, extracts its text (which
+    fills the text cache used by the doc type suggestions), hashes its pages for
+    the duplicate check made before saving and renders its first pages. Every document renders into one shared RenderCache, so memory stays
+    within a single budget however many documents are open. Documents are
+    read through a file handle unless memory_map is set (see PDFProcessor).
+    mp_context sets how the processes that extract text and hash pages are
+    started; pass a "spawn" context when the queue runs beside other threads,
+    such as the GUI's, that may be inside MuPDF."""
+
+    def __init__(self, folder_path, lookahead=LOOKAHEAD, cache_bytes=SHARED_RENDER_CACHE_BYTES,
+                 prerender_pages=PRERENDER_PAGES, prerender_zoom=0.5, memory_map=False, mp_context=None):
+        self.folder_path = folder_path
+        self.memory_map = memory_map
+        self.mp_context = mp_context
+        self.lookahead = lookahead
+        self.prerender_pages = prerender_pages
+        self.prerender_zoom = prerender_zoom
+        self.render_cache = RenderCache(cache_bytes)
+
+        self._waiting = deque()
+        self._prepared = {}  # file path -> PDFProcessor, or an exception if opening failed
+        self._to_prepare = deque()
+        self._preparing = None
+        self._condition = threading.Condition()
+        self._stopped = False
+        self._preparer = threading.Thread(target=self._prepare_documents, name="DocumentQueue", daemon=True)
+        self._preparer.start()
+
+    def __len__(self):
+        with self._condition:
+            return len(self._waiting)
+
+    def add_files(self, file_paths):
+        with self._condition:
+            self._waiting.extend(file_paths)
+            self._schedule()
+
+    def take_next(self):
+        """Remove the next document from the queue and return (file_path, processor).
+
+        The processor is ready at once if the document was already prepared; if
+        preparation is still underway this waits for it rather than opening the
+        file a second time."""
+        with self._condition:
+            file_path = self._waiting.popleft()
+            if file_path in self._to_prepare:
+                # Not started yet, so there is nothing to wait for.
+                self._to_prepare.remove(file_path)
+            else:
+                while file_path == self._preparing:
+                    self._condition.wait()
+            prepared = self._prepared.pop(file_path, None)
+            self._schedule()
+
+        if prepared is None:
+            prepared = self._open(file_path)
+        if isinstance(prepared, Exception):
+            raise prepared
+        prepared.folder_path = self.folder_path
+        return file_path, prepared
+
+    def close(self, timeout=CLOSE_TIMEOUT_SECONDS):
+        """Stop preparing and close every document that was prepared but not taken.
+
+        Waits up to timeout seconds for the document being prepared, which the
+        preparer closes itself if it finishes later."""
+        with self._condition:
+            self._stopped = True
+            self._condition.notify_all()
+        self._preparer.join(timeout)
+        if self._preparer.is_alive():
+            logger.warning("Still preparing %s after %.1f s; leaving it to finish on its own", self._preparing, timeout)
+        with self._condition:
+            for prepared in self._prepared.values():
+                if isinstance(prepared, PDFProcessor):
+                    prepared.close()
+            self._prepared.clear()
+
+    def _is_stopped(self):
+        return self._stopped
+
+    def _schedule(self):
+        """Queue the next lookahead documents for preparation. Call with the condition held."""
+        for file_path in list(self._waiting)[:self.lookahead]:
+            if file_path not in self._prepared and file_path not in self._to_prepare and file_path != self._preparing:
+                self._to_prepare.append(file_path)
+        self._condition.notify_all()
+
+    def _open(self, file_path):
+        try:
+            return PDFProcessor(file_path, self.folder_path, memory_map=self.memory_map, render_cache=self.render_cache)
+        except Exception as e:
+            return e
+
+    def _prepare_documents(self):
+        while True:
+            with self._condition:
+                while not self._to_prepare and not self._stopped:
+                    self._condition.wait()
+                if self._stopped:
+                    return
+                file_path = self._preparing = self._to_prepare.popleft()
+
+            prepared = self._open(file_path)
+            if isinstance(prepared, PDFProcessor):
+                try:
+                    for _ in text_index.iter_page_texts(file_path, cancelled=self._is_stopped, mp_context=self.mp_context):
+                        pass
+                    export_index.page_hashes(file_path, mp_context=self.mp_context, cancelled=self._is_stopped)
+                    for page_number in range(min(self.prerender_pages, prepared.get_total_pages())):
+                        prepared.render_page(page_number, self.prerender_zoom, prefetch=True)
+                except CancelledError:
+                    pass  # Closed meanwhile; the processor is closed below.
+                except Exception:
+                    logger.exception("Error preparing %s", file_path)
+
+            with self._condition:
+                if self._stopped:
+                    if isinstance(prepared, PDFProcessor):
+                        prepared.close()
+                    self._preparing = None
+                    self._condition.notify_all()
+                    return
+                # The same file queued twice can be prepared twice; keep one processor open.
+                earlier = self._prepared.get(file_path)
+                if isinstance(earlier, PDFProcessor):
+                    earlier.close()
+                self._prepared[file_path] = prepared
+                self._preparing = None
+                self._condition.notify_all()
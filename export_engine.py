@@ -0,0 +1,278 @@
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+import fitz  # PyMuPDF
+
+from document_cache import file_content_hash
+from export_index import INDEX_FILE_NAME, ExportIndex, output_key, page_hashes
+from output_writer import (COMMIT_BATCH_FILES, OutputWriter, compact_output, plan_output_paths, revision_count,
+                           verify_output)
+from pdf_processor import (DEFAULT_COLLISION_POLICY, DEFAULT_SAVE_PROFILE, DOC_TYPE_DICTIONARY, page_corrections, plan_outputs,
+                           source_share)
+
+# Each worker process opens the source once and keeps it for every chunk it is
+# handed, since fitz documents cannot be shared between processes.
+_worker_document = None
+
+
+def _open_worker_document(file_path):
+    global _worker_document
+    _worker_document = fitz.open(file_path)
+
+
+def split_plan(plan, chunk_count):
+    """Split a list of (index, output_file_path, pages) into at most chunk_count chunks with similar page totals.
+
+    index is the output's position in the original plan."""
+    chunk_count = max(1, min(chunk_count, len(plan)))
+    chunks = [[] for _ in range(chunk_count)]
+    chunk_pages = [0] * chunk_count
+    # Largest outputs first, each onto the lightest chunk so far.
+    for index, output_file_path, pages in sorted(plan, key=lambda item: -len(item[2])):
+        lightest = chunk_pages.index(min(chunk_pages))
+        chunks[lightest].append((index, output_file_path, pages))
+        chunk_pages[lightest] += len(pages)
+    return [sorted(chunk) for chunk in chunks if chunk]
+
+
+def _export_chunk(chunk, source_document=None, save_profile=DEFAULT_SAVE_PROFILE, sync=True, corrections=None,
+                  append_paths=(), collision_policy=DEFAULT_COLLISION_POLICY, replace_paths=()):
+    """Write every output in a chunk and return (index, result) pairs.
+
+    corrections maps page numbers to the (rotation, skew) that straightens them.
+    Outputs whose path is in append_paths are appended to the existing file
+    (see output_writer.OutputWriter.append); their result has "appended" set and
+    "bytes_out" counts only the bytes added. Only outputs whose path is in
+    replace_paths, or all of them under the "overwrite" collision_policy, may
+    replace a file; if another file has taken the path of any other output by
+    the time it is committed, collision_policy is applied again (see
+    output_writer.OutputWriter.commit) and its result says where it went.
+
+    The outputs are renamed into place in batches and then checked against the
+    page count and size they were written with. A failed output does not stop
+    the rest of the chunk; its result carries the error message instead."""
+    source_document = source_document or _worker_document
+    source_bytes = os.path.getsize(source_document.name)
+    results = []
+    with OutputWriter(sync, collision_policy=collision_policy) as writer:
+        for index, output_file_path, pages in chunk:
+            start = time.perf_counter()
+            result = {"file_path": output_file_path, "pages": pages, "seconds": 0.0,
+                      "bytes_in": source_share(source_bytes, source_document.page_count, pages),
+                      "bytes_out": 0, "skipped": output_file_path is None, "unchanged": False,
+                      "appended": output_file_path in append_paths, "duplicates": [], "error": None}
+            if output_file_path is not None:
+                try:
+                    if result["appended"]:
+                        result["bytes_out"] = writer.append(source_document, pages, output_file_path, save_profile,
+                                                            corrections)
+                    else:
+                        result["bytes_out"] = writer.write(source_document, pages, output_file_path, save_profile,
+                                                           corrections, output_file_path in replace_paths)
+                except Exception as e:
+                    result["error"] = f"{type(e).__name__}: {e}"
+            result["seconds"] = time.perf_counter() - start
+            results.append((index, result))
+
+    for _, result in results:
+        if result["file_path"] in writer.conflicts:
+            e = writer.conflicts[result["file_path"]]
+            result["error"] = f"{type(e).__name__}: {e}"
+        elif result["file_path"] in writer.committed_paths:
+            result["file_path"] = writer.committed_paths[result["file_path"]]
+            if result["file_path"] is None:
+                result["skipped"] = True
+                result["bytes_out"] = 0
+
+    for _, result in results:
+        if result["error"] is None and not result["skipped"] and not result["appended"]:  # Appends check themselves
+            try:
+                verify_output(result["file_path"], len(result["pages"]), result["bytes_out"])
+            except Exception as e:
+                result["error"] = f"{type(e).__name__}: {e}"
+    return results
+
+
+def iter_export(file_path, folder_path, page_configurations, workers=None, doc_type_dictionary=DOC_TYPE_DICTIONARY,
+                save_profile=DEFAULT_SAVE_PROFILE, collision_policy=DEFAULT_COLLISION_POLICY, sync=True, use_index=True,
+                mp_context=None):
+    """Export every output for page_configurations, yielding (index, result) pairs as outputs finish.
+
+    Output paths are settled before anything is written (see
+    output_writer.plan_output_paths), so an unknown doc type, an invalid file
+    name or a conflict under the "error" collision_policy raises at once. A
+    path another export takes while this one is writing is not replaced: the
+    collision_policy is applied to it again (see output_writer.OutputWriter.commit).
+    Closing the generator early cancels the outputs that have not been started.
+    With one worker the outputs are written in order in this process. Otherwise the
+    plan is split into chunks and written by a pool of worker processes, so results
+    arrive in completion order. The files written are identical either way.
+    save_profile names one of pdf_processor.SAVE_PROFILES. With sync, outputs are
+    forced to disk before being renamed into place. Pages whose configuration
+    has a "correction" are straightened (see page_orientation). Under the
+    "append" collision_policy, outputs whose file exists are appended to it.
+    mp_context sets how worker processes are started (see
+    multiprocessing.get_context); callers that run exports from threads of
+    their own should pass a "spawn" or "forkserver" context.
+
+    With use_index the output root's export_index.ExportIndex is consulted and
+    updated: outputs written earlier from the same source are overwritten in
+    place, outputs whose pages, labels and profile have not changed since are
+    not written again (their result has "unchanged" set), and every result
+    lists under "duplicates" the outputs of other sources that hold any of its
+    pages already. Pages already appended to an output are left out of what
+    is appended to it; if all of an output's pages are, it is "unchanged"."""
+    workers = workers or os.cpu_count() or 1
+    plan = plan_outputs(page_configurations)
+    corrections = page_corrections(page_configurations)
+    if not use_index:
+        output_paths = plan_output_paths(folder_path, plan, doc_type_dictionary, collision_policy)
+        yield from _write_outputs(file_path, [
+            (index, output_file_path, pages) for index, (output_file_path, (_, _, pages)) in enumerate(zip(output_paths, plan))
+        ], workers, save_profile, sync, corrections, _append_paths(output_paths, collision_policy), mp_context,
+            collision_policy)
+        return
+
+    source = file_content_hash(file_path)
+    with ExportIndex(folder_path) as export_index:
+        replaceable = export_index.outputs_of_source(source)
+        output_paths = plan_output_paths(folder_path, plan, doc_type_dictionary, collision_policy,
+                                         replaceable=replaceable)
+        replaceable = {os.path.normcase(os.path.abspath(path)) for path in replaceable}
+        replace_paths = frozenset(path for path in output_paths
+                                  if path is not None and os.path.normcase(os.path.abspath(path)) in replaceable)
+        hashes = page_hashes(file_path, workers, mp_context)
+        duplicates = export_index.find_duplicates([hashes[page] for _, _, pages in plan for page in pages], source)
+        source_bytes = os.path.getsize(file_path)
+        append_paths = _append_paths(output_paths, collision_policy)
+        appended_pages = {}  # index -> page hashes already in the output appended to, or None if unknown
+        keys = {}
+        output_duplicates = {}
+        to_write = []
+        for index, (output_file_path, (_, _, pages)) in enumerate(zip(output_paths, plan)):
+            output_duplicates[index] = sorted({path for page in pages for path in duplicates.get(hashes[page], ())})
+            if output_file_path in append_paths:
+                appended_pages[index] = export_index.pages_of(output_file_path)
+                if appended_pages[index] is not None:
+                    new_pages = [page for page in pages if hashes[page] not in appended_pages[index]]
+                    if not new_pages:
+                        yield index, {"file_path": output_file_path, "pages": pages, "seconds": 0.0,
+                                      "bytes_in": source_share(source_bytes, len(hashes), pages), "bytes_out": 0,
+                                      "skipped": False, "unchanged": True, "appended": True,
+                                      "duplicates": output_duplicates[index], "error": None}
+                        continue
+                    to_write.append((index, output_file_path, new_pages))
+                    continue
+            elif output_file_path is not None:
+                keys[index] = output_key(output_file_path, save_profile, [hashes[page] for page in pages],
+                                         [corrections.get(page) for page in pages])
+                if export_index.is_current(output_file_path, keys[index]):
+                    yield index, {"file_path": output_file_path, "pages": pages, "seconds": 0.0,
+                                  "bytes_in": source_share(source_bytes, len(hashes), pages),
+                                  "bytes_out": os.path.getsize(output_file_path), "skipped": False, "unchanged": True,
+                                  "appended": False, "duplicates": output_duplicates[index], "error": None}
+                    continue
+            to_write.append((index, output_file_path, pages))
+
+        for index, result in _write_outputs(file_path, to_write, workers, save_profile, sync, corrections, append_paths,
+                                            mp_context, collision_policy, replace_paths):
+            result["duplicates"] = output_duplicates[index]
+            result["pages"] = plan[index][2]  # Including any pages that were in the output already
+            if result["appended"] and not result["error"]:
+                export_index.record_append(result["file_path"], [hashes[page] for page in result["pages"]],
+                                           known=appended_pages[index] is not None)
+            elif index in keys and not result["error"] and not result["skipped"]:
+                if result["file_path"] != output_paths[index]:  # Renamed when it was committed
+                    keys[index] = output_key(result["file_path"], save_profile, [hashes[page] for page in result["pages"]],
+                                             [corrections.get(page) for page in result["pages"]])
+                export_index.record(result["file_path"], keys[index], source, [hashes[page] for page in result["pages"]])
+            yield index, result
+
+
+def _append_paths(output_paths, collision_policy):
+    """The planned paths that exist already, and are to be appended to, under collision_policy."""
+    if collision_policy != "append":
+        return frozenset()
+    return frozenset(path for path in output_paths if path is not None and os.path.exists(path))
+
+
+def _write_outputs(file_path, plan, workers, save_profile, sync, corrections, append_paths=frozenset(), mp_context=None,
+                   collision_policy=DEFAULT_COLLISION_POLICY, replace_paths=frozenset()):
+    """Write a list of (index, output_file_path, pages), yielding (index, result) pairs as outputs finish.
+
+    See _export_chunk for append_paths, collision_policy and replace_paths."""
+    if not plan:
+        return
+    if workers == 1 or len(plan) < 2:
+        source_document = fitz.open(file_path)
+        try:
+            # One writer batch at a time, so progress is reported as each batch is committed.
+            for start in range(0, len(plan), COMMIT_BATCH_FILES):
+                yield from _export_chunk(plan[start:start + COMMIT_BATCH_FILES], source_document, save_profile, sync,
+                                         corrections, append_paths, collision_policy, replace_paths)
+        finally:
+            source_document.close()
+        return
+
+    # A few chunks per worker keeps every process busy when output sizes vary.
+    chunks = split_plan(plan, workers * 4)
+    executor = ProcessPoolExecutor(max_workers=workers, mp_context=mp_context, initializer=_open_worker_document,
+                                   initargs=(file_path,))
+    try:
+        # Each chunk is sent only the corrections of its own pages.
+        futures = [
+            executor.submit(_export_chunk, chunk, None, save_profile, sync,
+                            {page: corrections[page] for _, _, pages in chunk for page in pages if page in corrections},
+                            append_paths & {output_file_path for _, output_file_path, _ in chunk}, collision_policy,
+                            replace_paths & {output_file_path for _, output_file_path, _ in chunk})
+            for chunk in chunks
+        ]
+        for future in as_completed(futures):
+            yield from future.result()
+    finally:
+        # If the caller stops early (e.g. a cancelled export), drop the chunks
+        # that have not started yet instead of writing them.
+        executor.shutdown(wait=True, cancel_futures=True)
+
+
+def export_outputs(file_path, folder_path, page_configurations, workers=None, doc_type_dictionary=DOC_TYPE_DICTIONARY,
+                   save_profile=DEFAULT_SAVE_PROFILE, collision_policy=DEFAULT_COLLISION_POLICY, sync=True, use_index=True,
+                   mp_context=None):
+    """Export every output for page_configurations and return the results in plan order."""
+    results = dict(iter_export(file_path, folder_path, page_configurations, workers, doc_type_dictionary, save_profile,
+                               collision_policy, sync, use_index, mp_context))
+    return [results[index] for index in sorted(results)]
+
+
+def compact_outputs(folder_path, save_profile=DEFAULT_SAVE_PROFILE, min_revisions=2, sync=True):
+    """Rewrite every PDF in an output root that has at least min_revisions revisions (see output_writer.compact_output).
+
+    This is maintenance for outputs that pages were appended to, and can run
+    whenever no export is writing into the root. The index entries of the
+    files rewritten are kept. Returns one {"file_path", "revisions",
+    "bytes_before", "bytes_after", "error"} result per file compacted or failed."""
+    results = []
+    export_index = ExportIndex(folder_path) if os.path.exists(os.path.join(folder_path, INDEX_FILE_NAME)) else None
+    try:
+        for folder, _, names in os.walk(folder_path):
+            for name in sorted(names):
+                if name.startswith(".") or not name.lower().endswith(".pdf"):
+                    continue  # Temporary files of exports in progress
+                output_file_path = os.path.join(folder, name)
+                result = {"file_path": output_file_path, "revisions": 0, "bytes_before": 0, "bytes_after": 0, "error": None}
+                try:
+                    result["revisions"] = revision_count(output_file_path)
+                    if result["revisions"] < min_revisions:
+                        continue
+                    stat = os.stat(output_file_path)
+                    result["bytes_before"], result["bytes_after"] = compact_output(output_file_path, save_profile, sync)
+                    if export_index is not None:
+                        export_index.refresh(output_file_path, stat.st_size, stat.st_mtime_ns)
+                except Exception as e:
+                    result["error"] = f"{type(e).__name__}: {e}"
+                results.append(result)
+    finally:
+        if export_index is not None:
+            export_index.close()
+    return results
@@ -0,0 +1,229 @@
+"""Index of the outputs written into an output root, kept in SQLite beside the doc type folders.
+
+Every page is identified by a content hash of its content streams, form
+XObjects and raw image streams, so the same page has the same hash whichever
+PDF it sits in. For every output the index keeps the key it was written with
+(its doc type folder, file name, save profile and page hashes), the source it
+came from and the size and modification time it was left with. That lets an
+export skip outputs that are already up to date, overwrite its own earlier
+outputs in place, and spot pages that already exist elsewhere in the tree.
+Outputs that pages were appended to belong to no source and have no key;
+the index keeps every page appended to them, so the same pages are not
+appended twice.
+"""
+import hashlib
+import json
+import logging
+import os
+import sqlite3
+
+import fitz  # PyMuPDF
+
+from document_cache import file_content_hash, get_document_cache_dir, map_page_chunks, read_cache, write_cache_atomically
+from instrumentation import span
+
+logger = logging.getLogger(__name__)
+
+INDEX_FILE_NAME = ".pdf-splitter-index.sqlite"
+PAGES_PER_CHUNK = 100
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS outputs (
+    path TEXT PRIMARY KEY COLLATE NOCASE,
+    output_key TEXT NOT NULL,
+    source TEXT NOT NULL,
+    size INTEGER NOT NULL,
+    mtime_ns INTEGER NOT NULL
+);
+CREATE TABLE IF NOT EXISTS output_pages (
+    path TEXT NOT NULL COLLATE NOCASE,
+    page_hash TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS output_pages_by_hash ON output_pages (page_hash);
+CREATE INDEX IF NOT EXISTS output_pages_by_path ON output_pages (path);
+"""
+
+
+def _hash_chunk(document, page_numbers):
+    object_digests = {}  # xref -> digest, since pages of a scan often share images and forms
+
+    def object_digest(xref):
+        if xref not in object_digests:
+            object_digests[xref] = hashlib.blake2b(document.xref_stream_raw(xref) or b"", digest_size=16).digest()
+        return object_digests[xref]
+
+    page_hashes = []
+    for page_number in page_numbers:
+        page = document.load_page(page_number)
+        digest = hashlib.blake2b(digest_size=16)
+        digest.update(repr((tuple(page.mediabox), page.rotation)).encode())
+        digest.update(page.read_contents())
+        for xobject in page.get_xobjects():
+            digest.update(object_digest(xobject[0]))
+        for image in page.get_images(full=True):
+            digest.update(object_digest(image[0]))
+        page_hashes.append(digest.hexdigest())
+    return page_hashes
+
+
+def page_hashes(file_path, workers=None, mp_context=None, cancelled=None):
+    """Content hash of every page of a PDF, computed in parallel and cached per document.
+
+    mp_context sets how the worker processes are started, and cancelled stops
+    the work early (see document_cache.map_page_chunks)."""
+    cache_path = os.path.join(get_document_cache_dir(file_path, "page_hashes"), "pages.json")
+    cached = read_cache(cache_path)
+    if cached is not None:
+        return cached
+
+    with fitz.open(file_path) as document:
+        total_pages = document.page_count
+    hashes = [None] * total_pages
+    with span("hash_pages", pages=total_pages):
+        for chunk, chunk_hashes in map_page_chunks(file_path, total_pages, _hash_chunk, pages_per_chunk=PAGES_PER_CHUNK,
+                                                   workers=workers, span_name="hash_chunk", mp_context=mp_context,
+                                                   cancelled=cancelled):
+            hashes[chunk.start:chunk.stop] = chunk_hashes
+
+    logger.debug("Hashed %d pages of %s", total_pages, file_path)
+    write_cache_atomically(cache_path, hashes)
+    return hashes
+
+
+def output_key(output_file_path, save_profile, hashes, corrections=()):
+    """Identifies what an output holds: its doc type folder and name, how it was saved and its pages.
+
+    corrections lists the (rotation, skew) of each page, or None for a page left as it is."""
+    doc_type_folder = os.path.basename(os.path.dirname(output_file_path))
+    key = [doc_type_folder, os.path.basename(output_file_path).casefold(), save_profile, hashes]
+    if any(corrections):
+        # Only then, so outputs keep their keys from before pages could be straightened.
+        key.append(list(corrections))
+    key = json.dumps(key)
+    return hashlib.blake2b(key.encode(), digest_size=16).hexdigest()
+
+
+class ExportIndex:
+    """The index of one output root; use it as a context manager to close it."""
+
+    def __init__(self, folder_path):
+        self.folder_path = folder_path
+        self.connection = sqlite3.connect(os.path.join(folder_path, INDEX_FILE_NAME), timeout=30)
+        self.connection.executescript(_SCHEMA)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+        return False
+
+    def _relative(self, output_file_path):
+        return os.path.relpath(output_file_path, self.folder_path).replace(os.sep, "/")
+
+    def _absolute(self, path):
+        return os.path.join(self.folder_path, *path.split("/"))
+
+    def outputs_of_source(self, source):
+        """Paths of the outputs written from the source with this content hash, that are still as written."""
+        rows = self.connection.execute("SELECT path, size, mtime_ns FROM outputs WHERE source = ?", (source,))
+        return [self._absolute(path) for path, size, mtime_ns in rows if self._unchanged(path, size, mtime_ns)]
+
+    def is_current(self, output_file_path, key):
+        """True when output_file_path was written with this key and has not been changed since."""
+        row = self.connection.execute(
+            "SELECT output_key, size, mtime_ns FROM outputs WHERE path = ?", (self._relative(output_file_path),)
+        ).fetchone()
+        return row is not None and row[0] == key and self._unchanged(self._relative(output_file_path), row[1], row[2])
+
+    def _unchanged(self, path, size, mtime_ns):
+        try:
+            stat = os.stat(self._absolute(path))
+        except OSError:
+            return False
+        return stat.st_size == size and stat.st_mtime_ns == mtime_ns
+
+    def record(self, output_file_path, key, source, hashes):
+        """Remember an output that was just written.
+
+        Committed at once, so the index never misses an output that is on disk
+        and other processes exporting into the same root are not locked out."""
+        path = self._relative(output_file_path)
+        stat = os.stat(output_file_path)
+        self.connection.execute("INSERT OR REPLACE INTO outputs VALUES (?, ?, ?, ?, ?)",
+                                (path, key, source, stat.st_size, stat.st_mtime_ns))
+        self.connection.execute("DELETE FROM output_pages WHERE path = ?", (path,))
+        self.connection.executemany("INSERT INTO output_pages VALUES (?, ?)", [(path, page_hash) for page_hash in set(hashes)])
+        self.connection.commit()
+
+    def pages_of(self, output_file_path):
+        """The set of page hashes recorded for an output, or None if it is not indexed or has changed since."""
+        path = self._relative(output_file_path)
+        row = self.connection.execute("SELECT size, mtime_ns FROM outputs WHERE path = ?", (path,)).fetchone()
+        if row is None or not self._unchanged(path, *row):
+            return None
+        return {page_hash for page_hash, in self.connection.execute("SELECT page_hash FROM output_pages WHERE path = ?", (path,))}
+
+    def record_append(self, output_file_path, hashes, known=True):
+        """Remember pages that were just appended to an output.
+
+        The output no longer belongs to one source or matches a key, so no export
+        overwrites it or skips it as up to date. With known, the pages it held
+        before stay recorded; otherwise (it had changed since it was indexed, or
+        never was) only the appended pages are."""
+        path = self._relative(output_file_path)
+        stat = os.stat(output_file_path)
+        if not known:
+            self.connection.execute("DELETE FROM output_pages WHERE path = ?", (path,))
+        recorded = {page_hash for page_hash, in self.connection.execute("SELECT page_hash FROM output_pages WHERE path = ?", (path,))}
+        self.connection.execute("INSERT OR REPLACE INTO outputs VALUES (?, '', '', ?, ?)", (path, stat.st_size, stat.st_mtime_ns))
+        self.connection.executemany("INSERT INTO output_pages VALUES (?, ?)",
+                                    [(path, page_hash) for page_hash in set(hashes) - recorded])
+        self.connection.commit()
+
+    def refresh(self, output_file_path, size_before, mtime_ns_before):
+        """Keep an indexed output's entry after it was rewritten without changing its pages, as compaction does.
+
+        Only an entry that matched the file before the rewrite (size_before,
+        mtime_ns_before) is updated."""
+        stat = os.stat(output_file_path)
+        self.connection.execute("UPDATE outputs SET size = ?, mtime_ns = ? WHERE path = ? AND size = ? AND mtime_ns = ?",
+                                (stat.st_size, stat.st_mtime_ns, self._relative(output_file_path), size_before,
+                                 mtime_ns_before))
+        self.connection.commit()
+
+    def find_duplicates(self, hashes, exclude_source=None):
+        """{page hash: [paths]} of the given hashes that are already in outputs still in the tree.
+
+        Outputs written from exclude_source are left out, since re-exporting a
+        source replaces those rather than duplicating them."""
+        duplicates = {}
+        hashes = list(set(hashes))
+        for start in range(0, len(hashes), 500):  # SQLite limits the parameters per statement
+            batch = hashes[start:start + 500]
+            rows = self.connection.execute(
+                f"SELECT output_pages.page_hash, outputs.path, outputs.size, outputs.mtime_ns "
+                f"FROM output_pages JOIN outputs ON outputs.path = output_pages.path "
+                f"WHERE output_pages.page_hash IN ({', '.join('?' * len(batch))}) AND outputs.source IS NOT ?",
+                batch + [exclude_source],
+            )
+            for page_hash, path, size, mtime_ns in rows:
+                if self._unchanged(path, size, mtime_ns):
+                    duplicates.setdefault(page_hash, []).append(self._absolute(path))
+        return duplicates
+
+    def close(self):
+        self.connection.close()
+
+
+def find_duplicate_pages(file_path, folder_path, page_numbers, workers=None, cancelled=None, mp_context=None):
+    """{page number: [existing output paths]} for the given pages of a source that are already in the output tree.
+
+    cancelled and mp_context are as for page_hashes."""
+    hashes = page_hashes(file_path, workers, mp_context, cancelled)
+    if not os.path.exists(os.path.join(folder_path, INDEX_FILE_NAME)):
+        return {}
+    with ExportIndex(folder_path) as index:
+        duplicates = index.find_duplicates([hashes[page_number] for page_number in page_numbers],
+                                           exclude_source=file_content_hash(file_path))
+    return {page_number: duplicates[hashes[page_number]] for page_number in page_numbers if hashes[page_number] in duplicates}
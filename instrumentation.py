@@ -0,0 +1,129 @@
+"""Timing spans for the slow parts of the app: opening, rendering, image conversion,
+text extraction and saving.
+
+    with span("render", page=3, zoom=2.0):
+        ...
+
+A span's duration is logged at DEBUG level on the "pdf_splitter.perf" logger,
+and recorded for a Chrome trace (chrome://tracing or https://ui.perfetto.dev)
+while tracing is enabled. When neither is on, span() returns a shared no-op
+object, so leaving spans in hot paths costs one function call and two checks.
+
+Set PDF_SPLITTER_TRACE to a file path to trace a whole GUI session; the trace is
+written when the app quits.
+"""
+import json
+import logging
+import os
+import threading
+import time
+from collections import defaultdict, deque
+
+TRACE_ENVIRONMENT_VARIABLE = "PDF_SPLITTER_TRACE"
+# Oldest events are dropped past this, so a long session cannot grow without bound.
+MAX_TRACE_EVENTS = 200000
+# Durations kept per span name for the summary shown by the performance overlay.
+RECENT_DURATIONS = 50
+
+logger = logging.getLogger("pdf_splitter.perf")
+
+_tracing = False
+_trace_events = deque(maxlen=MAX_TRACE_EVENTS)
+_recent_durations = defaultdict(lambda: deque(maxlen=RECENT_DURATIONS))
+_trace_start = time.perf_counter_ns()
+
+
+class _NullSpan:
+    __slots__ = ()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        return False
+
+
+_NULL_SPAN = _NullSpan()
+
+
+class _Span:
+    __slots__ = ("name", "args", "start")
+
+    def __init__(self, name, args):
+        self.name = name
+        self.args = args
+
+    def __enter__(self):
+        self.start = time.perf_counter_ns()
+        return self
+
+    def __exit__(self, *exc_info):
+        end = time.perf_counter_ns()
+        duration_ms = (end - self.start) / 1e6
+        if logger.isEnabledFor(logging.DEBUG):
+            logger.debug("%s took %.2f ms %s", self.name, duration_ms, self.args or "")
+        if _tracing:
+            _recent_durations[self.name].append(duration_ms)
+            _trace_events.append({
+                "name": self.name,
+                "ph": "X",
+                "ts": (self.start - _trace_start) / 1000,
+                "dur": (end - self.start) / 1000,
+                "pid": os.getpid(),
+                "tid": threading.get_ident(),
+                "args": self.args,
+            })
+        return False
+
+
+def span(name, **args):
+    """Context manager timing the block it wraps."""
+    if not _tracing and not logger.isEnabledFor(logging.DEBUG):
+        return _NULL_SPAN
+    return _Span(name, args)
+
+
+def enable_tracing():
+    global _tracing
+    _tracing = True
+
+
+def disable_tracing():
+    global _tracing
+    _tracing = False
+
+
+def is_tracing():
+    return _tracing
+
+
+def clear_trace():
+    _trace_events.clear()
+    _recent_durations.clear()
+
+
+def write_chrome_trace(trace_path):
+    """Write the spans recorded so far as Chrome trace event JSON."""
+    thread_names = {thread.ident: thread.name for thread in threading.enumerate()}
+    events = list(_trace_events)
+    metadata = [
+        {"name": "thread_name", "ph": "M", "pid": os.getpid(), "tid": thread_id, "args": {"name": thread_names[thread_id]}}
+        for thread_id in {event["tid"] for event in events} if thread_id in thread_names
+    ]
+    with open(trace_path, "w", encoding="utf-8") as trace_file:
+        json.dump({"traceEvents": metadata + events, "displayTimeUnit": "ms"}, trace_file)
+    logger.info("Wrote %d trace events to %s", len(events), trace_path)
+
+
+def recent_timings():
+    """{span name: (count, mean ms, max ms)} over the last few spans of each name, while tracing."""
+    return {
+        name: (len(durations), sum(durations) / len(durations), max(durations))
+        for name, durations in list(_recent_durations.items()) if durations
+    }
+
+
+def configure_logging(level=None):
+    """Log to stderr at level, or at the PDF_SPLITTER_LOG_LEVEL environment variable's level (INFO by default)."""
+    level = level or os.environ.get("PDF_SPLITTER_LOG_LEVEL", "INFO")
+    logging.basicConfig(level=level.upper(), format="%(asctime)s %(levelname)s %(name)s: %(message)s")
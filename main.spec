@@ -5,28 +5,30 @@ a = Analysis(
     ['main.py'],
     pathex=[],
     binaries=[],
-    datas=[('mainwindow.ui', '.'), ('pdfProcessingWidget.ui', '.')],
+    datas=[],
     hiddenimports=[],
     hookspath=[],
     hooksconfig={},
     runtime_hooks=[],
-    excludes=[],
+    excludes=['PySide6'],
     noarchive=False,
     optimize=0,
 )
 pyz = PYZ(a.pure)
 
+# A one-folder build: a one-file build unpacks everything to a temporary folder
+# on every launch before the app can start. UPX is off because compressed Qt
+# libraries have to be decompressed on every launch too.
 exe = EXE(
     pyz,
     a.scripts,
-    a.binaries,
-    a.datas,
     [],
+    exclude_binaries=True,
     name='main',
     debug=False,
     bootloader_ignore_signals=False,
     strip=False,
-    upx=True,
+    upx=False,
     upx_exclude=[],
     runtime_tmpdir=None,
     console=False,
@@ -36,3 +38,12 @@ exe = EXE(
     codesign_identity=None,
     entitlements_file=None,
 )
+coll = COLLECT(
+    exe,
+    a.binaries,
+    a.datas,
+    strip=False,
+    upx=False,
+    upx_exclude=[],
+    name='main',
+)
@@ -0,0 +1,397 @@
+"""Near-duplicate page detection with perceptual hashes.
+
+Every page is rendered small and in gray, shrunk to 32x32 and transformed
+with a DCT. The signs of its lowest frequencies against their median make
+two pHashes: a 64-bit one from the lowest 8x8 frequencies, used to find
+candidates, and a 256-bit one from the lowest 16x16, used to confirm them.
+Re-scans of the same sheet, with a little skew, a shifted crop or different
+compression, change only a few bits of either. The 64-bit hash alone also
+matches different pages with the same layout, which the finer one tells
+apart. Nearly uniform pages (blank or solid) carry no hash, since they
+would all match each other.
+
+Lookups use multi-index hashing: the 64-bit pHash is split into SUBSTRINGS
+parts, and by the pigeonhole principle any hash within MAX_PHASH_DISTANCE
+bits matches one part within MAX_PHASH_DISTANCE // SUBSTRINGS bits. Only
+the buckets of those few part values are read, so a query looks at a small
+slice of a large corpus instead of all of it. The hashes of past outputs
+are kept in the output root's SQLite index (see export_index) and read into
+memory, sorted by each part, for lookups.
+"""
+import logging
+import os
+import sqlite3
+from collections import defaultdict
+from concurrent.futures import CancelledError, ProcessPoolExecutor
+from itertools import combinations
+
+import fitz  # PyMuPDF
+import numpy as np
+
+from document_cache import file_content_hash, get_document_cache_dir, map_page_chunks, read_cache, write_cache_atomically
+from export_index import INDEX_FILE_NAME, ExportIndex
+from instrumentation import span
+
+logger = logging.getLogger(__name__)
+
+HASH_DPI = 24
+MARGIN = 0.04
+# Thumbnails whose brightness varies less than this (standard deviation) are blank.
+MIN_CONTRAST = 6.0
+MAX_PHASH_DISTANCE = 10  # Of 64 bits
+MAX_FINE_DISTANCE = 56  # Of 256 bits
+SUBSTRINGS = 4
+PAGES_PER_CHUNK = 50
+
+_SUBSTRING_BITS = 64 // SUBSTRINGS
+_SUBSTRING_MASK = (1 << _SUBSTRING_BITS) - 1
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS perceptual_outputs (
+    path TEXT PRIMARY KEY COLLATE NOCASE,
+    size INTEGER NOT NULL,
+    mtime_ns INTEGER NOT NULL
+);
+CREATE TABLE IF NOT EXISTS perceptual_pages (
+    path TEXT NOT NULL COLLATE NOCASE,
+    page INTEGER NOT NULL,
+    phash INTEGER NOT NULL,
+    fine_hash BLOB NOT NULL
+);
+CREATE INDEX IF NOT EXISTS perceptual_pages_by_path ON perceptual_pages (path);
+"""
+
+
+def _dct_matrix(size):
+    rows = np.arange(size)[:, None]
+    columns = np.arange(size)[None, :]
+    matrix = np.cos(np.pi * (2 * columns + 1) * rows / (2 * size)) * np.sqrt(2 / size)
+    matrix[0] /= np.sqrt(2)
+    return matrix.astype(np.float32)
+
+
+_DCT_32 = _dct_matrix(32)
+
+
+def _area_resize(samples, height, width):
+    """Shrink a 2-D array to height x width by averaging the block under each output cell."""
+    row_starts = np.linspace(0, samples.shape[0], height + 1).astype(int)[:-1]
+    column_starts = np.linspace(0, samples.shape[1], width + 1).astype(int)[:-1]
+    sums = np.add.reduceat(np.add.reduceat(samples.astype(np.float32), row_starts, axis=0), column_starts, axis=1)
+    counts = np.outer(np.diff(np.append(row_starts, samples.shape[0])), np.diff(np.append(column_starts, samples.shape[1])))
+    return sums / counts
+
+
+def thumbnail(pixmap, margin=MARGIN):
+    """32x32 float array of a grayscale pixmap with its margins cut off, or None for a blank page."""
+    samples = np.frombuffer(pixmap.samples_mv, dtype=np.uint8).reshape(pixmap.height, pixmap.stride)[:, :pixmap.width]
+    margin_y, margin_x = int(pixmap.height * margin), int(pixmap.width * margin)
+    samples = samples[margin_y:pixmap.height - margin_y, margin_x:pixmap.width - margin_x]
+    if min(samples.shape) < 32 or samples.std() < MIN_CONTRAST:
+        return None
+    return _area_resize(samples, 32, 32)
+
+
+def _signs_against_median(frequencies):
+    # The DC term only says how dark the page is, so it is left out of the median.
+    return frequencies > np.median(frequencies[:, 1:], axis=1, keepdims=True)
+
+
+def phash_batch(thumbnails):
+    """(64-bit pHashes, 256-bit pHashes) of an N x 32 x 32 array of thumbnails, as lists of ints."""
+    frequencies = np.einsum("ij,njk,lk->nil", _DCT_32, thumbnails, _DCT_32)[:, :16, :16]
+    coarse = np.packbits(_signs_against_median(frequencies[:, :8, :8].reshape(len(thumbnails), 64)), axis=1)
+    fine = np.packbits(_signs_against_median(frequencies.reshape(len(thumbnails), 256)), axis=1)
+    return [int.from_bytes(row.tobytes(), "big") for row in coarse], [int.from_bytes(row.tobytes(), "big") for row in fine]
+
+
+def hamming_distances(hash_value, hashes):
+    """Bits by which each of an array of 64-bit hashes differs from hash_value."""
+    differences = np.asarray(hashes, dtype=np.uint64) ^ np.uint64(hash_value)
+    if hasattr(np, "bitwise_count"):  # NumPy 2.0 or later
+        return np.bitwise_count(differences).astype(np.int64)
+    return np.unpackbits(differences.view(np.uint8).reshape(-1, 8), axis=1).sum(axis=1)
+
+
+def _distance(first, second):
+    return bin(first ^ second).count("1")
+
+
+def substrings(phash):
+    """The SUBSTRINGS parts of a 64-bit pHash, highest first."""
+    return [(phash >> (_SUBSTRING_BITS * (SUBSTRINGS - 1 - part))) & _SUBSTRING_MASK for part in range(SUBSTRINGS)]
+
+
+def _probe_masks(radius):
+    masks = [0]
+    for flipped in range(1, radius + 1):
+        masks.extend(sum(1 << bit for bit in bits) for bits in combinations(range(_SUBSTRING_BITS), flipped))
+    return masks
+
+
+_PROBE_MASKS = _probe_masks(MAX_PHASH_DISTANCE // SUBSTRINGS)
+_PROBE_MASKS_ARRAY = np.array(_PROBE_MASKS, dtype=np.int64)
+
+
+class HammingIndex:
+    """In-memory multi-index hash table of (phash, fine_hash) pairs."""
+
+    def __init__(self):
+        self.tables = [defaultdict(list) for _ in range(SUBSTRINGS)]
+        self.entries = []  # (phash, fine_hash, item)
+
+    def add(self, phash, fine_hash, item):
+        entry_number = len(self.entries)
+        self.entries.append((phash, fine_hash, item))
+        for table, part in zip(self.tables, substrings(phash)):
+            table[part].append(entry_number)
+
+    def query(self, phash, fine_hash, max_phash_distance=MAX_PHASH_DISTANCE, max_fine_distance=MAX_FINE_DISTANCE):
+        """Items added with hashes within the distances of (phash, fine_hash)."""
+        candidates = set()
+        for table, part in zip(self.tables, substrings(phash)):
+            for mask in _PROBE_MASKS:
+                candidates.update(table.get(part ^ mask, ()))
+        items = []
+        for entry_number in sorted(candidates):
+            entry_phash, entry_fine_hash, item = self.entries[entry_number]
+            if (_distance(entry_phash, phash) <= max_phash_distance
+                    and _distance(entry_fine_hash, fine_hash) <= max_fine_distance):
+                items.append(item)
+        return items
+
+
+def _hash_chunk(document, page_numbers, dpi=HASH_DPI):
+    """[(page_number, phash, fine_hash)] for the pages of a chunk that are not blank."""
+    matrix = fitz.Matrix(dpi / 72, dpi / 72)
+    hashed_pages, thumbnails = [], []
+    for page_number in page_numbers:
+        small = thumbnail(document[page_number].get_pixmap(matrix=matrix, colorspace=fitz.csGRAY))
+        if small is not None:
+            hashed_pages.append(page_number)
+            thumbnails.append(small)
+    if not thumbnails:
+        return []
+    return list(zip(hashed_pages, *phash_batch(np.stack(thumbnails))))
+
+
+def perceptual_hashes(file_path, workers=None, cancelled=None, mp_context=None):
+    """(phash, fine_hash) of every page of a PDF, or None for a blank page; computed in parallel and cached per document.
+
+    mp_context sets how the worker processes are started (see document_cache.map_page_chunks)."""
+    cache_path = os.path.join(get_document_cache_dir(file_path, "perceptual_hashes"), "pages.json")
+    cached = read_cache(cache_path)
+    if cached is not None:
+        return [None if pair is None else tuple(int(value, 16) for value in pair) for pair in cached]
+
+    with fitz.open(file_path) as document:
+        page_count = document.page_count
+    hashes = [None] * page_count
+    with span("perceptual_hashes", pages=page_count):
+        for _, chunk in map_page_chunks(file_path, page_count, _hash_chunk, pages_per_chunk=PAGES_PER_CHUNK,
+                                        workers=workers, span_name="hash_chunk", mp_context=mp_context,
+                                        cancelled=cancelled):
+            for page_number, phash, fine_hash in chunk:
+                hashes[page_number] = (phash, fine_hash)
+    logger.debug("Hashed %d pages of %s for near-duplicates", page_count, file_path)
+
+    write_cache_atomically(cache_path, [None if pair is None else [f"{value:x}" for value in pair] for pair in hashes])
+    return hashes
+
+
+class CorpusIndex:
+    """Perceptual hashes of every page of the PDFs in an output root, kept in its SQLite index."""
+
+    def __init__(self, folder_path):
+        self.folder_path = folder_path
+        self.connection = sqlite3.connect(os.path.join(folder_path, INDEX_FILE_NAME), timeout=30)
+        self.connection.executescript(_SCHEMA)
+        self._tables = None  # Loaded on the first query
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+        return False
+
+    def update(self, workers=None, cancelled=None, mp_context=None):
+        """Hash the output PDFs added or changed since the last update and forget removed ones.
+
+        Returns how many files were hashed. When cancelled (a function checked
+        after each file) returns True, the files not yet hashed are dropped and
+        concurrent.futures.CancelledError is raised; the files hashed so far are kept.
+        mp_context sets how the worker processes are started."""
+        on_disk = {}
+        for folder, folder_names, file_names in os.walk(self.folder_path):
+            folder_names[:] = [name for name in folder_names if not name.startswith(".")]
+            for file_name in file_names:
+                # Names starting with a dot are OutputWriter's temporary files.
+                if file_name.lower().endswith(".pdf") and not file_name.startswith("."):
+                    output_file_path = os.path.join(folder, file_name)
+                    stat = os.stat(output_file_path)
+                    on_disk[self._relative(output_file_path)] = (stat.st_size, stat.st_mtime_ns)
+        indexed = {path: (size, mtime_ns) for path, size, mtime_ns in self.connection.execute(
+            "SELECT path, size, mtime_ns FROM perceptual_outputs")}
+
+        for path in indexed.keys() - on_disk.keys():
+            self._forget(path)
+        changed = sorted(path for path, stat in on_disk.items() if indexed.get(path) != stat)
+        if changed:
+            with span("update_corpus", files=len(changed)):
+                workers = max(1, min(workers or os.cpu_count() or 1, len(changed)))
+                file_paths = [self._absolute(path) for path in changed]
+                if workers == 1:
+                    results = map(_hash_output, file_paths)
+                else:
+                    executor = ProcessPoolExecutor(max_workers=workers, mp_context=mp_context)
+                    results = executor.map(_hash_output, file_paths, chunksize=16)
+                try:
+                    for path, pages in zip(changed, results):
+                        if cancelled is not None and cancelled():
+                            self.connection.commit()
+                            raise CancelledError()
+                        self._forget(path)
+                        self.connection.execute("INSERT INTO perceptual_outputs VALUES (?, ?, ?)", (path, *on_disk[path]))
+                        self.add_pages(path, pages)
+                finally:
+                    if workers > 1:
+                        executor.shutdown(cancel_futures=True)
+            logger.info("Added %d output files to the near-duplicate index", len(changed))
+        self.connection.commit()
+        return len(changed)
+
+    def _relative(self, output_file_path):
+        return os.path.relpath(output_file_path, self.folder_path).replace(os.sep, "/")
+
+    def _absolute(self, path):
+        return os.path.join(self.folder_path, *path.split("/"))
+
+    def _forget(self, path):
+        self.connection.execute("DELETE FROM perceptual_outputs WHERE path = ?", (path,))
+        self.connection.execute("DELETE FROM perceptual_pages WHERE path = ?", (path,))
+        self._tables = None
+
+    def add_pages(self, path, pages):
+        """Add (page_number, phash, fine_hash) rows for the output at path, relative to the output root."""
+        self.connection.executemany(
+            "INSERT INTO perceptual_pages VALUES (?, ?, ?, ?)",
+            [(path, page_number, _signed(phash), fine_hash.to_bytes(32, "big"))
+             for page_number, phash, fine_hash in pages],
+        )
+        self._tables = None
+
+    def _load(self):
+        """Read the pHashes into memory, with the pages sorted by each part and the start of every bucket."""
+        rows = np.array(self.connection.execute("SELECT rowid, phash FROM perceptual_pages").fetchall(), dtype=np.int64)
+        rows = rows.reshape(-1, 2)
+        self._row_ids, self._phashes = rows[:, 0], rows[:, 1].copy().view(np.uint64)
+        self._tables = []
+        for part_number in range(SUBSTRINGS):
+            parts = (self._phashes >> np.uint64(_SUBSTRING_BITS * (SUBSTRINGS - 1 - part_number))) & np.uint64(_SUBSTRING_MASK)
+            order = np.argsort(parts, kind="stable").astype(np.int32)
+            bucket_starts = np.concatenate(([0], np.cumsum(np.bincount(parts.astype(np.int64), minlength=1 << _SUBSTRING_BITS))))
+            self._tables.append((order, bucket_starts))
+
+    def query(self, phash, fine_hash, max_phash_distance=MAX_PHASH_DISTANCE, max_fine_distance=MAX_FINE_DISTANCE):
+        """[(output_file_path, page_number)] of the corpus pages within the distances of (phash, fine_hash).
+
+        The first query reads every pHash of the corpus into memory (about 40
+        bytes a page); later queries only read the probed buckets."""
+        if self._tables is None:
+            self._load()
+        candidates = []
+        for (order, bucket_starts), part in zip(self._tables, substrings(phash)):
+            probes = part ^ _PROBE_MASKS_ARRAY
+            for start, end in zip(bucket_starts[probes].tolist(), bucket_starts[probes + 1].tolist()):
+                if start < end:
+                    candidates.append(order[start:end])
+        if not candidates:
+            return []
+        # A page found through several parts is checked more than once, which is cheaper than deduplicating first.
+        candidates = np.concatenate(candidates)
+        near = hamming_distances(phash, self._phashes[candidates]) <= max_phash_distance
+        candidates = sorted(set(self._row_ids[candidates[near]].tolist()))
+        if not candidates:
+            return []
+
+        matches = []
+        for start in range(0, len(candidates), 500):  # SQLite limits the parameters per statement
+            batch = candidates[start:start + 500]
+            rows = self.connection.execute(
+                f"SELECT path, page, fine_hash FROM perceptual_pages WHERE rowid IN ({', '.join('?' * len(batch))})", batch
+            )
+            for path, page_number, candidate_fine_hash in rows:
+                if _distance(int.from_bytes(candidate_fine_hash, "big"), fine_hash) <= max_fine_distance:
+                    matches.append((self._absolute(path), page_number))
+        return sorted(matches)
+
+    def close(self):
+        self.connection.close()
+
+
+def _hash_output(output_file_path):
+    try:
+        with fitz.open(output_file_path) as document:
+            return _hash_chunk(document, range(document.page_count))
+    except Exception:
+        logger.exception("Error hashing %s", output_file_path)
+        return []
+
+
+def _signed(value):
+    """SQLite integers are signed 64-bit."""
+    return value - (1 << 64) if value >= 1 << 63 else value
+
+
+def find_near_duplicates(file_path, folder_path=None, workers=None, max_phash_distance=MAX_PHASH_DISTANCE,
+                         max_fine_distance=MAX_FINE_DISTANCE, cancelled=None, mp_context=None):
+    """Group the pages of a PDF that are near-duplicates of each other or of pages already in folder_path.
+
+    Returns a list of {"pages": [page numbers], "outputs": [(output_file_path, page_number)]}
+    groups in page order. A group has two or more pages, or a page and at
+    least one output. Outputs written from this same source are left out.
+    cancelled is a function checked as the work goes; when it returns True,
+    concurrent.futures.CancelledError is raised. mp_context sets how the
+    worker processes are started."""
+    hashes = perceptual_hashes(file_path, workers, cancelled, mp_context)
+
+    # Union-find over the pages, joining every page to the near-duplicates before it.
+    parents = list(range(len(hashes)))
+
+    def root(page_number):
+        while parents[page_number] != page_number:
+            parents[page_number] = parents[parents[page_number]]
+            page_number = parents[page_number]
+        return page_number
+
+    index = HammingIndex()
+    for page_number, pair in enumerate(hashes):
+        if pair is None:
+            continue
+        for other_page in index.query(*pair, max_phash_distance, max_fine_distance):
+            parents[root(page_number)] = root(other_page)
+        index.add(*pair, page_number)
+
+    groups = defaultdict(lambda: {"pages": [], "outputs": []})
+    for page_number, pair in enumerate(hashes):
+        if pair is not None:
+            groups[root(page_number)]["pages"].append(page_number)
+
+    if folder_path and os.path.isdir(folder_path):
+        with ExportIndex(folder_path) as export_index:
+            own_outputs = {os.path.normcase(path) for path in export_index.outputs_of_source(file_content_hash(file_path))}
+        with CorpusIndex(folder_path) as corpus:
+            corpus.update(workers, cancelled, mp_context)
+            with span("query_corpus", pages=len(hashes)):
+                for page_number, pair in enumerate(hashes):
+                    if pair is None:
+                        continue
+                    outputs = groups[root(page_number)]["outputs"]
+                    for match in corpus.query(*pair, max_phash_distance, max_fine_distance):
+                        if os.path.normcase(match[0]) not in own_outputs and match not in outputs:
+                            outputs.append(match)
+
+    return sorted(
+        (group for group in groups.values() if len(group["pages"]) > 1 or group["outputs"]),
+        key=lambda group: group["pages"][0],
+    )
@@ -0,0 +1,338 @@
+"""Writing output PDFs safely into the doc type folders of an output root.
+
+Paths for a whole export are planned up front: every doc type is checked and
+its folder created and listed once, and name collisions (with files already
+there or between outputs) are settled by one of pdf_processor.COLLISION_POLICIES. Each
+output is then written to a temporary file next to its final path and renamed
+into place, so a crash or a full disk never leaves a half-written PDF under a
+real name. Renames are committed in batches, with one fsync per file and one
+per folder for the whole batch, which keeps round trips down on network shares.
+Unless an output is meant to replace a file, it is linked into place rather
+than renamed over it, so a file another export created there since the paths
+were planned is never clobbered; the collision policy is applied again instead.
+
+The "append" policy is the exception: its pages are added to the end of the
+existing file with an incremental save, which writes only the new objects, so
+it writes about as much however large the file already is. Files that have been
+appended to many times can be rewritten in full with compact_output.
+"""
+import logging
+import os
+import re
+
+import fitz  # PyMuPDF
+
+from pdf_processor import (COLLISION_POLICIES, DEFAULT_COLLISION_POLICY, DEFAULT_SAVE_PROFILE, DOC_TYPE_DICTIONARY, SAVE_PROFILES,
+                           balance_page_tree, build_output, write_output)
+
+logger = logging.getLogger(__name__)
+
+# Outputs renamed into place per batch.
+COMMIT_BATCH_FILES = 32
+TEMPORARY_SUFFIX = ".part"
+INVALID_FILE_NAME_CHARACTERS = set('<>:"/\\|?*') | {chr(code) for code in range(32)}
+# The " (2)", " (3)", ... the "rename" policy adds to a file name.
+COPY_NUMBER_PATTERN = re.compile(r"(?P<name>.*) \((?P<copy>\d+)\)")
+
+
+class OutputConflictError(FileExistsError):
+    """An output's path is taken and the collision policy is "error"."""
+
+
+def check_file_name(file_name):
+    """Raise ValueError for a file name that cannot be used for an output in its doc type folder."""
+    if not file_name.strip(". "):
+        raise ValueError(f"'{file_name}' is not a valid file name")
+    invalid = sorted(INVALID_FILE_NAME_CHARACTERS.intersection(file_name))
+    if invalid:
+        raise ValueError(f"File name '{file_name}' contains {', '.join(repr(character) for character in invalid)}")
+
+
+def plan_output_paths(folder_path, plan, doc_type_dictionary=DOC_TYPE_DICTIONARY,
+                      collision_policy=DEFAULT_COLLISION_POLICY, replaceable=()):
+    """Choose the path of every output in a plan of (doc_type, file_name, pages), creating folders as needed.
+
+    Returns one path per output, or None for an output the "skip" policy leaves
+    out. With "append", a taken path is returned as it is, for the output to be
+    appended to it. Raises before anything is written if a doc type is unknown, a file name
+    is invalid or (with the "error" policy) a path is taken. Existing files in
+    replaceable (earlier outputs of the same source) are not collisions and are
+    overwritten. Names are compared case-insensitively, as they are on Windows
+    and most network shares."""
+    if collision_policy not in COLLISION_POLICIES:
+        raise ValueError(f"Unknown collision policy '{collision_policy}'")
+    unknown = sorted({doc_type for doc_type, _, _ in plan if doc_type not in doc_type_dictionary})
+    if unknown:
+        raise ValueError(f"Unknown doc type {', '.join(repr(doc_type) for doc_type in unknown)}")
+    for _, file_name, _ in plan:
+        check_file_name(file_name)
+
+    replaceable = {os.path.normcase(os.path.abspath(path)) for path in replaceable}
+    taken = {}  # doc type folder -> casefolded names of its files
+    for doc_type_folder in {doc_type_dictionary[doc_type] for doc_type, _, _ in plan}:
+        folder = os.path.join(folder_path, doc_type_folder)
+        os.makedirs(folder, exist_ok=True)
+        with os.scandir(folder) as entries:
+            taken[doc_type_folder] = {
+                entry.name.casefold() for entry in entries
+                if os.path.normcase(os.path.abspath(entry.path)) not in replaceable
+            }
+
+    output_paths = []
+    claimed = {doc_type_folder: set() for doc_type_folder in taken}  # Casefolded names planned so far
+    for doc_type, file_name, _ in plan:
+        doc_type_folder = doc_type_dictionary[doc_type]
+        name = f"{file_name}.pdf"
+        # Outputs of one export that differ only in case are always kept apart; with
+        # "overwrite" their numbered names may replace files from earlier exports.
+        avoid = claimed[doc_type_folder] if collision_policy == "overwrite" else taken[doc_type_folder]
+        if name.casefold() in claimed[doc_type_folder] or (collision_policy == "rename" and name.casefold() in avoid):
+            copy = 2
+            while f"{file_name} ({copy}).pdf".casefold() in avoid:
+                copy += 1
+            name = f"{file_name} ({copy}).pdf"
+        elif name.casefold() in taken[doc_type_folder]:
+            if collision_policy == "error":
+                raise OutputConflictError(f"{os.path.join(folder_path, doc_type_folder, name)} already exists")
+            if collision_policy == "skip":
+                output_paths.append(None)
+                continue
+        taken[doc_type_folder].add(name.casefold())
+        claimed[doc_type_folder].add(name.casefold())
+        output_paths.append(os.path.join(folder_path, doc_type_folder, name))
+    return output_paths
+
+
+def verify_output(output_file_path, page_count, size):
+    """Check a written output has the expected size and page count; raise RuntimeError if not.
+
+    Opening the file only reads its trailer and page tree, so this stays cheap
+    however large the output is."""
+    actual_size = os.path.getsize(output_file_path)
+    if actual_size != size:
+        raise RuntimeError(f"{output_file_path} is {actual_size} bytes, expected {size}")
+    with fitz.open(output_file_path) as output_document:
+        if output_document.page_count != page_count:
+            raise RuntimeError(f"{output_file_path} has {output_document.page_count} pages, expected {page_count}")
+
+
+class OutputWriter:
+    """Writes outputs to temporary files and renames them into place in batches.
+
+    Use as a context manager: outputs still pending when the block ends are
+    committed, or removed if it ends with an exception. Until commit() returns,
+    an output exists only under its temporary name.
+
+    An output whose path is taken by the time it is committed, by a file that
+    it was not written to replace, is handled by collision_policy again (see
+    commit). committed_paths maps each output path written to the path it was
+    committed to, or None if it was skipped, and conflicts maps the paths that
+    could not be committed to the OutputConflictError raised for them."""
+
+    def __init__(self, sync=True, batch_files=COMMIT_BATCH_FILES, collision_policy=DEFAULT_COLLISION_POLICY):
+        self.sync = sync
+        self.batch_files = batch_files
+        self.collision_policy = collision_policy
+        self.committed_paths = {}
+        self.conflicts = {}
+        self._pending = []  # (temporary path, output path, whether it may replace an existing file)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        if exc_type is None:
+            self.commit()
+        else:
+            self.abort()
+        return False
+
+    def write(self, source_document, pages, output_file_path, save_profile=DEFAULT_SAVE_PROFILE, corrections=None,
+              replace=False):
+        """Write the pages to a temporary file for output_file_path and return its size in bytes.
+
+        corrections is passed on to pdf_processor.write_output. With replace (or
+        the "overwrite" policy) the output replaces any file at its path when it
+        is committed, as for an earlier output of the same source."""
+        folder, name = os.path.split(output_file_path)
+        temporary_path = os.path.join(folder, f".{name}.{os.getpid()}{TEMPORARY_SUFFIX}")
+        try:
+            bytes_out = write_output(source_document, pages, temporary_path, save_profile, corrections)
+        except Exception:
+            _remove(temporary_path)
+            raise
+        self._pending.append((temporary_path, output_file_path, replace or self.collision_policy == "overwrite"))
+        if len(self._pending) >= self.batch_files:
+            self.commit()
+        return bytes_out
+
+    def append(self, source_document, pages, output_file_path, save_profile=DEFAULT_SAVE_PROFILE, corrections=None):
+        """Append the pages to the existing PDF at output_file_path and return the bytes added.
+
+        This happens at once rather than at commit(), as an incremental save: the
+        new objects and a new cross-reference section are written after the end
+        of the file and nothing before it is touched. So if anything fails, the
+        file is cut back to its old length, which restores it exactly. The new
+        pages are built as write() builds them, but only the profile's deflate
+        applies, since the other options need a full rewrite."""
+        old_size = os.path.getsize(output_file_path)
+        try:
+            with fitz.open(output_file_path) as output_document:
+                if output_document.needs_pass or not output_document.can_save_incrementally():
+                    raise RuntimeError(f"{output_file_path} cannot be appended to: it is encrypted, or damaged and "
+                                       f"needs compacting")
+                page_count = output_document.page_count + len(pages)
+                new_pages = build_output(source_document, pages, save_profile, corrections)
+                # Copying links looks up pages throughout the target, so only when there are any.
+                output_document.insert_pdf(new_pages, links=any(page.first_link for page in new_pages))
+                new_pages.close()
+                output_document.save(output_file_path, incremental=True, encryption=fitz.PDF_ENCRYPT_KEEP,
+                                     deflate=SAVE_PROFILES[save_profile].get("deflate", False))
+            if self.sync:
+                _fsync_path(output_file_path)
+            verify_output(output_file_path, page_count, os.path.getsize(output_file_path))
+        except Exception:
+            if os.path.getsize(output_file_path) != old_size:
+                os.truncate(output_file_path, old_size)
+            raise
+        return os.path.getsize(output_file_path) - old_size
+
+    def commit(self):
+        """Make every pending output durable (when syncing) and move it to its final path.
+
+        Outputs that may replace a file are renamed over it. The others are
+        linked into place, which fails rather than replace a file created at
+        their path since it was planned (by another export into the same
+        folder, say); collision_policy then decides again: "rename" moves on to
+        the next free numbered name, "skip" drops the output and any other
+        policy records an OutputConflictError in conflicts."""
+        pending, self._pending = self._pending, []
+        if not pending:
+            return
+        try:
+            if self.sync:
+                for temporary_path, _, _ in pending:
+                    _fsync_path(temporary_path)
+            for temporary_path, output_file_path, replace in pending:
+                if replace:
+                    os.replace(temporary_path, output_file_path)
+                    self.committed_paths[output_file_path] = output_file_path
+                    continue
+                try:
+                    self.committed_paths[output_file_path] = _commit_exclusively(
+                        temporary_path, output_file_path, self.collision_policy)
+                except OutputConflictError as e:
+                    self.conflicts[output_file_path] = e
+        except Exception:
+            for temporary_path, _, _ in pending:
+                _remove(temporary_path)
+            raise
+        if self.sync and os.name == "posix":
+            # Make the renames themselves durable; Windows cannot open a folder to sync it.
+            for folder in {os.path.dirname(output_file_path) for _, output_file_path, _ in pending}:
+                _fsync_path(folder, os.O_RDONLY)
+        logger.debug("Committed %d outputs", len(pending))
+
+    def abort(self):
+        """Remove the temporary files of outputs that were not committed."""
+        pending, self._pending = self._pending, []
+        for temporary_path, _, _ in pending:
+            _remove(temporary_path)
+
+
+def _commit_exclusively(temporary_path, output_file_path, collision_policy):
+    """Move temporary_path to output_file_path without replacing a file there, and return the path used.
+
+    See OutputWriter.commit for what happens when the path is taken; a skipped
+    output's temporary file is removed and None returned."""
+    folder, name = os.path.split(output_file_path)
+    stem, extension = os.path.splitext(name)
+    numbered = COPY_NUMBER_PATTERN.fullmatch(stem)
+    if numbered:
+        stem, copy = numbered.group("name"), int(numbered.group("copy"))
+    else:
+        copy = 1
+    path = output_file_path
+    while True:
+        try:
+            _link(temporary_path, path)
+            break
+        except FileExistsError:
+            if collision_policy == "rename":
+                copy += 1
+                path = os.path.join(folder, f"{stem} ({copy}){extension}")
+                continue
+            _remove(temporary_path)
+            if collision_policy == "skip":
+                logger.info("Not saving %s; another export created it meanwhile", output_file_path)
+                return None
+            raise OutputConflictError(f"{path} was created by another export while this one was being written")
+    _remove(temporary_path)
+    if path != output_file_path:
+        logger.info("Saved %s as %s; another export created it meanwhile", output_file_path, path)
+    return path
+
+
+def _link(temporary_path, path):
+    """Give temporary_path the name path too, raising FileExistsError if path exists."""
+    try:
+        os.link(temporary_path, path)
+    except FileExistsError:
+        raise
+    except OSError:
+        # Filesystems without hard links (FAT, some network shares): claim the
+        # name with an exclusive create, then rename over the empty file.
+        os.close(os.open(path, os.O_CREAT | os.O_EXCL | os.O_WRONLY))
+        os.replace(temporary_path, path)
+
+
+def compact_output(output_file_path, save_profile=DEFAULT_SAVE_PROFILE, sync=True):
+    """Rewrite a PDF that has been appended to as a single revision and return (bytes before, bytes after).
+
+    The incremental saves of every append leave the objects they replaced and
+    one cross-reference section each behind; a full save drops them and, with
+    save_profile's options, merges the resources the appended pages copied
+    again, and the page tree is regrouped for later appends (see
+    pdf_processor.balance_page_tree). The rewrite goes through a temporary file,
+    like write()."""
+    folder, name = os.path.split(output_file_path)
+    temporary_path = os.path.join(folder, f".{name}.{os.getpid()}{TEMPORARY_SUFFIX}")
+    save_options = {option: value for option, value in SAVE_PROFILES[save_profile].items()
+                    if option not in ("image_dpi", "image_quality")}
+    bytes_before = os.path.getsize(output_file_path)
+    try:
+        with fitz.open(output_file_path) as output_document:
+            page_count = output_document.page_count
+            balance_page_tree(output_document)
+            output_document.save(temporary_path, garbage=max(1, save_options.pop("garbage", 0)), **save_options)
+        verify_output(temporary_path, page_count, os.path.getsize(temporary_path))
+        if sync:
+            _fsync_path(temporary_path)
+        os.replace(temporary_path, output_file_path)
+    except Exception:
+        _remove(temporary_path)
+        raise
+    if sync and os.name == "posix":
+        _fsync_path(folder, os.O_RDONLY)
+    return bytes_before, os.path.getsize(output_file_path)
+
+
+def revision_count(output_file_path):
+    """How many times a PDF has been saved: 1 for a file written in one go, one more for each incremental save."""
+    with fitz.open(output_file_path) as output_document:
+        return output_document.version_count
+
+
+def _fsync_path(path, flags=os.O_RDWR):
+    descriptor = os.open(path, flags | getattr(os, "O_BINARY", 0))
+    try:
+        os.fsync(descriptor)
+    finally:
+        os.close(descriptor)
+
+
+def _remove(path):
+    try:
+        os.remove(path)
+    except FileNotFoundError:
+        pass
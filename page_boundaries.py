@@ -0,0 +1,118 @@
+import re
+
+import fitz  # PyMuPDF
+import numpy as np
+
+import text_index
+from document_cache import map_page_chunks
+
+# Text that marks a separator sheet between the documents of a scanned batch:
+# patch codes (Patch 2, Patch T, ...) and separator barcodes, whose values
+# scanning software writes into the text layer.
+SEPARATOR_PATTERN = re.compile(
+    r"\bpatch\s*(?:code\s*)?(?:iii|ii|iv|vi|i|t|[1-6])\b|\b(?:document\s+)?separator(?:\s+sheet)?\b",
+    re.IGNORECASE,
+)
+
+# Pages are rendered in gray at ANALYSIS_DPI. The paper level is the page's median
+# brightness; pixels at least INK_CONTRAST darker than the paper are ink. The
+# outer MARGIN of each side is ignored, since scanners leave shadows and punched
+# holes along the edges. At this resolution dust and speckle blur into the paper,
+# so a single line of text is still well above BLANK_INK_RATIO, the share of the
+# area in ink below which a page is blank. A page
+# whose paper is darker than SEPARATOR_PAPER_LEVEL is a coloured separator sheet,
+# and BLANK_SEPARATOR_RUN or more blank pages in a row are a blank separator sheet
+# scanned on both sides. A single blank page (a blank back) is only skipped.
+ANALYSIS_DPI = 24
+INK_CONTRAST = 48
+MARGIN = 0.08
+BLANK_INK_RATIO = 0.0002
+SEPARATOR_PAPER_LEVEL = 170
+BLANK_SEPARATOR_RUN = 2
+PAGES_PER_CHUNK = 50
+
+
+def is_separator_text(text, separator_pattern=SEPARATOR_PATTERN):
+    return bool(separator_pattern.search(text))
+
+
+def measure_ink(pixmap, ink_contrast=INK_CONTRAST, margin=MARGIN):
+    """(ink ratio, paper level) of a grayscale pixmap."""
+    samples = np.frombuffer(pixmap.samples_mv, dtype=np.uint8).reshape(pixmap.height, pixmap.stride)[:, :pixmap.width]
+    margin_y, margin_x = int(pixmap.height * margin), int(pixmap.width * margin)
+    samples = samples[margin_y:pixmap.height - margin_y, margin_x:pixmap.width - margin_x]
+    if not samples.size:
+        return 0.0, 255
+    paper_level = int(np.median(samples))
+    ink_ratio = float(np.count_nonzero(samples < paper_level - ink_contrast)) / samples.size
+    return ink_ratio, paper_level
+
+
+def _measure_chunk(document, page_numbers, dpi, ink_contrast, margin):
+    matrix = fitz.Matrix(dpi / 72, dpi / 72)
+    return [
+        (page_number, measure_ink(document[page_number].get_pixmap(matrix=matrix, colorspace=fitz.csGRAY),
+                                  ink_contrast, margin))
+        for page_number in page_numbers
+    ]
+
+
+def measure_pages(file_path, workers=None, dpi=ANALYSIS_DPI, ink_contrast=INK_CONTRAST, margin=MARGIN, cancelled=None,
+                  mp_context=None):
+    """(ink ratio, paper level) of every page, measured on tiny renders by a pool of processes.
+
+    mp_context sets how the processes are started (see document_cache.map_page_chunks)."""
+    with fitz.open(file_path) as document:
+        total_pages = document.page_count
+    measurements = [None] * total_pages
+    for _, chunk in map_page_chunks(file_path, total_pages, _measure_chunk, (dpi, ink_contrast, margin),
+                                    pages_per_chunk=PAGES_PER_CHUNK, workers=workers, span_name="measure_pages",
+                                    mp_context=mp_context, cancelled=cancelled):
+        for page_number, measurement in chunk:
+            measurements[page_number] = measurement
+    return measurements
+
+
+def classify_measurements(measurements, blank_ink_ratio=BLANK_INK_RATIO, separator_paper_level=SEPARATOR_PAPER_LEVEL,
+                          blank_separator_run=BLANK_SEPARATOR_RUN):
+    """Split page measurements into (separator_pages, blank_pages)."""
+    separator_pages = set()
+    blank_pages = []
+    for page_number, (ink_ratio, paper_level) in enumerate(measurements):
+        if paper_level < separator_paper_level:
+            separator_pages.add(page_number)
+        elif ink_ratio < blank_ink_ratio:
+            blank_pages.append(page_number)
+
+    run = []
+    for page_number in blank_pages + [None]:
+        if run and page_number != run[-1] + 1:
+            if len(run) >= blank_separator_run:
+                separator_pages.update(run)
+            run = []
+        if page_number is not None:
+            run.append(page_number)
+    return sorted(separator_pages), [page for page in blank_pages if page not in separator_pages]
+
+
+def detect_boundaries(file_path, separator_pattern=SEPARATOR_PATTERN, workers=None, cancelled=None, mp_context=None,
+                      **thresholds):
+    """Find the pages that separate the documents of a batch, and blank pages within them.
+
+    Returns (separator_pages, blank_pages). Separators are recognised from their
+    text (read from text_index's per-document cache), from coloured paper, or
+    as a run of blank pages. thresholds may set dpi, ink_contrast, margin,
+    blank_ink_ratio, separator_paper_level and blank_separator_run in place of
+    the module defaults. cancelled is a function checked as the work goes;
+    when it returns True, concurrent.futures.CancelledError is raised.
+    mp_context sets how the worker processes are started."""
+    measure_options = {name: thresholds.pop(name) for name in ("dpi", "ink_contrast", "margin") if name in thresholds}
+    measurements = measure_pages(file_path, workers, cancelled=cancelled, mp_context=mp_context, **measure_options)
+    separator_pages, blank_pages = classify_measurements(measurements, **thresholds)
+
+    text_separators = [
+        page_number for page_number, text in text_index.iter_page_texts(file_path, workers, cancelled, mp_context)
+        if is_separator_text(text, separator_pattern)
+    ]
+    separator_pages = set(separator_pages).union(text_separators)
+    return sorted(separator_pages), [page for page in blank_pages if page not in separator_pages]
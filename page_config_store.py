@@ -0,0 +1,244 @@
+from array import array
+
+DEFAULT_FILE_NAME = "Enter file name"
+DEFAULT_DOC_TYPE = "Choose file type"
+
+
+def parse_page_ranges(pages):
+    """Turn "1-3, 5" (or a list of such parts) into sorted 0-based page numbers."""
+    if isinstance(pages, int):
+        pages = [pages]
+    if isinstance(pages, str):
+        pages = pages.split(",")
+    page_numbers = set()
+    for part in pages:
+        part = str(part).strip()
+        if not part:
+            continue
+        first, _, last = part.partition("-")
+        first = int(first)
+        last = int(last) if last else first
+        if first < 1 or last < first:
+            raise ValueError(f"Invalid page range '{part}'")
+        page_numbers.update(range(first - 1, last))
+    return sorted(page_numbers)
+
+
+class _StringTable:
+    """Interns strings as small integer ids; id 0 is the "not filled in" placeholder."""
+
+    def __init__(self, placeholder):
+        self.strings = [placeholder]
+        self.ids = {placeholder: 0}
+
+    def intern(self, string):
+        string_id = self.ids.get(string)
+        if string_id is None:
+            string_id = self.ids[string] = len(self.strings)
+            self.strings.append(string)
+        return string_id
+
+
+class PageConfigStore:
+    """File name and doc type of every page, stored as two arrays of interned string ids.
+
+    Pages still showing a placeholder are tracked in sets that are updated on
+    every change, so checking whether the document is ready to save does not
+    scan the pages. Indexing or iterating yields {"file_name", "doc_type"} dicts
+    like the plain list of dicts this replaces, or None for a skipped page
+    (a blank or separator page that is not exported). Separator pages are
+    skipped pages that also mark where one document of a batch ends. A page
+    with a (rotation, skew) correction (see page_orientation) also has it
+    under "correction", and is straightened when exported."""
+
+    def __init__(self, total_pages):
+        self.total_pages = total_pages
+        # Optional SessionJournal that every change is recorded to.
+        self.journal = None
+        self.clear()
+
+    def clear(self):
+        """Reset every page to the placeholders."""
+        if self.journal is not None:
+            self.journal.record_clear()
+        self._file_names = _StringTable(DEFAULT_FILE_NAME)
+        self._doc_types = _StringTable(DEFAULT_DOC_TYPE)
+        self._file_name_ids = array("I", bytes(4 * self.total_pages))
+        self._doc_type_ids = array("H", bytes(2 * self.total_pages))
+        self._missing_file_names = set(range(self.total_pages))
+        self._missing_doc_types = set(range(self.total_pages))
+        self._skipped = set()
+        self._separators = set()
+        self._corrections = {}  # page number -> (rotation, skew)
+
+    def __len__(self):
+        return self.total_pages
+
+    def __getitem__(self, page_number):
+        if page_number in self._skipped:
+            return None
+        configuration = {"file_name": self.get_file_name(page_number), "doc_type": self.get_doc_type(page_number)}
+        if page_number in self._corrections:
+            configuration["correction"] = self._corrections[page_number]
+        return configuration
+
+    def __iter__(self):
+        file_names = self._file_names.strings
+        doc_types = self._doc_types.strings
+        skipped = self._skipped
+        corrections = self._corrections
+        for page_number, (file_name_id, doc_type_id) in enumerate(zip(self._file_name_ids, self._doc_type_ids)):
+            if page_number in skipped:
+                yield None
+            elif page_number in corrections:
+                yield {"file_name": file_names[file_name_id], "doc_type": doc_types[doc_type_id],
+                       "correction": corrections[page_number]}
+            else:
+                yield {"file_name": file_names[file_name_id], "doc_type": doc_types[doc_type_id]}
+
+    def get_file_name(self, page_number):
+        return self._file_names.strings[self._file_name_ids[page_number]]
+
+    def get_doc_type(self, page_number):
+        return self._doc_types.strings[self._doc_type_ids[page_number]]
+
+    def set_file_name(self, page_number, file_name):
+        self.assign_range(page_number, page_number, file_name=file_name)
+
+    def set_doc_type(self, page_number, doc_type):
+        self.assign_range(page_number, page_number, doc_type=doc_type)
+
+    def assign_range(self, first, last, file_name=None, doc_type=None):
+        """Give pages first to last (inclusive, 0-based) the same file name and/or doc type."""
+        if not 0 <= first <= last < self.total_pages:
+            raise IndexError(f"Page range {first + 1}-{last + 1} is outside the document")
+        if first == last:
+            # Editing fields calls this on every page change; only record real changes.
+            if file_name == self.get_file_name(first):
+                file_name = None
+            if doc_type == self.get_doc_type(first):
+                doc_type = None
+        if self.journal is not None and (file_name is not None or doc_type is not None):
+            self.journal.record_range(first, last, file_name, doc_type)
+        pages = range(first, last + 1)
+        if file_name is not None:
+            file_name_id = self._file_names.intern(file_name)
+            self._file_name_ids[first:last + 1] = array("I", [file_name_id]) * len(pages)
+            if file_name_id:
+                self._missing_file_names.difference_update(pages)
+            else:
+                self._missing_file_names.update(pages)
+        if doc_type is not None:
+            doc_type_id = self._doc_types.intern(doc_type)
+            self._doc_type_ids[first:last + 1] = array("H", [doc_type_id]) * len(pages)
+            if doc_type_id:
+                self._missing_doc_types.difference_update(pages)
+            else:
+                self._missing_doc_types.update(pages)
+
+    def assign_pages(self, page_numbers, file_name=None, doc_type=None):
+        """Give arbitrary pages the same labels, one range call per run of consecutive pages."""
+        for first, last in page_runs(sorted(page_numbers)):
+            self.assign_range(first, last, file_name, doc_type)
+
+    def skip_pages(self, page_numbers, skipped=True):
+        """Leave pages out of the export (or bring them back); their labels are kept."""
+        for first, last in page_runs(sorted(page_numbers)):
+            if self.journal is not None:
+                self.journal.record_skip(first, last, skipped)
+            if skipped:
+                self._skipped.update(range(first, last + 1))
+            else:
+                self._skipped.difference_update(range(first, last + 1))
+
+    def mark_separators(self, page_numbers, separator=True):
+        """Mark pages as separators between documents, which also skips them (or unmark them)."""
+        for first, last in page_runs(sorted(page_numbers)):
+            if self.journal is not None:
+                self.journal.record_separator(first, last, separator)
+            pages = range(first, last + 1)
+            if separator:
+                self._separators.update(pages)
+                self._skipped.update(pages)
+            else:
+                self._separators.difference_update(pages)
+
+    def correct_pages(self, page_numbers, rotation=0, skew=0.0):
+        """Straighten pages on export by the clockwise rotation (a multiple of 90) and skew, in degrees.
+
+        A correction of (0, 0.0) removes an earlier one."""
+        for first, last in page_runs(sorted(page_numbers)):
+            if self.journal is not None:
+                self.journal.record_correction(first, last, rotation, skew)
+            for page_number in range(first, last + 1):
+                if rotation or skew:
+                    self._corrections[page_number] = (rotation, skew)
+                else:
+                    self._corrections.pop(page_number, None)
+
+    def get_correction(self, page_number):
+        return self._corrections.get(page_number, (0, 0.0))
+
+    def corrections(self):
+        """{page number: (rotation, skew)} of every corrected page."""
+        return dict(self._corrections)
+
+    def is_skipped(self, page_number):
+        return page_number in self._skipped
+
+    def is_separator(self, page_number):
+        return page_number in self._separators
+
+    def skipped_pages(self):
+        return sorted(self._skipped)
+
+    def separator_pages(self):
+        return sorted(self._separators)
+
+    def segments(self):
+        """Inclusive (first, last) page spans between separator pages; each is one document in the batch.
+
+        Spans made up only of skipped pages are left out."""
+        segments = []
+        for first, last in page_runs(page for page in range(self.total_pages) if page not in self._separators):
+            if any(page not in self._skipped for page in range(first, last + 1)):
+                segments.append((first, last))
+        return segments
+
+    def is_complete(self):
+        """True when every page that is not skipped has a file name and a doc type."""
+        if self._skipped:
+            return not (self._missing_file_names - self._skipped) and not (self._missing_doc_types - self._skipped)
+        return not self._missing_file_names and not self._missing_doc_types
+
+    def pages_missing_file_name(self):
+        return sorted(self._missing_file_names - self._skipped)
+
+    def pages_missing_doc_type(self):
+        return sorted(self._missing_doc_types - self._skipped)
+
+    def runs(self):
+        """Run-length ranges of pages with identical labels, as (first, last, file_name, doc_type)."""
+        runs = []
+        previous = None
+        for page_number, key in enumerate(zip(self._file_name_ids, self._doc_type_ids)):
+            if key == previous:
+                runs[-1][1] = page_number
+            else:
+                runs.append([page_number, page_number, key])
+                previous = key
+        return [
+            (first, last, self._file_names.strings[file_name_id], self._doc_types.strings[doc_type_id])
+            for first, last, (file_name_id, doc_type_id) in runs
+        ]
+
+
+def page_runs(pages):
+    """Collapse sorted page numbers into inclusive (first, last) runs of consecutive pages."""
+    runs = []
+    for page_number in pages:
+        if runs and runs[-1][1] == page_number - 1:
+            runs[-1][1] = page_number
+        else:
+            runs.append([page_number, page_number])
+    return [(first, last) for first, last in runs]
@@ -0,0 +1,192 @@
+import math
+
+import fitz  # PyMuPDF
+import numpy as np
+
+from document_cache import map_page_chunks
+
+# Pages are rendered in gray at ANALYSIS_DPI, and pixels at least INK_CONTRAST
+# darker than the paper (the median brightness) are ink; the outer MARGIN of
+# each side is ignored. Pages with less than MIN_INK_RATIO of ink have nothing
+# to go by and are left alone. Lines of text give a sharp projection profile
+# (ink summed across the lines) only when projected along them, so the angle
+# and axis with the sharpest profile within MAX_SKEW degrees of either axis
+# give the skew and whether the page is sideways. Whether it is upside down
+# comes from the lines themselves: Latin text has more ascenders than
+# descenders, and is aligned on the left but ragged on the right. Skews
+# smaller than MIN_SKEW are not worth correcting.
+#
+# A page with at least MIN_TEXT_CHARACTERS in its text layer is judged by the
+# direction of its text lines instead, which is exact and needs no render.
+#
+# Every correction is (rotation, skew): the clockwise turn in degrees, a
+# multiple of 90, and the clockwise skew in degrees that make the page, as
+# displayed, upright.
+ANALYSIS_DPI = 100
+INK_CONTRAST = 64
+MARGIN = 0.04
+MIN_INK_RATIO = 0.002
+MAX_SKEW = 5.0
+SKEW_STEP = 0.5
+MIN_SKEW = 0.2
+MIN_TEXT_CHARACTERS = 20
+# Ink pixels sampled for the coarse skew search.
+SKEW_SAMPLE = 10000
+PAGES_PER_CHUNK = 20
+
+NO_CORRECTION = (0, 0.0)
+
+
+def _profile_sharpness(rows, columns, angles):
+    """Sharpness of the profile of ink at (rows, columns) projected along each angle (degrees, clockwise tilt)."""
+    offsets = np.tan(np.radians(angles))[:, None] * columns[None, :]
+    bins = np.rint(rows[None, :] - offsets).astype(np.int64)
+    bins -= bins.min()
+    bin_count = int(bins.max()) + 1
+    bins += np.arange(len(angles))[:, None] * bin_count
+    profiles = np.bincount(bins.ravel(), minlength=len(angles) * bin_count).reshape(len(angles), bin_count)
+    differences = np.diff(profiles.astype(np.float64), axis=1)
+    return (differences * differences).sum(axis=1)
+
+
+def _find_skew(rows, columns, max_skew=MAX_SKEW):
+    """(sharpness, angle) of the sharpest projection of the ink across rows."""
+    coarse = np.arange(-max_skew, max_skew + SKEW_STEP / 2, SKEW_STEP)
+    sharpness = _profile_sharpness(rows, columns, coarse)
+    best = float(coarse[int(np.argmax(sharpness))])
+    fine = np.arange(best - SKEW_STEP, best + SKEW_STEP + 0.01, SKEW_STEP / 5)
+    sharpness = _profile_sharpness(rows, columns, fine)
+    return float(sharpness.max()), float(fine[int(np.argmax(sharpness))])
+
+
+def _upright_score(ink, skew):
+    """Positive when the lines of text in an ink mask read upright, negative when upside down."""
+    rows, columns = np.nonzero(ink)
+    rows = np.rint(rows - np.tan(np.radians(skew)) * columns).astype(np.int64)
+    rows -= rows.min()
+    profile = np.bincount(rows).astype(np.float64)
+    in_line = profile > profile.max() * 0.05
+    edges = np.flatnonzero(np.diff(np.concatenate(([0], in_line.view(np.int8), [0]))))
+    ascenders = descenders = 0.0
+    starts, ends = [], []
+    for top, bottom in zip(edges[::2], edges[1::2]):
+        if bottom - top < 4:
+            continue  # Rules, specks and underlines
+        band = profile[top:bottom]
+        x_height = np.flatnonzero(band > band.max() * 0.5)
+        ascenders += band[:x_height[0]].sum()
+        descenders += band[x_height[-1] + 1:].sum()
+        line_columns = columns[(rows >= top) & (rows < bottom)]
+        starts.append(line_columns.min())
+        ends.append(line_columns.max())
+    if len(starts) < 2:
+        return 0.0
+    ascender_score = (ascenders - descenders) / max(1.0, ascenders + descenders)
+    start_spread, end_spread = np.std(starts), np.std(ends)
+    alignment_score = (end_spread - start_spread) / max(1.0, end_spread + start_spread)
+    return ascender_score + alignment_score
+
+
+def measure_orientation(pixmap, ink_contrast=INK_CONTRAST, margin=MARGIN, max_skew=MAX_SKEW):
+    """(rotation, skew) correction of a grayscale render of a page."""
+    samples = np.frombuffer(pixmap.samples_mv, dtype=np.uint8).reshape(pixmap.height, pixmap.stride)[:, :pixmap.width]
+    margin_y, margin_x = int(pixmap.height * margin), int(pixmap.width * margin)
+    samples = samples[margin_y:pixmap.height - margin_y, margin_x:pixmap.width - margin_x]
+    if not samples.size:
+        return NO_CORRECTION
+    ink = samples < int(np.median(samples)) - ink_contrast
+    rows, columns = np.nonzero(ink)
+    if len(rows) < ink.size * MIN_INK_RATIO:
+        return NO_CORRECTION
+    if len(rows) > SKEW_SAMPLE:
+        sample = np.random.default_rng(0).choice(len(rows), SKEW_SAMPLE, replace=False)
+        rows, columns = rows[sample], columns[sample]
+
+    across, across_skew = _find_skew(rows, columns, max_skew)
+    # The same ink turned a quarter counterclockwise, as np.rot90 turns the mask
+    along, along_skew = _find_skew(ink.shape[1] - 1 - columns, rows, max_skew)
+    if along > across:
+        # The lines run down the page; turning it a quarter counterclockwise makes them horizontal.
+        ink, quarter_turns, skew = np.rot90(ink), 1, along_skew
+    else:
+        quarter_turns, skew = 0, across_skew
+    if _upright_score(ink, skew) < 0:
+        quarter_turns += 2  # A half turn leaves the skew as it is.
+    rotation = (-90 * quarter_turns) % 360
+    skew = -skew if abs(skew) >= MIN_SKEW else 0.0
+    return rotation, round(skew, 2)
+
+
+def text_orientation(page, min_characters=MIN_TEXT_CHARACTERS):
+    """(rotation, skew) correction from the direction of a page's text lines, or None if it has too little text."""
+    weights = {}
+    for block in page.get_text("dict", flags=0)["blocks"]:
+        for line in block.get("lines", ()):
+            characters = sum(len(span["text"].strip()) for span in line["spans"])
+            if characters:
+                # Counterclockwise angle of the line in the unrotated page; y points down.
+                angle = math.degrees(math.atan2(-line["dir"][1], line["dir"][0]))
+                key = round(angle, 1)
+                weights[key] = weights.get(key, 0) + characters
+    if sum(weights.values()) < min_characters:
+        return None
+    angle = max(weights, key=weights.get) - page.rotation
+    rotation = round(angle / 90) * 90 % 360
+    skew = angle - round(angle / 90) * 90
+    return rotation, round(skew, 2) if abs(skew) >= MIN_SKEW else 0.0
+
+
+def _measure_chunk(document, page_numbers, dpi, use_text):
+    matrix = fitz.Matrix(dpi / 72, dpi / 72)
+    corrections = []
+    for page_number in page_numbers:
+        page = document[page_number]
+        correction = text_orientation(page) if use_text else None
+        if correction is None:
+            correction = measure_orientation(page.get_pixmap(matrix=matrix, colorspace=fitz.csGRAY))
+        corrections.append((page_number, correction))
+    return corrections
+
+
+def detect_orientation(file_path, workers=None, dpi=ANALYSIS_DPI, use_text=True, mp_context=None, cancelled=None):
+    """(rotation, skew) correction of every page, measured by a pool of processes.
+
+    mp_context sets how the processes are started, and cancelled stops the
+    work early (see document_cache.map_page_chunks)."""
+    with fitz.open(file_path) as document:
+        total_pages = document.page_count
+    corrections = [NO_CORRECTION] * total_pages
+    for _, chunk in map_page_chunks(file_path, total_pages, _measure_chunk, (dpi, use_text),
+                                    pages_per_chunk=PAGES_PER_CHUNK, workers=workers, span_name="detect_orientation",
+                                    mp_context=mp_context, cancelled=cancelled):
+        for page_number, correction in chunk:
+            corrections[page_number] = correction
+    return corrections
+
+
+def apply_correction(page, rotation, skew):
+    """Straighten a page of a document being written, without re-rendering it.
+
+    The rotation goes into the page's /Rotate. The skew turns the page's
+    content about its centre: the content streams are wrapped in a transform,
+    which leaves them untouched and costs two tiny streams."""
+    if skew:
+        document = page.parent
+        angle = math.radians(skew)
+        cosine, sine = math.cos(angle), math.sin(angle)
+        # Clockwise about the centre of the media box, in PDF space (y points up). A turn
+        # of the content shows as the same turn whatever the page's /Rotate.
+        centre_x, centre_y = (page.mediabox.x0 + page.mediabox.x1) / 2, (page.mediabox.y0 + page.mediabox.y1) / 2
+        matrix = (cosine, -sine, sine, cosine,
+                  centre_x - cosine * centre_x - sine * centre_y, centre_y + sine * centre_x - cosine * centre_y)
+        contents = page.get_contents()
+        wrappers = []
+        for stream in (b"q %.6f %.6f %.6f %.6f %.4f %.4f cm\n" % matrix, b"\nQ"):
+            xref = document.get_new_xref()
+            document.update_object(xref, "<<>>")
+            document.update_stream(xref, stream, compress=False)
+            wrappers.append(xref)
+        references = " ".join(f"{xref} 0 R" for xref in [wrappers[0], *contents, wrappers[1]])
+        document.xref_set_key(page.xref, "Contents", f"[{references}]")
+    if rotation:
+        page.set_rotation((page.rotation + rotation) % 360)
@@ -1,20 +1,317 @@
 import fitz  # PyMuPDF
+import logging
+import mmap
 import os
+import threading
+import time
+from collections import OrderedDict
+
+import near_duplicates
+import page_boundaries
+import page_orientation
+from instrumentation import span
+from page_config_store import page_runs
+
+logger = logging.getLogger(__name__)
+
+
+DOC_TYPE_DICTIONARY = {
+    "Insurance Auth" : "Insurance Auths",
+    "ID" : "ID'S",
+    "OrthoK" : "OrthoK",
+    "Outside Rx" : "Outside Rx",
+    "POF Waiver" : "POF Waivers",
+    "Rx Request" : "Prescription Requests",
+    "Referrals" : "Referrals",
+    "Summaries" : "Summaries"
+}
+
+
+# How outputs are written. "fast" saves the copied pages as they are; "compact"
+# drops unused objects, merges duplicates, compresses streams and packs objects
+# into object streams, all losslessly; "scan" also recompresses images above
+# image_dpi to JPEG at image_quality, which is lossy but shrinks scans the most.
+SAVE_PROFILES = {
+    "fast": {},
+    "compact": {"garbage": 3, "deflate": True, "use_objstms": True},
+    "scan": {"garbage": 3, "deflate": True, "use_objstms": True, "image_dpi": 150, "image_quality": 75},
+}
+DEFAULT_SAVE_PROFILE = "compact"
+
+# What happens when an output's path is already taken: "rename" adds " (2)",
+# " (3)", ... to the file name, "overwrite" replaces the existing file, "skip"
+# leaves it and does not write the output, "append" adds the output's pages to
+# the end of the existing PDF with an incremental save (see
+# output_writer.OutputWriter.append), and "error" fails the export.
+COLLISION_POLICIES = ("rename", "overwrite", "skip", "append", "error")
+DEFAULT_COLLISION_POLICY = "rename"
+
+
+# Rendered pages kept per document, and how many pages either side of the
+# current one are rendered ahead of time.
+RENDER_CACHE_BYTES = 256 * 1024 * 1024
+PREFETCH_RADIUS = 2
+
+# Zoom factors and clip rectangles are snapped to these steps before rendering,
+# so small changes in the view size reuse the same cached renders.
+ZOOM_STEP = 0.05
+CLIP_GRID = 64  # points
+
+
+def snap_zoom(zoom):
+    """Round a zoom factor to the nearest ZOOM_STEP (and never below one step)."""
+    return max(ZOOM_STEP, round(round(zoom / ZOOM_STEP) * ZOOM_STEP, 2))
+
+
+def snap_clip(clip, page_rect):
+    """Grow a clip rectangle outwards to the CLIP_GRID and keep it inside the page.
+
+    Returns None when the snapped clip covers the whole page."""
+    x0 = max(page_rect.x0, (clip.x0 // CLIP_GRID) * CLIP_GRID)
+    y0 = max(page_rect.y0, (clip.y0 // CLIP_GRID) * CLIP_GRID)
+    x1 = min(page_rect.x1, -(-clip.x1 // CLIP_GRID) * CLIP_GRID)
+    y1 = min(page_rect.y1, -(-clip.y1 // CLIP_GRID) * CLIP_GRID)
+    snapped = fitz.Rect(x0, y0, x1, y1)
+    if snapped.contains(page_rect):
+        return None
+    return snapped
+
+
+def plan_outputs(page_configurations):
+    """Group pages that share a doc type and file name into one output each.
+
+    Returns a list of (doc_type, file_name, pages) in the order each output first
+    appears, with the pages of every output in ascending order. Pages whose
+    configuration is None are left out."""
+    outputs = {}
+    for page_number, configuration in enumerate(page_configurations):
+        if configuration is None:
+            continue
+        key = (configuration["doc_type"], configuration["file_name"])
+        outputs.setdefault(key, []).append(page_number)
+    return [(doc_type, file_name, pages) for (doc_type, file_name), pages in outputs.items()]
+
+
+def page_corrections(page_configurations):
+    """{page number: (rotation, skew)} of the exported pages whose configuration has a "correction"."""
+    return {
+        page_number: tuple(configuration["correction"])
+        for page_number, configuration in enumerate(page_configurations)
+        if configuration is not None and configuration.get("correction")
+    }
+
+
+# Pages per node of the page tree of large outputs. fitz lists every page in
+# the root node, which an append (see output_writer.OutputWriter.append) then
+# rewrites in full: about 10 bytes per page already in the file. With the pages
+# in nodes of PAGE_TREE_FANOUT under the root, an append rewrites only the root
+# and the last node.
+PAGE_TREE_FANOUT = 64
+
+
+def balance_page_tree(document, fanout=PAGE_TREE_FANOUT):
+    """Regroup a document's pages into nodes of fanout pages under the root of its page tree.
+
+    Only a tree with every page directly under the root, as fitz writes it, or
+    in plain nodes under the root, as this writes it, is changed: pages of other
+    trees may inherit attributes from their nodes. Nodes left out of the tree
+    are dropped by a save with garbage collection. Returns whether the tree was changed."""
+    if document.page_count <= fanout:
+        return False
+    root = f"{document.xref_get_key(document.pdf_catalog(), 'Pages')[1].split()[0]} 0 R"
+    page_xrefs = [document.page_xref(page_number) for page_number in range(document.page_count)]
+    for parent in {document.xref_get_key(xref, "Parent")[1] for xref in page_xrefs} - {root}:
+        node = int(parent.split()[0])
+        if (not set(document.xref_get_keys(node)) <= {"Type", "Parent", "Count", "Kids"}
+                or document.xref_get_key(node, "Parent")[1] != root):
+            return False
+    nodes = []
+    for start in range(0, len(page_xrefs), fanout):
+        kids = page_xrefs[start:start + fanout]
+        node = document.get_new_xref()
+        document.update_object(node, f"<</Type/Pages/Parent {root}/Count {len(kids)}"
+                                     f"/Kids[{' '.join(f'{xref} 0 R' for xref in kids)}]>>")
+        for xref in kids:
+            document.xref_set_key(xref, "Parent", f"{node} 0 R")
+        nodes.append(node)
+    document.xref_set_key(int(root.split()[0]), "Kids", f"[{' '.join(f'{node} 0 R' for node in nodes)}]")
+    return True
+
+
+def build_output(source_document, pages, save_profile=DEFAULT_SAVE_PROFILE, corrections=None):
+    """Copy the given pages of an open source document into a new in-memory PDF and return it.
+
+    Each run of consecutive pages is copied with a single insert_pdf call, and the
+    graft map is kept between calls so fonts and images shared by the pages are
+    copied into the output only once. Images are recompressed as save_profile (one
+    of SAVE_PROFILES) says. corrections maps source page numbers to the
+    (rotation, skew) that straightens them (see page_orientation.apply_correction)."""
+    image_dpi = SAVE_PROFILES[save_profile].get("image_dpi")
+    image_quality = SAVE_PROFILES[save_profile].get("image_quality")
+
+    pdf_writer = fitz.open()  # Create a new PDF writer object
+    runs = page_runs(pages)
+    for index, (first, last) in enumerate(runs):
+        pdf_writer.insert_pdf(source_document, from_page=first, to_page=last, final=index == len(runs) - 1)
+    for output_page_number, page_number in enumerate(pages):
+        correction = corrections.get(page_number) if corrections else None
+        if correction and correction != page_orientation.NO_CORRECTION:
+            page_orientation.apply_correction(pdf_writer[output_page_number], *correction)
+    if image_dpi and hasattr(pdf_writer, "rewrite_images"):  # Needs PyMuPDF 1.25 or later
+        pdf_writer.rewrite_images(dpi_threshold=image_dpi + 1, dpi_target=image_dpi, quality=image_quality)
+    return pdf_writer
+
+
+def write_output(source_document, pages, output_file_path, save_profile=DEFAULT_SAVE_PROFILE, corrections=None):
+    """Write the given pages of an open source document to a new PDF and return its size in bytes.
+
+    See build_output for save_profile and corrections."""
+    save_options = {name: value for name, value in SAVE_PROFILES[save_profile].items()
+                    if name not in ("image_dpi", "image_quality")}
+
+    with span("save", pages=len(pages), profile=save_profile):
+        pdf_writer = build_output(source_document, pages, save_profile, corrections)
+        balance_page_tree(pdf_writer)
+        # Keep the file ID stable so the same plan always produces identical bytes,
+        # whichever process writes it.
+        pdf_writer.save(output_file_path, no_new_id=True, **save_options)
+        pdf_writer.close()
+    return os.path.getsize(output_file_path)
+
+
+def source_share(source_bytes, total_pages, pages):
+    """The part of a source file's size attributed to some of its pages, for before/after size reports."""
+    return source_bytes * len(pages) // max(1, total_pages)
+
+
+class RenderCache:
+    """Least-recently-used cache of rendered pixmaps, capped by the size of their samples.
+
+    One cache can be shared by several processors so they draw from a single
+    memory budget; each processor's keys start with its own namespace."""
+
+    def __init__(self, max_bytes=RENDER_CACHE_BYTES):
+        self.max_bytes = max_bytes
+        self.current_bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            pixmap = self._entries.get(key)
+            if pixmap is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return pixmap
+
+    def __contains__(self, key):
+        with self._lock:
+            return key in self._entries
+
+    def put(self, key, pixmap):
+        size = len(pixmap.samples_mv)
+        if size > self.max_bytes:
+            return
+        with self._lock:
+            if key in self._entries:
+                replaced = self._entries.pop(key)
+                self.current_bytes -= len(replaced.samples_mv)
+            self._entries[key] = pixmap
+            self.current_bytes += size
+            while self.current_bytes > self.max_bytes:
+                _, evicted = self._entries.popitem(last=False)
+                self.current_bytes -= len(evicted.samples_mv)
+
+    def clear(self, namespace=None):
+        """Drop every entry, or only the entries whose key starts with namespace."""
+        with self._lock:
+            if namespace is None:
+                self._entries.clear()
+                self.current_bytes = 0
+                return
+            for key in [key for key in self._entries if key[0] is namespace]:
+                # Measured while still referenced: a pixmap's samples go with it.
+                removed = self._entries.pop(key)
+                self.current_bytes -= len(removed.samples_mv)
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": self.hits / lookups if lookups else 0.0,
+                "entries": len(self._entries),
+                "bytes": self.current_bytes,
+                "max_bytes": self.max_bytes,
+            }
+
+
+class PagePrefetcher(threading.Thread):
+    """Background thread that renders pages into a processor's cache before they are asked for."""
+
+    def __init__(self, processor):
+        super().__init__(name="PagePrefetcher", daemon=True)
+        self.processor = processor
+        self._pending = []
+        self._condition = threading.Condition()
+        self._stopped = False
+
+    def request(self, page_numbers, zoom=1.0):
+        """Replace any pages still waiting to be rendered with page_numbers at the given zoom."""
+        with self._condition:
+            self._pending = [(page_number, zoom) for page_number in page_numbers]
+            self._condition.notify()
+
+    def stop(self):
+        with self._condition:
+            self._stopped = True
+            self._condition.notify()
+
+    def run(self):
+        while True:
+            with self._condition:
+                while not self._pending and not self._stopped:
+                    self._condition.wait()
+                if self._stopped:
+                    return
+                page_number, zoom = self._pending.pop(0)
+            try:
+                self.processor.render_page(page_number, zoom, prefetch=True)
+            except Exception:
+                logger.exception("Error prefetching page %d", page_number)
+
 
 class PDFProcessor:
-    def __init__(self, file_path, folder_path):
-        print("PDFProcessor class initializing")
+    def __init__(self, file_path, folder_path, render_cache_bytes=RENDER_CACHE_BYTES, stream=None, memory_map=False, render_cache=None):
+        """Open file_path, or read the PDF from stream (bytes, a memoryview or a
+        file-like object) when one is given. With memory_map the file is mapped
+        into memory and parsed in place instead of being read through a file handle.
+        Only map files on a local disk that nothing truncates: touching a mapped
+        page past the end of a file cut short kills the process with SIGBUS.
+        Pass a RenderCache as render_cache to share it with other processors.
 
+        A document read from a stream can be shown and saved, but not analysed
+        (detect_boundaries, detect_orientation, find_near_duplicates): those
+        open the file in worker processes and cache by its contents."""
         # Check if the file exists
-        if not os.path.isfile(file_path):
-            print(f"Error: The file {file_path} does not exist.")
+        if stream is None and not os.path.isfile(file_path):
             raise FileNotFoundError(f"The file {file_path} does not exist.")
 
+        self._mapped_file = None
+        self._mapped_view = None
+        self.from_stream = stream is not None
         try:
             # Try opening the PDF file
-            self.pdf_document = fitz.open(file_path)
+            with span("open", file_path=file_path, memory_map=memory_map):
+                self._open_document(file_path, stream, memory_map)
         except Exception as e:
-            print(f"Error opening PDF: {e}")
+            logger.error("Error opening PDF %s: %s", file_path, e)
+            self._release_memory_map()
             raise RuntimeError(f"Failed to open PDF file: {file_path}")
 
         self.total_pages = self.pdf_document.page_count
@@ -22,28 +319,110 @@ class PDFProcessor:
         self.file_path = file_path
         self.folder_path = folder_path
 
-        self.doc_type_dictionary = {
-        "Insurance Auth" : "Insurance Auths",
-        "ID" : "ID'S",
-        "OrthoK" : "OrthoK",
-        "Outside Rx" : "Outside Rx",
-        "POF Waiver" : "POF Waivers",
-        "Rx Request" : "Prescription Requests",
-        "Referrals" : "Referrals",
-        "Summaries" : "Summaries"
-        }
+        self.doc_type_dictionary = dict(DOC_TYPE_DICTIONARY)
+        self.save_profile = DEFAULT_SAVE_PROFILE
+        self.collision_policy = DEFAULT_COLLISION_POLICY
+
+        # fitz documents are not thread-safe, so every use of pdf_document from
+        # here on (including the prefetcher thread) holds this lock.
+        self.document_lock = threading.RLock()
+        self.owns_render_cache = render_cache is None
+        self.render_cache = RenderCache(render_cache_bytes) if render_cache is None else render_cache
+        self.cache_namespace = object()
+        self.prefetcher = None
+
+        logger.info("Opened %s (%d pages)", file_path, self.total_pages)
+
+    def _open_document(self, file_path, stream, memory_map):
+        if stream is not None:
+            if hasattr(stream, "read"):
+                stream = stream.read()
+            self.source_bytes = memoryview(stream).nbytes
+            self.pdf_document = fitz.open(stream=stream, filetype="pdf")
+            return
+        self.source_bytes = os.path.getsize(file_path)
+        if memory_map:
+            with open(file_path, "rb") as pdf_file:
+                self._mapped_file = mmap.mmap(pdf_file.fileno(), 0, access=mmap.ACCESS_READ)
+            self._mapped_view = memoryview(self._mapped_file)
+            self.pdf_document = fitz.open(stream=self._mapped_view, filetype="pdf")
+        else:
+            self.pdf_document = fitz.open(file_path)
+
+    def render_page(self, page_number, zoom=1.0, colorspace="rgb", clip=None, prefetch=False):
+        """Render a page to a fitz.Pixmap, reusing a cached render when there is one.
+
+        clip limits the render to a rectangle in page coordinates; the pixmap's x
+        and y then give its offset in pixels from the top left of the page.
+        Prefetch renders skip pages that are already cached without counting as
+        cache lookups, so the hit/miss counters only reflect pages that were shown."""
+        key = (self.cache_namespace, page_number, zoom, colorspace, tuple(clip) if clip is not None else None)
+        if prefetch and key in self.render_cache:
+            return None
+        pixmap = None if prefetch else self.render_cache.get(key)
+        if pixmap is None:
+            with self.document_lock, span("render", page=page_number, zoom=zoom, clip=clip is not None, prefetch=prefetch):
+                page = self.pdf_document.load_page(page_number)
+                pixmap = page.get_pixmap(matrix=fitz.Matrix(zoom, zoom), colorspace=colorspace, clip=clip)
+            self.render_cache.put(key, pixmap)
+        return pixmap
+
+    def get_page_rect(self, page_number):
+        """The page's rectangle in points, as displayed (rotation applied)."""
+        with self.document_lock:
+            return self.pdf_document.load_page(page_number).rect
+
+    def prefetch_around(self, page_number, radius=PREFETCH_RADIUS, zoom=1.0):
+        """Render the next and previous radius pages in the background, nearest first."""
+        if self.prefetcher is None:
+            self.prefetcher = PagePrefetcher(self)
+            self.prefetcher.start()
+        neighbours = []
+        for distance in range(1, radius + 1):
+            for neighbour in (page_number + distance, page_number - distance):
+                if 0 <= neighbour < self.total_pages:
+                    neighbours.append(neighbour)
+        self.prefetcher.request(neighbours, zoom)
+
+    def get_cache_stats(self):
+        """Hit/miss counters and memory use of the render cache."""
+        return self.render_cache.stats()
 
-        print(f"PDFProcessor class initialized with {self.total_pages} pages")
+    def close(self):
+        """Stop background rendering and release the document."""
+        if self.prefetcher is not None:
+            self.prefetcher.stop()
+            self.prefetcher.join()
+            self.prefetcher = None
+        self.render_cache.clear(None if self.owns_render_cache else self.cache_namespace)
+        with self.document_lock:
+            self.pdf_document.close()
+            self._release_memory_map()
+
+    def _release_memory_map(self):
+        if self._mapped_view is not None:
+            self._mapped_view.release()
+            self._mapped_view = None
+        if self._mapped_file is not None:
+            self._mapped_file.close()
+            self._mapped_file = None
+
+    def get_page_pixmap(self, page_number, zoom=1.0, clip=None):
+        """Renders the specified page (or the clip region of it) to a fitz.Pixmap for display purposes."""
+        try:
+            return self.render_page(page_number, zoom, clip=clip)
+        except Exception:
+            logger.exception("Error getting page pixmap for page %d", page_number)
+            return None
 
     def get_page_image(self, page_number):
         """Converts the specified page to an image for display purposes."""
         try:
-            page = self.pdf_document.load_page(page_number)
-            pix = page.get_pixmap()
+            pix = self.render_page(page_number)
             image = pix.tobytes("ppm")  # Image bytes in PPM format
             return image
-        except Exception as e:
-            print(f"Error getting page image for page {page_number}: {e}")
+        except Exception:
+            logger.exception("Error getting page image for page %d", page_number)
             return None
 
     def get_total_pages(self):
@@ -64,35 +443,116 @@ class PDFProcessor:
         If the page number is invalid, go to the closest valid page."""
 
         if page_number < 0:
-            print(f"Error: Page number {page_number} is out of range. Jumping to the first page (0).")
+            logger.warning("Page number %d is out of range. Jumping to the first page (0).", page_number)
             self.current_page = 0  # Go to the first page
         elif page_number >= self.total_pages:
-            print(f"Error: Page number {page_number} is out of range. Jumping to the last page ({self.total_pages}).")
+            logger.warning("Page number %d is out of range. Jumping to the last page (%d).", page_number, self.total_pages)
             self.current_page = self.total_pages - 1  # Go to the last page
         else:
             self.current_page = page_number  # Valid page number
 
-        print(f"Now at page {self.current_page + 1}.")
+        logger.debug("Now at page %d.", self.current_page + 1)
 
     def get_page_text(self, page_number):
         """Extracts text from the given page."""
         try:
-            page = self.pdf_document.load_page(page_number)
-            return page.get_text()
-        except Exception as e:
-            print(f"Error extracting text from page {page_number}: {e}")
+            with self.document_lock, span("extract_text", page=page_number):
+                page = self.pdf_document.load_page(page_number)
+                return page.get_text()
+        except Exception:
+            logger.exception("Error extracting text from page %d", page_number)
             return ""
 
-    def save_page_as_pdf(self, page_number, output_file_name, doc_type):
-        try:
-            print(f"Conversion: {self.doc_type_dictionary.get(doc_type)}")
-            doc_type_folder = self.doc_type_dictionary[doc_type]
-            output_file_path = f"{self.folder_path}/{doc_type_folder}/{output_file_name}.pdf"
-            print(f"file path: {output_file_path}")
-            pdf_writer = fitz.open()  # Create a new PDF writer object
-            pdf_writer.insert_pdf(self.pdf_document, from_page=page_number, to_page=page_number)
-            pdf_writer.save(output_file_path)
-            print(f"Saved page {page_number} as PDF: {output_file_path}")
-        except Exception as e:
-            print(f"Error saving page as PDF: {e}")
+    def detect_boundaries(self, workers=None, cancelled=None, mp_context=None, **thresholds):
+        """(separator_pages, blank_pages) of this document; see page_boundaries.detect_boundaries.
+
+        The pages are analysed by worker processes that open the file themselves,
+        so this neither holds the document lock nor touches the render cache."""
+        self._require_file("detect document boundaries")
+        with span("detect_boundaries", pages=self.total_pages):
+            return page_boundaries.detect_boundaries(self.file_path, workers=workers, cancelled=cancelled,
+                                                     mp_context=mp_context, **thresholds)
+
+    def detect_orientation(self, workers=None, cancelled=None, mp_context=None):
+        """(rotation, skew) correction of every page; see page_orientation.detect_orientation.
+
+        Like detect_boundaries, this runs in worker processes."""
+        self._require_file("detect page orientation")
+        with span("detect_orientation", pages=self.total_pages):
+            return page_orientation.detect_orientation(self.file_path, workers=workers, cancelled=cancelled,
+                                                       mp_context=mp_context)
+
+    def find_near_duplicates(self, workers=None, against_outputs=True, cancelled=None, mp_context=None):
+        """Groups of near-duplicate pages of this document; see near_duplicates.find_near_duplicates.
+
+        With against_outputs, pages are also matched against the PDFs already in
+        the output folder. Like detect_boundaries, this runs in worker processes."""
+        self._require_file("find near-duplicate pages")
+        with span("find_near_duplicates", pages=self.total_pages):
+            return near_duplicates.find_near_duplicates(
+                self.file_path, self.folder_path if against_outputs else None, workers=workers, cancelled=cancelled,
+                mp_context=mp_context)
+
+    def _require_file(self, action):
+        if self.from_stream:
+            raise RuntimeError(f"Cannot {action} of a PDF read from a stream; open it from a file instead.")
+
+    def save_page_as_pdf(self, page_number, output_file_name, doc_type, correction=None):
+        """Save one page as output_file_name in doc_type's folder and return the path written.
+
+        The name is changed or the page not saved (None is returned) when the file
+        exists, according to self.collision_policy. Errors, including an unknown
+        doc type, are raised to the caller. correction is the page's (rotation, skew)."""
+        return self.save_pages_as_pdfs([
+            {"file_name": output_file_name, "doc_type": doc_type, "correction": correction} if page == page_number else None
+            for page in range(self.total_pages)
+        ])[0]["file_path"]
+
+    def save_pages_as_pdfs(self, page_configurations):
+        """Write every output described by page_configurations in a single pass.
+
+        Pages that share a file name and doc type are written to one multi-page
+        PDF, using self.save_profile and straightened by any "correction" of a
+        page, and checked once written. Returns one result
+        per output with its path (None if self.collision_policy skipped it), pages,
+        the seconds it took to write and its bytes in (the pages' share of the
+        source) and out. Under the "append" policy an output whose file exists is
+        appended to it, and its bytes out are the bytes added. Errors are raised
+        to the caller."""
+        from output_writer import OutputWriter, plan_output_paths, verify_output
+
+        plan = plan_outputs(page_configurations)
+        corrections = page_corrections(page_configurations)
+        output_paths = plan_output_paths(self.folder_path, plan, self.doc_type_dictionary, self.collision_policy)
+        append_paths = {path for path in output_paths
+                        if self.collision_policy == "append" and path is not None and os.path.exists(path)}
+        results = []
+        with OutputWriter(collision_policy=self.collision_policy) as writer:
+            for output_file_path, (_, _, pages) in zip(output_paths, plan):
+                start = time.perf_counter()
+                bytes_out = 0
+                if output_file_path is not None:
+                    write = writer.append if output_file_path in append_paths else writer.write
+                    with self.document_lock:
+                        bytes_out = write(self.pdf_document, pages, output_file_path, self.save_profile, corrections)
+                results.append({"file_path": output_file_path, "pages": pages, "seconds": time.perf_counter() - start,
+                                "bytes_in": source_share(self.source_bytes, self.total_pages, pages), "bytes_out": bytes_out,
+                                "appended": output_file_path in append_paths})
+        if writer.conflicts:
+            raise next(iter(writer.conflicts.values()))
+        for result in results:
+            if result["file_path"] in writer.committed_paths:
+                result["file_path"] = writer.committed_paths[result["file_path"]]
+
+            if result["file_path"] is None:
+                logger.info("Left pages %s unsaved; the output already exists", [page + 1 for page in result["pages"]])
+                continue
+            if result["appended"]:
+                logger.info("Appended pages %s in %.3fs (%d bytes added): %s", [page + 1 for page in result["pages"]],
+                            result["seconds"], result["bytes_out"], result["file_path"])
+                continue
+            verify_output(result["file_path"], len(result["pages"]), result["bytes_out"])
+            logger.info("Saved pages %s as PDF in %.3fs (%d -> %d bytes): %s", [page + 1 for page in result["pages"]],
+                        result["seconds"], result["bytes_in"], result["bytes_out"], result["file_path"])
+        return results
 
@@ -0,0 +1,1226 @@
+"""The dialog where the pages of a source PDF are labelled and exported."""
+from PyQt6.QtWidgets import QApplication, QCheckBox, QLabel, QListWidget, QListWidgetItem, QPushButton, QGraphicsView, QGraphicsScene, QLineEdit, QMessageBox, QDialog, QComboBox, QProgressDialog, QVBoxLayout, QHBoxLayout
+from PyQt6.QtGui import QImage, QKeySequence, QPixmap, QShortcut, QTransform
+from PyQt6.QtCore import Qt, QEvent, QObject, QThread, QTimer, pyqtSignal
+from PyQt6 import sip
+import logging
+import multiprocessing
+import sys
+import os
+import time
+from concurrent.futures import CancelledError
+import fitz  # PyMuPDF
+import export_engine
+import export_index
+import instrumentation
+import text_index
+from instrumentation import span
+from page_config_store import DEFAULT_DOC_TYPE, DEFAULT_FILE_NAME, PageConfigStore, parse_page_ranges
+from pdf_processor import (COLLISION_POLICIES, DEFAULT_COLLISION_POLICY, DEFAULT_SAVE_PROFILE, SAVE_PROFILES, PDFProcessor,
+                           snap_clip, snap_zoom)
+from session_journal import SessionJournal
+from thumbnail_strip import ThumbnailStrip
+from ui_pdfProcessingWidget import Ui_Form
+
+logger = logging.getLogger(__name__)
+
+# The first paint renders the whole page at DRAFT_ZOOM (36 dpi) and scales it up;
+# the visible region is then re-rendered at full resolution. A first paint slower
+# than FIRST_PAINT_TARGET seconds is reported.
+DRAFT_ZOOM = 0.5
+FIRST_PAINT_TARGET = 0.1
+VIEW_ZOOM_STEP = 1.25
+
+# Every process pool started from the GUI (exports, text extraction, page
+# analysis, and the document queue's preparation) spawns its processes: the
+# render, prefetch and thumbnail threads may be inside MuPDF at that moment,
+# and a forked child would inherit its locks mid-call.
+POOL_START_METHOD = "spawn"
+POOL_CONTEXT = multiprocessing.get_context(POOL_START_METHOD)
+
+QIMAGE_FORMATS = {
+    (1, False): QImage.Format.Format_Grayscale8,
+    (3, False): QImage.Format.Format_RGB888,
+    (4, True): QImage.Format.Format_RGBA8888,
+}
+
+
+def pixmap_to_qimage(pix):
+    """Wrap a fitz.Pixmap's samples in a QImage without copying them.
+
+    The QImage reads straight from the pixmap's buffer, so the pixmap is stored
+    on the image to keep that buffer alive for as long as the image exists."""
+    image_format = QIMAGE_FORMATS[(pix.n, bool(pix.alpha))]
+    with span("to_qimage", width=pix.width, height=pix.height):
+        image = QImage(pix.samples_mv, pix.width, pix.height, pix.stride, image_format)
+    image.source_pixmap = pix
+    return image
+
+
+def get_data_path(filename):
+    """Path of a data file shipped next to the app (inside the bundle when frozen)."""
+    if hasattr(sys, '_MEIPASS'):
+        return os.path.join(sys._MEIPASS, filename)
+    return filename
+
+class ExportWorker(QObject):
+    """Runs an export on a background thread and reports progress as outputs finish."""
+    progress = pyqtSignal(int, int, float)  # pages done, total pages, pages per second
+    finished = pyqtSignal(list, bool)  # results, cancelled
+
+    def __init__(self, file_path, folder_path, page_configurations, workers=None, save_profile=DEFAULT_SAVE_PROFILE,
+                 collision_policy=DEFAULT_COLLISION_POLICY, left_out_pages=()):
+        super().__init__()
+        self.file_path = file_path
+        self.folder_path = folder_path
+        self.save_profile = save_profile
+        self.collision_policy = collision_policy
+        # Snapshot the labels so edits made while exporting don't change what is written.
+        # Skipped pages and left_out_pages are None and are not exported.
+        left_out_pages = set(left_out_pages)
+        self.page_configurations = [
+            dict(configuration) if configuration is not None and page_number not in left_out_pages else None
+            for page_number, configuration in enumerate(page_configurations)
+        ]
+        self.workers = workers
+        self.cancelled = False
+
+    def cancel(self):
+        self.cancelled = True
+
+    def run(self):
+        results = []
+        total_pages = sum(configuration is not None for configuration in self.page_configurations)
+        pages_done = 0
+        start = time.perf_counter()
+        exports = export_engine.iter_export(self.file_path, self.folder_path, self.page_configurations, self.workers,
+                                            save_profile=self.save_profile, collision_policy=self.collision_policy,
+                                            mp_context=POOL_CONTEXT)
+        try:
+            for index, result in exports:
+                results.append(result)
+                pages_done += len(result["pages"])
+                elapsed = time.perf_counter() - start
+                self.progress.emit(pages_done, total_pages, pages_done / elapsed if elapsed else 0.0)
+                if self.cancelled:
+                    break
+        except Exception as e:
+            logger.exception("Export stopped")
+            results.append({"file_path": None, "pages": [], "seconds": 0.0, "bytes_in": 0, "bytes_out": 0,
+                            "skipped": False, "unchanged": False, "appended": False, "duplicates": [],
+                            "error": str(e)})
+        finally:
+            exports.close()
+        self.finished.emit(results, self.cancelled)
+
+
+class TextIndexWorker(QObject):
+    """Extracts page text on a background thread and suggests a doc type and file name per page."""
+    page_suggested = pyqtSignal(int, str, str)  # page, doc type, file name ("" when there is no suggestion)
+    finished = pyqtSignal()
+
+    def __init__(self, file_path, keyword_rules=None):
+        super().__init__()
+        self.file_path = file_path
+        self.index = text_index.TextIndex(keyword_rules)
+        self.cancelled = False
+
+    def cancel(self):
+        self.cancelled = True
+
+    def run(self):
+        page_texts = text_index.iter_page_texts(self.file_path, mp_context=POOL_CONTEXT)
+        try:
+            for page_number, text in page_texts:
+                if self.cancelled:
+                    break
+                self.index.add_page(page_number, text)
+                doc_type = self.index.suggest_doc_type(page_number) or ""
+                file_name = self.index.suggest_file_name(page_number) or ""
+                if doc_type or file_name:
+                    self.page_suggested.emit(page_number, doc_type, file_name)
+        except Exception:
+            logger.exception("Error indexing page text")
+        finally:
+            page_texts.close()
+        self.finished.emit()
+
+
+class BoundaryWorker(QObject):
+    """Finds the separator and blank pages of a batch on a background thread."""
+    finished = pyqtSignal(list, list)  # separator pages, blank pages
+
+    def __init__(self, processor):
+        super().__init__()
+        self.processor = processor
+        self.file_path = processor.file_path
+        self.cancelled = False
+
+    def cancel(self):
+        self.cancelled = True
+
+    def run(self):
+        separator_pages, blank_pages = [], []
+        try:
+            separator_pages, blank_pages = self.processor.detect_boundaries(cancelled=lambda: self.cancelled,
+                                                                            mp_context=POOL_CONTEXT)
+        except CancelledError:
+            pass
+        except Exception:
+            logger.exception("Error detecting document boundaries")
+        self.finished.emit(separator_pages, blank_pages)
+
+
+class OrientationWorker(QObject):
+    """Finds the rotation and skew that straighten every page, on a background thread."""
+    finished = pyqtSignal(list)  # (rotation, skew) per page
+
+    def __init__(self, processor):
+        super().__init__()
+        self.processor = processor
+        self.file_path = processor.file_path
+        self.cancelled = False
+
+    def cancel(self):
+        self.cancelled = True
+
+    def run(self):
+        corrections = []
+        try:
+            corrections = self.processor.detect_orientation(cancelled=lambda: self.cancelled, mp_context=POOL_CONTEXT)
+        except CancelledError:
+            pass
+        except Exception:
+            logger.exception("Error detecting page orientation")
+        self.finished.emit(corrections)
+
+
+class NearDuplicateWorker(QObject):
+    """Groups near-duplicate pages of a document, and pages already in the output folder, on a background thread."""
+    finished = pyqtSignal(list)  # near_duplicates.find_near_duplicates groups
+
+    def __init__(self, processor):
+        super().__init__()
+        self.processor = processor
+        self.file_path = processor.file_path
+        self.cancelled = False
+
+    def cancel(self):
+        self.cancelled = True
+
+    def run(self):
+        groups = []
+        try:
+            groups = self.processor.find_near_duplicates(cancelled=lambda: self.cancelled, mp_context=POOL_CONTEXT)
+        except CancelledError:
+            pass
+        except Exception:
+            logger.exception("Error finding near-duplicate pages")
+        self.finished.emit(groups)
+
+
+class DuplicateCheckWorker(QObject):
+    """Finds the pages about to be exported that are already in the output folder, on a background thread."""
+    finished = pyqtSignal(dict)  # page -> existing output paths
+
+    def __init__(self, file_path, folder_path, page_numbers):
+        super().__init__()
+        self.file_path = file_path
+        self.folder_path = folder_path
+        self.page_numbers = page_numbers
+        self.cancelled = False
+
+    def cancel(self):
+        self.cancelled = True
+
+    def run(self):
+        duplicates = {}
+        try:
+            duplicates = export_index.find_duplicate_pages(self.file_path, self.folder_path, self.page_numbers,
+                                                           cancelled=lambda: self.cancelled, mp_context=POOL_CONTEXT)
+        except CancelledError:
+            pass
+        except Exception:
+            logger.exception("Error checking for pages that were already saved")
+        self.finished.emit(duplicates)
+
+
+# PDF Processing Page
+class PDFProcessingPage(QDialog, Ui_Form):
+    def __init__(self):
+        super().__init__()
+        self.setupUi(self)
+        self.setWindowTitle("PDF Processing")
+
+        # Graphics view to display the page
+        self.graphicsView = self.findChild(QGraphicsView, "graphicsView")
+        self.scene = QGraphicsScene()
+        self.graphicsView.setScene(self.scene)
+        self.graphicsView.viewport().installEventFilter(self)
+
+        # Thumbnail sidebar to the left of the page view
+        self.thumbnailStrip = ThumbnailStrip(self)
+        self.thumbnailStrip.page_selected.connect(self.show_selected_page)
+        verticalLayout = self.findChild(QVBoxLayout, "verticalLayout")
+        verticalLayout.removeWidget(self.graphicsView)
+        pageViewLayout = QHBoxLayout()
+        pageViewLayout.addWidget(self.thumbnailStrip)
+        pageViewLayout.addWidget(self.graphicsView)
+        verticalLayout.insertLayout(0, pageViewLayout)
+        QApplication.instance().aboutToQuit.connect(self.thumbnailStrip.close_document)
+        QApplication.instance().aboutToQuit.connect(self.stop_text_index)
+        QApplication.instance().aboutToQuit.connect(self.stop_page_analysis)
+        QApplication.instance().aboutToQuit.connect(self.stop_export)
+        QApplication.instance().aboutToQuit.connect(self.close_session_journal)
+
+        # Re-render the visible region once the view stops scrolling or resizing.
+        self.refine_timer = QTimer(self)
+        self.refine_timer.setSingleShot(True)
+        self.refine_timer.setInterval(50)
+        self.refine_timer.timeout.connect(self.refine_visible_region)
+        # valueChanged passes the scroll position, which must not become the timer interval.
+        self.graphicsView.horizontalScrollBar().valueChanged.connect(lambda value: self.refine_timer.start())
+        self.graphicsView.verticalScrollBar().valueChanged.connect(lambda value: self.refine_timer.start())
+
+        # QLabel for the page name/label
+        self.pageNameLabel = self.findChild(QLabel, "pageNameLabel")
+
+        # Buttons to navigate through pages
+        self.prevPageButton = self.findChild(QPushButton, "prevPageButton")
+        self.nextPageButton = self.findChild(QPushButton, "nextPageButton")
+        self.saveButton = self.findChild(QPushButton, "saveButton")
+        self.saveAllPagesButton = self.findChild(QPushButton, "saveAllPagesButton")
+        self.clearAllButton = self.findChild(QPushButton, "clearAllButton")
+
+        self.fileNameLineEdit = self.findChild(QLineEdit, "fileNameLineEdit")
+        self.fileNameLineEdit.editingFinished.connect(self.save_file_name)
+
+        self.currentPageLabel = self.findChild(QLabel, "currentPageLabel")
+        self.currentPageLineEdit = self.findChild(QLineEdit, "currentPageLineEdit")
+        self.currentPageLineEdit.editingFinished.connect(self.jump_to_page)
+
+        self.totalPagesLabel = self.findChild(QLabel, "totalPagesLabel")
+
+        self.docTypeDropdownBox = self.findChild(QComboBox, "docTypeDropdownBox")
+        self.docTypeDropdownBox.activated.connect(self.save_doc_type)
+
+        # Row for giving a whole page range the current page's labels
+        self.pageRangeLineEdit = QLineEdit(self)
+        self.pageRangeLineEdit.setPlaceholderText("Pages, e.g. 12-40, 45")
+        self.applyToPagesButton = QPushButton("Apply to Pages", self)
+        self.applyToPagesButton.clicked.connect(self.apply_to_page_range)
+        pageRangeLayout = QHBoxLayout()
+        pageRangeLayout.addWidget(self.pageRangeLineEdit)
+        pageRangeLayout.addWidget(self.applyToPagesButton)
+        verticalLayout.insertLayout(verticalLayout.indexOf(self.findChild(QHBoxLayout, "horizontalLayout_2")) + 1, pageRangeLayout)
+
+        # Moves on to the next PDF in the queue, which is prepared in the background
+        self.nextDocumentButton = QPushButton("Next Document", self)
+        self.nextDocumentButton.setEnabled(False)
+        self.nextDocumentButton.clicked.connect(self.open_next_document)
+        pageRangeLayout.addWidget(self.nextDocumentButton)
+
+        # How the output PDFs are written (see pdf_processor.SAVE_PROFILES)
+        self.save_profile = DEFAULT_SAVE_PROFILE
+        self.saveProfileComboBox = QComboBox(self)
+        self.saveProfileComboBox.addItems(SAVE_PROFILES)
+        self.saveProfileComboBox.setCurrentText(self.save_profile)
+        self.saveProfileComboBox.setToolTip("fast: no optimisation; compact: lossless size reduction; scan: also recompresses images")
+        self.saveProfileComboBox.currentTextChanged.connect(self.set_save_profile)
+        pageRangeLayout.addWidget(QLabel("Save profile:", self))
+        pageRangeLayout.addWidget(self.saveProfileComboBox)
+
+        # What to do when an output file already exists (see pdf_processor.COLLISION_POLICIES)
+        self.collision_policy = DEFAULT_COLLISION_POLICY
+        self.collisionPolicyComboBox = QComboBox(self)
+        self.collisionPolicyComboBox.addItems(COLLISION_POLICIES)
+        self.collisionPolicyComboBox.setCurrentText(self.collision_policy)
+        self.collisionPolicyComboBox.setToolTip("rename: save as \"name (2)\"; overwrite: replace the file; "
+                                                "skip: keep the file and don't save; append: add the pages to the end "
+                                                "of the file; error: stop without saving")
+        self.collisionPolicyComboBox.currentTextChanged.connect(self.set_collision_policy)
+        pageRangeLayout.addWidget(QLabel("If file exists:", self))
+        pageRangeLayout.addWidget(self.collisionPolicyComboBox)
+
+        # Row for splitting a scanned batch into its documents: skipped pages (separator
+        # sheets, blank pages) are not exported, and separator pages mark where one
+        # document ends.
+        self.skipPageCheckBox = QCheckBox("Skip this page", self)
+        self.skipPageCheckBox.toggled.connect(self.set_current_page_skipped)
+        self.separatorCheckBox = QCheckBox("Separator", self)
+        self.separatorCheckBox.setToolTip("This page separates two documents and is not exported")
+        self.separatorCheckBox.toggled.connect(self.set_current_page_separator)
+        self.detectDocumentsButton = QPushButton("Detect Documents", self)
+        self.detectDocumentsButton.setToolTip("Find pages that look like separator sheets or blank pages and list them for review before skipping them")
+        self.detectDocumentsButton.clicked.connect(self.detect_documents)
+        self.labelDocumentButton = QPushButton("Label Document", self)
+        self.labelDocumentButton.setToolTip("Give every page up to the next separator this page's labels, then go to the next document")
+        self.labelDocumentButton.clicked.connect(self.label_current_document)
+        documentLayout = QHBoxLayout()
+        documentLayout.addWidget(self.skipPageCheckBox)
+        documentLayout.addWidget(self.separatorCheckBox)
+        documentLayout.addWidget(self.detectDocumentsButton)
+        documentLayout.addWidget(self.labelDocumentButton)
+        verticalLayout.insertLayout(verticalLayout.indexOf(pageRangeLayout) + 1, documentLayout)
+
+        # Groups of near-duplicate pages (re-scans of the same sheet), within this
+        # document and against the output folder; activating one steps through its pages.
+        self.findSimilarPagesButton = QPushButton("Find Similar Pages", self)
+        self.findSimilarPagesButton.setToolTip("Find pages that look the same as other pages, or as pages already saved in the output folder")
+        self.findSimilarPagesButton.clicked.connect(self.find_similar_pages)
+        documentLayout.addWidget(self.findSimilarPagesButton)
+
+        # Sideways, upside-down and skewed pages are shown and exported straightened.
+        self.straightenPagesButton = QPushButton("Straighten Pages", self)
+        self.straightenPagesButton.setToolTip("Find sideways, upside-down and skewed pages and straighten them when saving")
+        self.straightenPagesButton.clicked.connect(self.straighten_pages)
+        self.rotatePageButton = QPushButton("Rotate Page", self)
+        self.rotatePageButton.setToolTip("Turn this page a quarter clockwise when saving")
+        self.rotatePageButton.clicked.connect(self.rotate_current_page)
+        documentLayout.addWidget(self.straightenPagesButton)
+        documentLayout.addWidget(self.rotatePageButton)
+        self.similarPagesList = QListWidget(self)
+        self.similarPagesList.setMaximumHeight(100)
+        self.similarPagesList.itemActivated.connect(self.show_similar_page)
+        self.similarPagesList.hide()
+        verticalLayout.insertWidget(verticalLayout.indexOf(documentLayout) + 1, self.similarPagesList)
+
+        # Pages that Detect Documents takes for separator sheets or blank pages. A
+        # coloured or patterned page can be a real one, so nothing is skipped until
+        # the pages still checked here are confirmed; activating one shows it.
+        self.detectedPagesList = QListWidget(self)
+        self.detectedPagesList.setMaximumHeight(100)
+        self.detectedPagesList.itemActivated.connect(self.show_detected_page)
+        self.skipDetectedPagesButton = QPushButton("Skip Checked Pages", self)
+        self.skipDetectedPagesButton.setToolTip("Skip the checked pages, marking the separator sheets among them as separators")
+        self.skipDetectedPagesButton.clicked.connect(self.skip_detected_pages)
+        detectedPagesLayout = QHBoxLayout()
+        detectedPagesLayout.addWidget(self.detectedPagesList)
+        detectedPagesLayout.addWidget(self.skipDetectedPagesButton)
+        verticalLayout.insertLayout(verticalLayout.indexOf(self.similarPagesList) + 1, detectedPagesLayout)
+        self.show_detected_pages([], [])
+
+        # Connect button signals to methods
+        self.prevPageButton.clicked.connect(self.show_prev_page)
+        self.nextPageButton.clicked.connect(self.show_next_page)
+        self.saveButton.clicked.connect(self.save_current_page)
+        self.saveAllPagesButton.clicked.connect(self.save_all_pages)
+        self.clearAllButton.clicked.connect(self.clear_page_configurations)
+
+        # Initialize variables
+        self.boundary_thread = self.near_duplicate_thread = self.orientation_thread = self.duplicate_check_thread = None
+        self.boundary_worker = self.near_duplicate_worker = self.orientation_worker = self.duplicate_check_worker = None
+        self.export_thread = self.export_worker = None
+        self.processor = None
+        self.document_queue = None
+        self.session_journal = None
+        self.keyword_rules = None  # Read when the first document is indexed
+        self.left_out_pages = []  # Pages the last export left out as already saved
+        self.current_page = 0  # Initialize current_page
+        self.total_pages = 0
+
+        # Rendering state: view_zoom is the user's zoom on top of fit-to-width,
+        # display_zoom the resulting scale from page points to view pixels.
+        self.view_zoom = 1.0
+        self.display_zoom = 1.0
+        self.displayed_page = None
+        self.refined_item = None
+        self.paint_timings = []
+
+        # F12 shows recent span timings over the page view (and turns tracing on).
+        self.performanceOverlay = QLabel(self.graphicsView)
+        self.performanceOverlay.setStyleSheet("background: rgba(0, 0, 0, 170); color: white; font-family: monospace; padding: 4px;")
+        self.performanceOverlay.hide()
+        self.performance_overlay_timer = QTimer(self)
+        self.performance_overlay_timer.setInterval(500)
+        self.performance_overlay_timer.timeout.connect(self.update_performance_overlay)
+        QShortcut(QKeySequence("F12"), self).activated.connect(self.toggle_performance_overlay)
+
+    def keyPressEvent(self, event):
+        """Override to prevent Enter key from triggering button actions."""
+        # If the Enter key is pressed and the focus is on the QLineEdit
+        if event.key() == Qt.Key.Key_Return:
+            event.accept()
+
+    def set_document_queue(self, document_queue):
+        """Work through the documents in document_queue, starting with the first."""
+        self.document_queue = document_queue
+        self.open_next_document()
+
+    def open_next_document(self):
+        if not self.document_queue or not len(self.document_queue):
+            return
+        if self.processor:
+            self.store_current_page_fields()
+        try:
+            file_path, processor = self.document_queue.take_next()
+        except Exception as e:
+            QMessageBox.warning(self, "Problem opening PDF", str(e))
+            self.nextDocumentButton.setEnabled(bool(len(self.document_queue)))
+            return
+        self.set_paths(file_path, self.document_queue.folder_path, processor)
+
+    def set_paths(self, file_path, folder_path, processor=None):
+        """Set the file and folder paths passed from the main window.
+
+        processor may be one the document queue has already opened for file_path."""
+        start = time.perf_counter()
+        self.file_path = file_path
+        self.folder_path = folder_path
+
+        self.stop_page_analysis()
+        self.stop_export()
+        if self.processor:
+            self.processor.close()
+        self.processor = processor or PDFProcessor(self.file_path, self.folder_path)  # Initialize PDFProcessor with the file path
+        self.processor.save_profile = self.save_profile
+        self.processor.collision_policy = self.collision_policy
+        self.total_pages = self.processor.get_total_pages()
+        self.page_configurations = PageConfigStore(self.total_pages)
+        self.restore_session()
+        self.current_page = 0
+        self.setWindowTitle(f"PDF Processing - {os.path.basename(self.file_path)}")
+        remaining = len(self.document_queue) if self.document_queue else 0
+        self.nextDocumentButton.setEnabled(remaining > 0)
+        self.nextDocumentButton.setText(f"Next Document ({remaining} left)" if remaining else "Next Document")
+        self.thumbnailStrip.close_document()
+        self.similarPagesList.clear()
+        self.similarPagesList.hide()
+        self.show_detected_pages([], [])
+        self.update_page_display()  # Display the first page
+        self.open_seconds = time.perf_counter() - start
+        logger.info("First page shown %.1f ms after opening %s", self.open_seconds * 1000, self.file_path)
+        # Start the background passes once the first page has been painted.
+        QTimer.singleShot(0, self.start_background_passes)
+
+    def set_save_profile(self, save_profile):
+        self.save_profile = save_profile
+        if self.processor:
+            self.processor.save_profile = save_profile
+
+    def set_collision_policy(self, collision_policy):
+        self.collision_policy = collision_policy
+        if self.processor:
+            self.processor.collision_policy = collision_policy
+
+    def restore_session(self):
+        """Reload labels journalled by an earlier session on this file, then journal every new edit."""
+        self.close_session_journal()
+        try:
+            self.session_journal = SessionJournal(self.file_path, self.total_pages)
+            restored = self.session_journal.restore(self.page_configurations)
+            self.page_configurations.journal = self.session_journal
+            if restored:
+                logger.info("Restored %d label edits from %s", restored, self.session_journal.journal_path)
+        except OSError as e:
+            logger.error("Error opening session journal: %s", e)
+            self.session_journal = None
+
+    def close_session_journal(self):
+        if getattr(self, "session_journal", None) is not None:
+            self.session_journal.close()
+            self.session_journal = None
+
+    def start_background_passes(self):
+        self.thumbnailStrip.set_document(self.file_path, self.total_pages)
+        self.thumbnailStrip.set_current_page(self.current_page)
+
+        if self.session_journal is not None:
+            self.session_journal.maybe_compact(self.page_configurations)
+        self.start_text_index()
+
+    def start_text_index(self):
+        """Fill in suggested doc types and file names from the page text, in the background."""
+        self.stop_text_index()
+        self.text_index_thread = QThread(self)
+        self.text_index_worker = TextIndexWorker(self.file_path, self.get_keyword_rules())
+        self.text_index_worker.moveToThread(self.text_index_thread)
+        self.text_index_thread.started.connect(self.text_index_worker.run)
+        self.text_index_worker.page_suggested.connect(self.apply_page_suggestion)
+        self.text_index_worker.finished.connect(self.text_index_thread.quit)
+        self.text_index_thread.start()
+
+    def get_keyword_rules(self):
+        """The doc type keyword rules, read once; a broken rules file is reported and the defaults used instead."""
+        if self.keyword_rules is None:
+            try:
+                self.keyword_rules = text_index.load_keyword_rules(get_data_path("keyword_rules.json"))
+            except (OSError, ValueError) as e:
+                logger.error("Error reading keyword rules: %s", e)
+                QMessageBox.warning(self, "Problem reading keyword rules", f"{e}. The built-in rules are used instead.")
+                self.keyword_rules = text_index.DEFAULT_KEYWORD_RULES
+        return self.keyword_rules
+
+    def stop_text_index(self):
+        if getattr(self, "text_index_thread", None) is not None:
+            self.text_index_worker.cancel()
+            self.text_index_thread.quit()
+            self.text_index_thread.wait()
+            self.text_index_thread = None
+
+    def stop_page_analysis(self):
+        """Cancel any boundary, near-duplicate, orientation or duplicate check pass still running and wait for its thread."""
+        for thread_name, worker_name, button in (
+                ("boundary_thread", "boundary_worker", self.detectDocumentsButton),
+                ("near_duplicate_thread", "near_duplicate_worker", self.findSimilarPagesButton),
+                ("orientation_thread", "orientation_worker", self.straightenPagesButton),
+                ("duplicate_check_thread", "duplicate_check_worker", self.saveAllPagesButton)):
+            thread = getattr(self, thread_name)
+            # A thread that finished by itself has been deleted already.
+            if thread is not None and not sip.isdeleted(thread):
+                getattr(self, worker_name).cancel()
+                thread.quit()
+                thread.wait()
+                button.setEnabled(True)
+            # Dropping the worker also drops the finished signal it may have left queued.
+            setattr(self, thread_name, None)
+            setattr(self, worker_name, None)
+
+    def stop_export(self):
+        """Cancel a Save All Pages still running and wait for its thread. Outputs already written are kept."""
+        # A thread that finished by itself has been deleted already.
+        if self.export_thread is not None and not sip.isdeleted(self.export_thread):
+            self.export_worker.cancel()
+            self.export_thread.quit()
+            self.export_thread.wait()
+            self.export_progress.close()
+            self.saveAllPagesButton.setEnabled(True)
+        # Dropping the worker also drops the finished signal it may have left queued.
+        self.export_thread = self.export_worker = None
+
+    def closeEvent(self, event):
+        """Stop the background work on this document when its window is closed."""
+        self.stop_export()
+        self.stop_page_analysis()
+        self.stop_text_index()
+        super().closeEvent(event)
+
+    def apply_page_suggestion(self, page_number, doc_type, file_name):
+        """Use a suggestion for any field of the page the user has not filled in yet."""
+        if self.sender() is not self.text_index_worker or page_number >= len(self.page_configurations):
+            return
+        if page_number == self.current_page:
+            # Keep whatever is being typed into the current page.
+            self.store_current_page_fields()
+        if file_name and self.page_configurations.get_file_name(page_number) == DEFAULT_FILE_NAME:
+            self.page_configurations.set_file_name(page_number, file_name)
+        if doc_type and self.page_configurations.get_doc_type(page_number) == DEFAULT_DOC_TYPE:
+            self.page_configurations.set_doc_type(page_number, doc_type)
+        if page_number == self.current_page:
+            self.fileNameLineEdit.setText(self.page_configurations.get_file_name(page_number))
+            self.docTypeDropdownBox.setCurrentText(self.page_configurations.get_doc_type(page_number))
+
+    def eventFilter(self, watched, event):
+        """Zoom the page view with Ctrl + mouse wheel and re-render it when resized."""
+        if self.processor and watched is self.graphicsView.viewport():
+            if event.type() == QEvent.Type.Wheel and event.modifiers() & Qt.KeyboardModifier.ControlModifier:
+                factor = VIEW_ZOOM_STEP if event.angleDelta().y() > 0 else 1 / VIEW_ZOOM_STEP
+                self.view_zoom = min(8.0, max(0.25, self.view_zoom * factor))
+                self.render_current_page()
+                return True
+            if event.type() == QEvent.Type.Resize:
+                self.refine_timer.start()
+        return super().eventFilter(watched, event)
+
+    def show_page(self, pixmap, scale=1.0):
+        """Display PDF page in the QGraphicsView, scaled by scale."""
+        self.scene.clear()
+        self.refined_item = None
+        item = self.scene.addPixmap(pixmap)
+        item.setScale(scale)
+        item.setTransformationMode(Qt.TransformationMode.SmoothTransformation)
+        self.scene.setSceneRect(item.sceneBoundingRect())
+
+    def get_display_zoom(self, page_rect):
+        """Scale from page points to view pixels that fits the page width, times the user's zoom."""
+        viewport_width = self.graphicsView.viewport().width()
+        # A page turned a quarter by its correction shows its height across the view.
+        rotation, _ = self.page_configurations.get_correction(self.current_page)
+        page_width = page_rect.height if rotation in (90, 270) else page_rect.width
+        # The view has no real size until the dialog is first shown.
+        fit_zoom = (viewport_width - 4) / page_width if viewport_width > 50 else 1.0
+        return snap_zoom(fit_zoom * self.view_zoom)
+
+    def render_current_page(self):
+        """Paint a quick low-resolution draft of the page, then schedule the sharp render."""
+        start = time.perf_counter()
+        page_rect = self.processor.get_page_rect(self.current_page)
+        self.display_zoom = self.get_display_zoom(page_rect)
+        draft_zoom = min(DRAFT_ZOOM, self.display_zoom)
+
+        page_pixmap = self.processor.get_page_pixmap(self.current_page, draft_zoom)
+        self.show_page(self.convert_to_pixmap(page_pixmap), self.display_zoom / draft_zoom)
+        # Show the page as it will be exported; the view turns the scene, so the
+        # sharp render of the visible region still lines up with the draft.
+        rotation, skew = self.page_configurations.get_correction(self.current_page)
+        self.graphicsView.setTransform(QTransform().rotate(rotation + skew))
+        self.displayed_page = self.current_page
+
+        first_paint = time.perf_counter() - start
+        self.paint_timings.append(("draft", self.current_page, first_paint))
+        if first_paint > FIRST_PAINT_TARGET:
+            logger.warning("First paint of page %d took %.1f ms (target %.0f ms)",
+                           self.current_page + 1, first_paint * 1000, FIRST_PAINT_TARGET * 1000)
+
+        if self.display_zoom > draft_zoom:
+            # Refine straight after this paint. start(0) would also make 0 ms the
+            # timer's interval, which would end the debouncing of scrolls.
+            self.refine_timer.stop()
+            QTimer.singleShot(0, self.refine_visible_region)
+
+    def refine_visible_region(self):
+        """Render just the visible part of the page at the view's full resolution."""
+        if not self.processor or self.displayed_page != self.current_page:
+            return
+        page_rect = self.processor.get_page_rect(self.current_page)
+        if self.get_display_zoom(page_rect) != self.display_zoom:
+            # The view was resized enough to need a new draft first.
+            self.render_current_page()
+            return
+        if self.display_zoom <= DRAFT_ZOOM:
+            return
+
+        start = time.perf_counter()
+        visible = self.graphicsView.mapToScene(self.graphicsView.viewport().rect()).boundingRect()
+        visible_rect = fitz.Rect(visible.left(), visible.top(), visible.right(), visible.bottom()) / self.display_zoom
+        visible_rect &= page_rect
+        if visible_rect.is_empty:
+            return
+        clip = snap_clip(visible_rect, page_rect)
+
+        pixel_ratio = self.graphicsView.devicePixelRatioF()
+        page_pixmap = self.processor.get_page_pixmap(self.current_page, snap_zoom(self.display_zoom * pixel_ratio), clip)
+        if page_pixmap is None:
+            return
+        pixmap = self.convert_to_pixmap(page_pixmap)
+        # Scale the render back to view pixels; the snapped zoom may differ slightly.
+        scale = self.display_zoom / snap_zoom(self.display_zoom * pixel_ratio)
+
+        if self.refined_item is not None:
+            self.scene.removeItem(self.refined_item)
+        self.refined_item = self.scene.addPixmap(pixmap)
+        self.refined_item.setScale(scale)
+        self.refined_item.setPos(page_pixmap.x * scale, page_pixmap.y * scale)
+
+        self.paint_timings.append(("refine", self.current_page, time.perf_counter() - start))
+
+    def set_page_name(self, name):
+        """Set the page name (label) for the page."""
+        self.pageNameLabel.setText(name)
+
+    def show_prev_page(self):
+        """Show the previous page."""
+        if self.processor:
+            self.store_current_page_fields()
+            self.current_page = self.processor.prev_page()
+            self.update_page_display()
+
+    def show_next_page(self):
+        """Show the next page."""
+        if self.processor:
+            self.store_current_page_fields()
+            self.current_page = self.processor.next_page()
+            self.update_page_display()
+
+    def show_selected_page(self, page_number):
+        """Show the page picked in the thumbnail strip."""
+        if self.processor and page_number != self.current_page:
+            self.store_current_page_fields()
+            self.processor.go_to_page(page_number)
+            self.current_page = self.processor.current_page
+            self.update_page_display()
+
+    def jump_to_page(self):
+        """Jump to the page specified by the user."""
+        # Get the page number from the input field (1-based input)
+        page_number = int(self.currentPageLineEdit.text()) - 1  # Convert to 0-based index
+
+        # If the page number is invalid, it will jump to the closest valid page
+        if self.processor:
+            # Adjust for the 0-based index within the valid page range
+            self.processor.go_to_page(page_number)
+            self.current_page = self.processor.current_page
+            self.update_page_display()  # Update the display after the page change
+
+    def save_file_name(self):
+        self.page_configurations.set_file_name(self.current_page, self.fileNameLineEdit.text().strip())
+
+    def save_doc_type(self):
+        self.page_configurations.set_doc_type(self.current_page, self.docTypeDropdownBox.currentText())
+
+    def store_current_page_fields(self):
+        """Copy the file name and doc type fields into the current page's configuration."""
+        self.save_file_name()
+        self.save_doc_type()
+
+    def apply_to_page_range(self):
+        """Give every page in the range field the current page's file name and doc type."""
+        try:
+            page_numbers = parse_page_ranges(self.pageRangeLineEdit.text())
+        except ValueError as e:
+            QMessageBox.warning(self, "Invalid page range", f"{e}. Enter pages like 12-40, 45.")
+            return
+        if not page_numbers or page_numbers[-1] >= self.total_pages:
+            QMessageBox.warning(self, "Invalid page range", f"Enter pages between 1 and {self.total_pages}.")
+            return
+        self.store_current_page_fields()
+        self.page_configurations.assign_pages(
+            page_numbers,
+            file_name=self.page_configurations.get_file_name(self.current_page),
+            doc_type=self.page_configurations.get_doc_type(self.current_page),
+        )
+        self.pageRangeLineEdit.clear()
+
+    def update_page_display(self):
+        """Update the displayed page."""
+        with span("show_page", page=self.current_page):
+            self.render_current_page()
+        # Render drafts of the neighbouring pages while the user fills in this one.
+        self.processor.prefetch_around(self.current_page, zoom=min(DRAFT_ZOOM, self.display_zoom))
+
+        self.currentPageLabel.setText("Current Page:")
+
+        if self.totalPagesLabel.text() == "" and self.total_pages != 0:
+            self.totalPagesLabel.setText(f"/ {self.total_pages}")
+
+        if self.currentPageLineEdit:
+            self.currentPageLineEdit.setText(f"{self.current_page+1}")
+
+        self.thumbnailStrip.set_current_page(self.current_page)
+
+        if self.session_journal is not None:
+            self.session_journal.maybe_compact(self.page_configurations)
+
+        if self.fileNameLineEdit:
+            self.fileNameLineEdit.setText(self.page_configurations.get_file_name(self.current_page))
+        if self.docTypeDropdownBox:
+            self.docTypeDropdownBox.setCurrentText(self.page_configurations.get_doc_type(self.current_page))
+        for checkBox, checked in ((self.skipPageCheckBox, self.page_configurations.is_skipped(self.current_page)),
+                                  (self.separatorCheckBox, self.page_configurations.is_separator(self.current_page))):
+            checkBox.blockSignals(True)
+            checkBox.setChecked(checked)
+            checkBox.blockSignals(False)
+
+    def set_current_page_skipped(self, skipped):
+        if self.processor:
+            self.page_configurations.skip_pages([self.current_page], skipped)
+            if not skipped and self.page_configurations.is_separator(self.current_page):
+                self.page_configurations.mark_separators([self.current_page], False)
+                self.update_page_display()
+
+    def set_current_page_separator(self, separator):
+        if self.processor:
+            self.page_configurations.mark_separators([self.current_page], separator)
+            self.update_page_display()
+
+    def detect_documents(self):
+        """Find separator and blank pages in the background and list them for review."""
+        if not self.processor:
+            return
+        self.detectDocumentsButton.setEnabled(False)
+        self.boundary_thread = QThread(self)
+        self.boundary_worker = BoundaryWorker(self.processor)
+        self.boundary_worker.moveToThread(self.boundary_thread)
+        self.boundary_thread.started.connect(self.boundary_worker.run)
+        self.boundary_worker.finished.connect(self.finish_detect_documents)
+        self.boundary_worker.finished.connect(self.boundary_thread.quit)
+        self.boundary_thread.finished.connect(self.boundary_thread.deleteLater)
+        self.boundary_thread.start()
+
+    def finish_detect_documents(self, separator_pages, blank_pages):
+        self.detectDocumentsButton.setEnabled(True)
+        if self.boundary_worker is None or self.sender() is not self.boundary_worker or self.boundary_worker.file_path != self.file_path:
+            return  # Stopped, or another document was opened meanwhile.
+        self.show_detected_pages(separator_pages, blank_pages)
+        if not separator_pages and not blank_pages:
+            QMessageBox.information(self, "No separator pages", "No page looks like a separator sheet or a blank page.")
+            return
+        QMessageBox.information(
+            self, "Documents detected",
+            f"Found {len(separator_pages)} pages that look like separator sheets and {len(blank_pages)} that look blank. "
+            "Nothing has been skipped yet: they are listed below the page, where activating one shows it. Uncheck any "
+            "page with content, then click Skip Checked Pages.",
+        )
+
+    def show_detected_pages(self, separator_pages, blank_pages):
+        """List the pages found by Detect Documents, checked, or hide the list if there are none."""
+        self.detectedPagesList.clear()
+        separator_pages = set(separator_pages)
+        for page_number in sorted(separator_pages | set(blank_pages)):
+            separator = page_number in separator_pages
+            item = QListWidgetItem(f"Page {page_number + 1}: {'separator sheet' if separator else 'blank page'}")
+            item.setFlags(item.flags() | Qt.ItemFlag.ItemIsUserCheckable)
+            item.setCheckState(Qt.CheckState.Checked)
+            item.setData(Qt.ItemDataRole.UserRole, (page_number, separator))
+            self.detectedPagesList.addItem(item)
+        self.detectedPagesList.setVisible(self.detectedPagesList.count() > 0)
+        self.skipDetectedPagesButton.setVisible(self.detectedPagesList.count() > 0)
+
+    def show_detected_page(self, item):
+        self.show_selected_page(item.data(Qt.ItemDataRole.UserRole)[0])
+
+    def skip_detected_pages(self):
+        """Skip the checked pages of the Detect Documents list, marking the separator sheets as separators."""
+        if not self.processor:
+            return
+        separator_pages, blank_pages = [], []
+        for row in range(self.detectedPagesList.count()):
+            item = self.detectedPagesList.item(row)
+            if item.checkState() == Qt.CheckState.Checked:
+                page_number, separator = item.data(Qt.ItemDataRole.UserRole)
+                (separator_pages if separator else blank_pages).append(page_number)
+        self.page_configurations.mark_separators(separator_pages)
+        self.page_configurations.skip_pages(blank_pages)
+        self.show_detected_pages([], [])
+        self.update_page_display()
+        QMessageBox.information(
+            self, "Pages skipped",
+            f"Found {len(self.page_configurations.segments())} documents. Skipped {len(separator_pages)} separator "
+            f"pages and {len(blank_pages)} blank pages, which are not exported.",
+        )
+
+    def find_similar_pages(self):
+        """Find near-duplicate pages in the background and list their groups."""
+        if not self.processor:
+            return
+        self.findSimilarPagesButton.setEnabled(False)
+        self.near_duplicate_thread = QThread(self)
+        self.near_duplicate_worker = NearDuplicateWorker(self.processor)
+        self.near_duplicate_worker.moveToThread(self.near_duplicate_thread)
+        self.near_duplicate_thread.started.connect(self.near_duplicate_worker.run)
+        self.near_duplicate_worker.finished.connect(self.finish_find_similar_pages)
+        self.near_duplicate_worker.finished.connect(self.near_duplicate_thread.quit)
+        self.near_duplicate_thread.finished.connect(self.near_duplicate_thread.deleteLater)
+        self.near_duplicate_thread.start()
+
+    def straighten_pages(self):
+        """Find the rotation and skew of every page in the background and straighten the pages that need it."""
+        if not self.processor:
+            return
+        self.straightenPagesButton.setEnabled(False)
+        self.orientation_thread = QThread(self)
+        self.orientation_worker = OrientationWorker(self.processor)
+        self.orientation_worker.moveToThread(self.orientation_thread)
+        self.orientation_thread.started.connect(self.orientation_worker.run)
+        self.orientation_worker.finished.connect(self.finish_straighten_pages)
+        self.orientation_worker.finished.connect(self.orientation_thread.quit)
+        self.orientation_thread.finished.connect(self.orientation_thread.deleteLater)
+        self.orientation_thread.start()
+
+    def finish_straighten_pages(self, corrections):
+        self.straightenPagesButton.setEnabled(True)
+        if self.orientation_worker is None or self.sender() is not self.orientation_worker or self.orientation_worker.file_path != self.file_path:
+            return  # Stopped, or another document was opened meanwhile.
+        pages_by_correction = {}
+        for page_number, correction in enumerate(corrections):
+            if correction != (0, 0.0):
+                pages_by_correction.setdefault(correction, []).append(page_number)
+        for (rotation, skew), pages in pages_by_correction.items():
+            self.page_configurations.correct_pages(pages, rotation, skew)
+        self.update_page_display()
+        turned = sum(rotation != 0 for rotation, _ in corrections)
+        skewed = sum(skew != 0 for _, skew in corrections)
+        QMessageBox.information(
+            self, "Pages straightened",
+            f"Found {turned} sideways or upside-down pages and {skewed} skewed pages. "
+            "They are shown straightened and will be saved that way.",
+        )
+
+    def rotate_current_page(self):
+        if self.processor:
+            rotation, skew = self.page_configurations.get_correction(self.current_page)
+            self.page_configurations.correct_pages([self.current_page], (rotation + 90) % 360, skew)
+            self.update_page_display()
+
+    def finish_find_similar_pages(self, groups):
+        self.findSimilarPagesButton.setEnabled(True)
+        if self.near_duplicate_worker is None or self.sender() is not self.near_duplicate_worker or self.near_duplicate_worker.file_path != self.file_path:
+            return  # Stopped, or another document was opened meanwhile.
+        self.similarPagesList.clear()
+        for group in groups:
+            text = "Pages " if len(group["pages"]) > 1 else "Page "
+            text += ", ".join(str(page + 1) for page in group["pages"])
+            if group["outputs"]:
+                text += (" look like " if len(group["pages"]) > 1 else " looks like ") + ", ".join(
+                    f"{os.path.relpath(output_file_path, self.folder_path)} page {page + 1}"
+                    for output_file_path, page in group["outputs"][:3]
+                )
+                if len(group["outputs"]) > 3:
+                    text += f" and {len(group['outputs']) - 3} more"
+            item = QListWidgetItem(text)
+            item.setData(Qt.ItemDataRole.UserRole, group["pages"])
+            self.similarPagesList.addItem(item)
+        self.similarPagesList.setVisible(bool(groups))
+        if not groups:
+            QMessageBox.information(self, "No similar pages", "No page looks like another page or like a page already saved.")
+
+    def show_similar_page(self, item):
+        """Go to the next page of the activated group after the current one."""
+        pages = item.data(Qt.ItemDataRole.UserRole)
+        self.show_selected_page(next((page for page in pages if page > self.current_page), pages[0]))
+
+    def label_current_document(self):
+        """Give the current page's labels to its whole document (up to the next separator) and go to the next one."""
+        if not self.processor:
+            return
+        self.store_current_page_fields()
+        segments = self.page_configurations.segments()
+        for index, (first, last) in enumerate(segments):
+            if first <= self.current_page <= last:
+                self.page_configurations.assign_range(
+                    first, last,
+                    file_name=self.page_configurations.get_file_name(self.current_page),
+                    doc_type=self.page_configurations.get_doc_type(self.current_page),
+                )
+                if index + 1 < len(segments):
+                    next_first, next_last = segments[index + 1]
+                    self.current_page = next(
+                        page for page in range(next_first, next_last + 1)
+                        if not self.page_configurations.is_skipped(page)
+                    )
+                    self.processor.go_to_page(self.current_page)
+                self.update_page_display()
+                return
+        QMessageBox.warning(self, "Separator page", "This page is a separator; go to a page of the document to label it.")
+
+    def convert_to_pixmap(self, page_pixmap):
+        """Convert a rendered fitz.Pixmap to a QPixmap."""
+        if page_pixmap is None:
+            return QPixmap()
+        image = pixmap_to_qimage(page_pixmap)
+        with span("to_qpixmap", width=image.width(), height=image.height()):
+            return QPixmap.fromImage(image)
+
+    def toggle_performance_overlay(self):
+        if self.performanceOverlay.isVisible():
+            self.performance_overlay_timer.stop()
+            self.performanceOverlay.hide()
+            return
+        instrumentation.enable_tracing()
+        self.update_performance_overlay()
+        self.performanceOverlay.show()
+        self.performance_overlay_timer.start()
+
+    def update_performance_overlay(self):
+        lines = [f"{'span':<16}{'n':>4}{'mean ms':>9}{'max ms':>9}"]
+        for name, (count, mean_ms, max_ms) in sorted(instrumentation.recent_timings().items()):
+            lines.append(f"{name:<16}{count:>4}{mean_ms:>9.1f}{max_ms:>9.1f}")
+        if self.processor:
+            stats = self.processor.get_cache_stats()
+            lines.append(f"render cache {stats['hit_rate']:.0%} hits, {stats['bytes'] / 1048576:.0f} MB")
+        self.performanceOverlay.setText("\n".join(lines))
+        self.performanceOverlay.adjustSize()
+
+    def save_current_page(self):
+        """Save the current page to the output folder with the user-defined filename."""
+
+        self.store_current_page_fields()
+
+        if self.processor:
+            file_name = self.page_configurations.get_file_name(self.current_page)
+            doc_type = self.page_configurations.get_doc_type(self.current_page)
+
+            if file_name and file_name != DEFAULT_FILE_NAME:
+                try:
+                    output_file_path = self.processor.save_page_as_pdf(
+                        self.current_page, file_name, doc_type, self.page_configurations.get_correction(self.current_page))
+                except Exception as e:
+                    warning_message = f"Error saving page {self.current_page + 1} as '{file_name}.pdf' in {doc_type} folder: {e}."
+                    QMessageBox.warning(self, "Problem saving page", warning_message)
+                    return
+
+                if output_file_path is None:
+                    QMessageBox.warning(self, "Page not saved", f"'{file_name}.pdf' already exists in {doc_type} folder, so page {self.current_page + 1} was not saved.")
+                    return
+                success_message = f"Successfully saved page {self.current_page + 1} as '{os.path.basename(output_file_path)}' in {doc_type} folder."
+                QMessageBox.about(self, "Success", success_message)
+
+            else:
+                # If no file name is provided, show an error
+                QMessageBox.warning(self, "Invalid Filename", "Please enter a valid filename.")
+
+    def save_all_pages(self):
+        """Save all pages to their respective folders if all pages' information was entered.
+           Otherwise, create a warning"""
+        self.store_current_page_fields()
+
+        if self.page_configurations.is_complete():
+            if self.processor:
+                self.check_duplicate_pages()
+        else:
+            file_name_warning_message = ""
+            doc_type_warning_message = ""
+            warning_message = ""
+
+            file_name_indices = self.page_configurations.pages_missing_file_name()
+            doc_type_indices = self.page_configurations.pages_missing_doc_type()
+
+            if file_name_indices:
+                adjusted_file_name_page_numbers = [x + 1 for x in file_name_indices]
+                file_name_warning_message = f"The following pages have no file name entered: {adjusted_file_name_page_numbers}."
+
+            if doc_type_indices:
+                adjusted_doc_type_page_numbers = [x + 1 for x in doc_type_indices]
+                doc_type_warning_message = f"The following pages have no document type entered: {adjusted_doc_type_page_numbers}."
+
+            warning_message = file_name_warning_message + "\n" + doc_type_warning_message
+
+            QMessageBox.warning(self, "File(s) not configured", warning_message)
+
+    def check_duplicate_pages(self):
+        """Look for pages already saved from another source in the background, then export (see finish_check_duplicate_pages)."""
+        self.saveAllPagesButton.setEnabled(False)
+        pages = [page for page in range(self.total_pages) if not self.page_configurations.is_skipped(page)]
+        self.duplicate_check_thread = QThread(self)
+        self.duplicate_check_worker = DuplicateCheckWorker(self.file_path, self.folder_path, pages)
+        self.duplicate_check_worker.moveToThread(self.duplicate_check_thread)
+        self.duplicate_check_thread.started.connect(self.duplicate_check_worker.run)
+        self.duplicate_check_worker.finished.connect(self.finish_check_duplicate_pages)
+        self.duplicate_check_worker.finished.connect(self.duplicate_check_thread.quit)
+        self.duplicate_check_thread.finished.connect(self.duplicate_check_thread.deleteLater)
+        self.duplicate_check_thread.start()
+
+    def finish_check_duplicate_pages(self, duplicates):
+        worker = self.duplicate_check_worker
+        if worker is None or self.sender() is not worker or worker.file_path != self.file_path:
+            return  # Stopped, or another document was opened meanwhile.
+        left_out_pages = self.confirm_duplicate_pages(duplicates)
+        if left_out_pages is None:
+            self.saveAllPagesButton.setEnabled(True)
+        else:
+            self.start_export(left_out_pages)
+
+    def confirm_duplicate_pages(self, duplicates):
+        """Ask what to do with duplicates, the pages that are already in the output folder from another source.
+
+        Returns the pages to leave out of the export, or None to cancel it."""
+        if not duplicates:
+            return []
+
+        examples = "\n".join(f"Page {page + 1}: {os.path.relpath(paths[0], self.folder_path)}"
+                             for page, paths in list(duplicates.items())[:5])
+        message_box = QMessageBox(QMessageBox.Icon.Question, "Pages already saved",
+                                  f"{len(duplicates)} pages are already in the output folder, saved from another file:\n{examples}",
+                                  parent=self)
+        message_box.setDetailedText("\n".join(f"Page {page + 1}: {', '.join(paths)}" for page, paths in duplicates.items()))
+        save_again_button = message_box.addButton("Save Again", QMessageBox.ButtonRole.AcceptRole)
+        leave_out_button = message_box.addButton("Leave Them Out", QMessageBox.ButtonRole.DestructiveRole)
+        message_box.addButton(QMessageBox.StandardButton.Cancel)
+        message_box.exec()
+        if message_box.clickedButton() is save_again_button:
+            return []
+        if message_box.clickedButton() is leave_out_button:
+            return sorted(duplicates)
+        return None
+
+    def start_export(self, left_out_pages=()):
+        """Export all pages but left_out_pages on a background thread while showing progress."""
+        self.saveAllPagesButton.setEnabled(False)
+        self.left_out_pages = list(left_out_pages)
+
+        self.export_progress = QProgressDialog("Saving pages...", "Cancel", 0, self.total_pages - len(self.page_configurations.skipped_pages()) - len(self.left_out_pages), self)
+        self.export_progress.setWindowTitle("Saving pages")
+        self.export_progress.setWindowModality(Qt.WindowModality.WindowModal)
+        self.export_progress.setMinimumDuration(0)
+        self.export_progress.setAutoClose(False)
+        self.export_progress.setAutoReset(False)
+        self.export_progress.setValue(0)
+
+        self.export_thread = QThread(self)
+        self.export_worker = ExportWorker(self.file_path, self.folder_path, self.page_configurations,
+                                          save_profile=self.save_profile, collision_policy=self.collision_policy,
+                                          left_out_pages=self.left_out_pages)
+        self.export_worker.moveToThread(self.export_thread)
+        self.export_thread.started.connect(self.export_worker.run)
+        self.export_worker.progress.connect(self.update_export_progress)
+        self.export_worker.finished.connect(self.finish_export)
+        self.export_worker.finished.connect(self.export_thread.quit)
+        self.export_thread.finished.connect(self.export_thread.deleteLater)
+        # The worker thread is busy in run(), so cancel through a direct call that only sets a flag.
+        self.export_progress.canceled.connect(self.export_worker.cancel, Qt.ConnectionType.DirectConnection)
+        self.export_thread.start()
+
+    def update_export_progress(self, pages_done, total_pages, pages_per_second):
+        self.export_progress.setValue(pages_done)
+        self.export_progress.setLabelText(f"Saved {pages_done} of {total_pages} pages ({pages_per_second:.1f} pages/sec)")
+
+    def finish_export(self, results, cancelled):
+        """Close the progress dialog and report what happened to every page."""
+        if self.export_worker is None or self.sender() is not self.export_worker:
+            return  # Stopped when another document was opened or the window closed.
+        self.export_progress.close()
+        self.saveAllPagesButton.setEnabled(True)
+
+        page_reports = {}
+        failed_pages = []
+        existing_pages = []
+        export_error = None  # What stopped the whole export, rather than a single output
+        saved_files = set()
+        saved_pages = 0
+        unchanged_files = 0
+        appended_files = 0
+        for result in results:
+            if result["error"] and not result["pages"]:
+                export_error = result["error"]
+                continue
+            unchanged_files += result["unchanged"]
+            appended_files += result["appended"] and not result["unchanged"] and not result["error"]
+            if not result["error"] and not result["skipped"]:
+                saved_files.add(result["file_path"])
+            for page in result["pages"]:
+                if result["error"]:
+                    failed_pages.append(page + 1)
+                    page_reports[page] = f"Page {page + 1}: failed ({result['error']})"
+                elif result["skipped"]:
+                    existing_pages.append(page + 1)
+                    page_reports[page] = f"Page {page + 1}: not saved, its file already exists"
+                else:
+                    saved_pages += 1
+                    if result["unchanged"]:
+                        state = "already in" if result["appended"] else "already up to date in"
+                    else:
+                        state = "appended to" if result["appended"] else "saved to"
+                    page_reports[page] = f"Page {page + 1}: {state} {result['file_path']}"
+        for page in self.page_configurations.skipped_pages():
+            page_reports.setdefault(page, f"Page {page + 1}: skipped")
+        for page in self.left_out_pages:
+            page_reports.setdefault(page, f"Page {page + 1}: left out, already saved from another file")
+        report = "\n".join(page_reports.get(page, f"Page {page + 1}: not saved") for page in range(self.total_pages))
+        logger.debug("Export report:\n%s", report)
+
+        total_seconds = sum(result["seconds"] for result in results)
+        bytes_in = sum(result["bytes_in"] for result in results)
+        bytes_out = sum(result["bytes_out"] for result in results)
+        logger.info("Saved %d pages to %d files (%d already up to date) in %.3fs (%.0f KB of source -> %.0f KB, %s profile)",
+                    saved_pages, len(saved_files), unchanged_files, total_seconds, bytes_in / 1024, bytes_out / 1024,
+                    self.save_profile)
+
+        skipped_pages = len(self.page_configurations.skipped_pages())
+        pages_to_save = self.total_pages - skipped_pages - len(self.left_out_pages)
+        skipped_note = f" {skipped_pages} skipped pages were left out." if skipped_pages else ""
+        if self.left_out_pages:
+            skipped_note += f" {len(self.left_out_pages)} pages already saved from another file were left out."
+        if unchanged_files:
+            skipped_note += f" {unchanged_files} files were already up to date and not rewritten."
+        if appended_files:
+            skipped_note += f" {appended_files} existing files were appended to."
+        existing_note = f" Pages {existing_pages} were not saved because their files already exist." if existing_pages else ""
+        if cancelled:
+            message_box = QMessageBox(QMessageBox.Icon.Warning, "Saving cancelled", f"Saving was cancelled after {saved_pages} of {pages_to_save} pages.", parent=self)
+        elif export_error is not None and not saved_pages:
+            message_box = QMessageBox(QMessageBox.Icon.Warning, "Error saving pages", f"Nothing was saved: {export_error}", parent=self)
+        elif export_error is not None:
+            failed_note = f" The following pages could not be saved: {failed_pages}." if failed_pages else ""
+            message_box = QMessageBox(QMessageBox.Icon.Warning, "Error saving pages", f"Saving stopped after {saved_pages} of {pages_to_save} pages were saved to {len(saved_files)} files: {export_error}. The details list where each page was saved.{failed_note}{existing_note}", parent=self)
+        elif failed_pages or saved_pages + len(existing_pages) != pages_to_save:
+            message_box = QMessageBox(QMessageBox.Icon.Warning, "Error saving pages", f"Saved {saved_pages} of {pages_to_save} pages. The following pages could not be saved: {failed_pages}.{existing_note}", parent=self)
+        elif existing_pages:
+            message_box = QMessageBox(QMessageBox.Icon.Information, "Saved", f"Saved {saved_pages} of {pages_to_save} pages.{existing_note}{skipped_note}", parent=self)
+        else:
+            message_box = QMessageBox(QMessageBox.Icon.Information, "Success", f"Successfully saved {pages_to_save} pages to {len(saved_files)} files.{skipped_note}", parent=self)
+        message_box.setDetailedText(report)
+        message_box.exec()
+
+    def clear_page_configurations(self):
+        self.page_configurations.clear()
+        self.update_page_display()
@@ -0,0 +1,143 @@
+import json
+import os
+import time
+
+from document_cache import get_cache_root
+from page_config_store import DEFAULT_DOC_TYPE, DEFAULT_FILE_NAME, page_runs
+
+JOURNAL_VERSION = 1
+JOURNAL_EXTENSION = ".splitjournal"
+# Rewrite the journal as a snapshot of the current labels once this many edits
+# have been appended since the last snapshot.
+COMPACT_AFTER_RECORDS = 2000
+# Edits are flushed to the OS immediately (enough to survive the app crashing)
+# but forced to disk at most this often, which is slow on network shares.
+FSYNC_INTERVAL = 1.0
+
+
+def get_journal_path(file_path):
+    """The journal sits next to the source PDF, or in the cache folder if that is read-only."""
+    journal_path = file_path + JOURNAL_EXTENSION
+    if os.access(os.path.dirname(os.path.abspath(file_path)), os.W_OK):
+        return journal_path
+    journal_dir = os.path.join(get_cache_root(), "journals")
+    os.makedirs(journal_dir, exist_ok=True)
+    return os.path.join(journal_dir, os.path.basename(journal_path))
+
+
+class SessionJournal:
+    """Append-only log of label edits, so a session can be restored after a crash or an accidental close.
+
+    Each line is one JSON record: a header naming the source it belongs to, then
+    ["f", first, last, file_name], ["d", first, last, doc_type],
+    ["s", first, last, skipped], ["b", first, last, separator],
+    ["r", first, last, rotation, skew] or ["clear"]."""
+
+    def __init__(self, file_path, total_pages):
+        self.journal_path = get_journal_path(file_path)
+        self.header = {"version": JOURNAL_VERSION, "pages": total_pages, "source_size": os.path.getsize(file_path)}
+        self.records_since_compaction = 0
+        self.last_sync = time.monotonic()
+        self.journal_file = None
+
+    def restore(self, store):
+        """Replay a journal left by an earlier session into store and return how many edits were applied.
+
+        Call this before attaching the journal to the store. A journal written for
+        a different source is ignored and replaced."""
+        applied = 0
+        try:
+            with open(self.journal_path, encoding="utf-8") as journal_file:
+                header = json.loads(journal_file.readline() or "null")
+                if header == self.header:
+                    for line in journal_file:
+                        try:
+                            record = json.loads(line)
+                        except ValueError:
+                            break  # A line cut short by a crash ends the journal.
+                        self._apply(store, record)
+                        applied += 1
+        except FileNotFoundError:
+            pass
+        self.compact(store)
+        return applied
+
+    def _apply(self, store, record):
+        if record[0] == "f":
+            store.assign_range(record[1], record[2], file_name=record[3])
+        elif record[0] == "d":
+            store.assign_range(record[1], record[2], doc_type=record[3])
+        elif record[0] == "s":
+            store.skip_pages(range(record[1], record[2] + 1), record[3])
+        elif record[0] == "b":
+            store.mark_separators(range(record[1], record[2] + 1), record[3])
+        elif record[0] == "r":
+            store.correct_pages(range(record[1], record[2] + 1), record[3], record[4])
+        elif record[0] == "clear":
+            store.clear()
+
+    def record_range(self, first, last, file_name=None, doc_type=None):
+        if file_name is not None:
+            self._append(["f", first, last, file_name])
+        if doc_type is not None:
+            self._append(["d", first, last, doc_type])
+
+    def record_skip(self, first, last, skipped):
+        self._append(["s", first, last, skipped])
+
+    def record_separator(self, first, last, separator):
+        self._append(["b", first, last, separator])
+
+    def record_correction(self, first, last, rotation, skew):
+        self._append(["r", first, last, rotation, skew])
+
+    def record_clear(self):
+        self._append(["clear"])
+
+    def _append(self, record):
+        if self.journal_file is None:
+            return
+        self.journal_file.write(json.dumps(record) + "\n")
+        self.journal_file.flush()
+        self.records_since_compaction += 1
+        if time.monotonic() - self.last_sync > FSYNC_INTERVAL:
+            os.fsync(self.journal_file.fileno())
+            self.last_sync = time.monotonic()
+
+    def maybe_compact(self, store):
+        if self.records_since_compaction >= COMPACT_AFTER_RECORDS:
+            self.compact(store)
+
+    def compact(self, store):
+        """Replace the journal with one record per run of identical labels."""
+        self.close()
+        temporary_path = self.journal_path + ".tmp"
+        with open(temporary_path, "w", encoding="utf-8") as journal_file:
+            journal_file.write(json.dumps(self.header) + "\n")
+            for first, last, file_name, doc_type in store.runs():
+                if file_name == DEFAULT_FILE_NAME and doc_type == DEFAULT_DOC_TYPE:
+                    continue
+                journal_file.write(json.dumps(["f", first, last, file_name]) + "\n")
+                journal_file.write(json.dumps(["d", first, last, doc_type]) + "\n")
+            for first, last in page_runs(store.skipped_pages()):
+                journal_file.write(json.dumps(["s", first, last, True]) + "\n")
+            for first, last in page_runs(store.separator_pages()):
+                journal_file.write(json.dumps(["b", first, last, True]) + "\n")
+            pages_by_correction = {}
+            for page_number, correction in sorted(store.corrections().items()):
+                pages_by_correction.setdefault(correction, []).append(page_number)
+            for (rotation, skew), pages in pages_by_correction.items():
+                for first, last in page_runs(pages):
+                    journal_file.write(json.dumps(["r", first, last, rotation, skew]) + "\n")
+            journal_file.flush()
+            os.fsync(journal_file.fileno())
+        os.replace(temporary_path, self.journal_path)
+        self.journal_file = open(self.journal_path, "a", encoding="utf-8")
+        self.records_since_compaction = 0
+
+    def close(self):
+        if self.journal_file is not None:
+            self.journal_file.flush()
+            os.fsync(self.journal_file.fileno())
+            self.journal_file.close()
+            self.journal_file = None
@@ -0,0 +1,496 @@
+"""A headless split service: page renders, text, page counts and batch exports over HTTP.
+
+Workstations that open the same large PDFs from a network share can ask one
+service for them instead of each opening and rendering them on its own:
+
+    python split_service.py --root /mnt/share/scans --root /mnt/share/split --host 0.0.0.0 --port 8765
+
+Every request is a job on a queue served by a fixed pool of worker threads, so
+a burst of requests is worked through at the pool's pace and turned away with
+503 once MAX_WAITING_JOBS are waiting. Exports have their own queue and
+workers, so a long export never holds up renders. Sources stay open between
+requests in a DocumentPool of PDFProcessor handles sharing one render cache;
+a repeated request for a source reuses its handle (and any cached render)
+instead of reopening and reparsing the file.
+
+    GET  /page_count?path=P               {"pages": N}
+    GET  /text?path=P&page=N              {"text": "..."}
+    GET  /render?path=P&page=N&zoom=Z     the page as a PNG
+    POST /export                          {"job": ID}, 202
+    GET  /jobs/ID?wait=SECONDS            {"job", "state", "result"}
+    GET  /status                          queue, pool and render cache counters
+
+Page numbers are 0-based. An export is described by a JSON body with
+"source", "output" and optionally "manifest" (found next to the source by
+default, as by cli.py), "profile", "on_conflict", "straighten" and "index";
+its result is the summary cli.py prints for one source. Every path must lie
+under one of the --root folders (403 otherwise). Errors are JSON objects with
+an "error" message.
+
+The server listens on 127.0.0.1 unless --host says otherwise, so by default
+only the machine it runs on can use it. There is no authentication: anyone
+who can reach the port can read every PDF under the --root folders and
+export into them, so only serve other machines on a trusted network, with
+roots that hold nothing else.
+"""
+import argparse
+import contextlib
+import itertools
+import json
+import logging
+import multiprocessing
+import os
+import queue
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import Future
+from http import HTTPStatus
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlsplit
+
+import cli
+import instrumentation
+from pdf_processor import COLLISION_POLICIES, SAVE_PROFILES, PDFProcessor, RenderCache, snap_zoom
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_HOST = "127.0.0.1"
+DEFAULT_PORT = 8765
+# Sources kept open, and the memory their renders share.
+MAX_OPEN_DOCUMENTS = 16
+RENDER_CACHE_BYTES = 512 * 1024 * 1024
+# Jobs waiting per queue before requests are turned away, and how long a
+# request waits for its job before giving up with 504.
+MAX_WAITING_JOBS = 256
+REQUEST_TIMEOUT = 60.0
+MAX_ZOOM = 8.0
+# Finished exports whose results can still be fetched from /jobs.
+MAX_FINISHED_EXPORTS = 1000
+# Exports start their worker processes with spawn: forking copies MuPDF's state
+# mid-call from whichever worker thread happens to be inside it, which can
+# leave the child deadlocked or corrupt.
+EXPORT_START_METHOD = "spawn"
+
+
+class QueueFullError(RuntimeError):
+    """A job was submitted to a queue that already has its maximum of jobs waiting."""
+
+
+class UnknownJob(LookupError):
+    """A job id the service never issued, or whose result it no longer keeps."""
+
+
+class UnknownEndpoint(LookupError):
+    """A request for a path the service does not serve."""
+
+
+class JobQueue:
+    """Jobs run by a fixed pool of worker threads, in the order they were submitted."""
+
+    def __init__(self, workers, max_waiting=MAX_WAITING_JOBS, name="JobQueue"):
+        self._jobs = queue.Queue(max_waiting)
+        self._threads = [threading.Thread(target=self._run, name=f"{name}-{number}", daemon=True)
+                         for number in range(max(1, workers))]
+        for thread in self._threads:
+            thread.start()
+
+    def submit(self, function, *args):
+        """Queue function(*args) and return a Future for its result; raise QueueFullError if too many jobs wait."""
+        future = Future()
+        try:
+            self._jobs.put_nowait((future, function, args))
+        except queue.Full:
+            raise QueueFullError(f"{self._jobs.maxsize} jobs are already waiting")
+        return future
+
+    def waiting(self):
+        return self._jobs.qsize()
+
+    def close(self):
+        """Let the jobs already queued finish, then stop the workers."""
+        for _ in self._threads:
+            self._jobs.put(None)
+        for thread in self._threads:
+            thread.join()
+
+    def _run(self):
+        while True:
+            job = self._jobs.get()
+            if job is None:
+                return
+            future, function, args = job
+            if not future.set_running_or_notify_cancel():
+                continue
+            try:
+                future.set_result(function(*args))
+            except BaseException as e:
+                future.set_exception(e)
+
+
+class _PooledDocument:
+    __slots__ = ("processor", "stamp", "users", "retired")
+
+    def __init__(self, processor, stamp):
+        self.processor = processor
+        self.stamp = stamp
+        self.users = 0
+        self.retired = False
+
+
+class DocumentPool:
+    """Open sources kept for reuse, the least recently used closed first.
+
+    Handles are keyed by real path and checked against the file's size and
+    modification time on every use, so a source that has changed is reopened.
+    A handle is never closed while in use: take it with acquire(). Files are
+    read through a handle rather than memory-mapped, since a mapped file cut
+    short on the share would crash the service. With max_documents 0 nothing is
+    kept, and every request opens its source."""
+
+    def __init__(self, max_documents=MAX_OPEN_DOCUMENTS, render_cache_bytes=RENDER_CACHE_BYTES):
+        self.max_documents = max_documents
+        self.render_cache = RenderCache(render_cache_bytes)
+        self.opened = 0
+        self.reused = 0
+        self._entries = OrderedDict()  # real path -> _PooledDocument
+        self._lock = threading.Lock()
+
+    @contextlib.contextmanager
+    def acquire(self, file_path):
+        """Yield an open PDFProcessor for file_path, opening it only if the pool has no current handle."""
+        path = os.path.realpath(file_path)
+        stat = os.stat(path)
+        stamp = (stat.st_size, stat.st_mtime_ns)
+        with self._lock:
+            entry = self._entries.get(path)
+            if entry is not None and entry.stamp != stamp:
+                self._retire(self._entries.pop(path))
+                entry = None
+            if entry is not None:
+                self._entries.move_to_end(path)
+                entry.users += 1
+                self.reused += 1
+
+        if entry is None:
+            # Opened outside the lock, so one slow file does not hold up the others.
+            processor = PDFProcessor(path, None, render_cache=self.render_cache)
+            with self._lock:
+                self.opened += 1
+                entry = self._entries.get(path)
+                if entry is not None and entry.stamp == stamp:
+                    # Another request opened it meanwhile; use that handle.
+                    self._entries.move_to_end(path)
+                    entry.users += 1
+                    extra = processor
+                else:
+                    if entry is not None:
+                        self._retire(self._entries.pop(path))
+                    entry = _PooledDocument(processor, stamp)
+                    entry.users += 1
+                    self._entries[path] = entry
+                    extra = None
+                    self._evict()
+            if extra is not None:
+                extra.close()
+
+        try:
+            yield entry.processor
+        finally:
+            with self._lock:
+                entry.users -= 1
+                close = entry.retired and entry.users == 0
+                if not close and self.max_documents == 0 and entry.users == 0 and self._entries.get(path) is entry:
+                    del self._entries[path]
+                    close = True
+            if close:
+                entry.processor.close()
+
+    def _evict(self):
+        """Retire least recently used handles past max_documents. Call with the lock held."""
+        excess = len(self._entries) - max(1, self.max_documents)
+        for path in list(self._entries):
+            if excess <= 0:
+                break
+            if self._entries[path].users == 0:
+                self._retire(self._entries.pop(path))
+                excess -= 1
+
+    def _retire(self, entry):
+        """Mark a handle that left the pool; it is closed now if unused, else when its last user is done."""
+        entry.retired = True
+        if entry.users == 0:
+            entry.users = -1  # Never closed twice
+            entry.processor.close()
+
+    def stats(self):
+        with self._lock:
+            return {"open": len(self._entries), "max_open": self.max_documents, "opened": self.opened,
+                    "reused": self.reused, "render_cache": self.render_cache.stats()}
+
+    def close(self):
+        with self._lock:
+            entries, self._entries = list(self._entries.values()), OrderedDict()
+            for entry in entries:
+                self._retire(entry)
+
+
+class SplitService:
+    """What the HTTP server serves, usable directly as well.
+
+    page_count, text and render run on the request queue and wait for their
+    result; submit_export queues an export and returns its job id at once."""
+
+    def __init__(self, roots, workers=None, export_workers=1, export_processes=None,
+                 max_documents=MAX_OPEN_DOCUMENTS, max_waiting=MAX_WAITING_JOBS, render_cache_bytes=RENDER_CACHE_BYTES):
+        if not roots:
+            raise ValueError("The service needs at least one root folder")
+        self.roots = [os.path.realpath(root) for root in roots]
+        self.export_processes = export_processes or os.cpu_count() or 1
+        self.export_context = multiprocessing.get_context(EXPORT_START_METHOD)
+        self.documents = DocumentPool(max_documents, render_cache_bytes)
+        self.requests = JobQueue(workers or os.cpu_count() or 1, max_waiting, "SplitService")
+        self.exports = JobQueue(export_workers, max_waiting, "SplitServiceExport")
+        self._export_jobs = OrderedDict()  # job id -> Future
+        self._job_ids = itertools.count(1)
+        self._lock = threading.Lock()
+
+    def check_path(self, file_path):
+        """The real path of file_path; raise PermissionError if it is outside every root."""
+        path = os.path.realpath(file_path)
+        for root in self.roots:
+            if os.path.commonpath([root, path]) == root:
+                return path
+        raise PermissionError(f"{file_path} is outside the service's root folders")
+
+    def _run(self, function, *args, timeout=REQUEST_TIMEOUT):
+        return self.requests.submit(function, *args).result(timeout)
+
+    def page_count(self, file_path):
+        return self._run(self._page_count, self.check_path(file_path))
+
+    def text(self, file_path, page_number):
+        return self._run(self._text, self.check_path(file_path), page_number)
+
+    def render(self, file_path, page_number, zoom=1.0):
+        """The page rendered at zoom, as PNG bytes."""
+        if not 0 < zoom <= MAX_ZOOM:
+            raise ValueError(f"zoom must be above 0 and at most {MAX_ZOOM}")
+        return self._run(self._render, self.check_path(file_path), page_number, snap_zoom(zoom))
+
+    def _page_count(self, path):
+        with self.documents.acquire(path) as processor:
+            return processor.get_total_pages()
+
+    def _text(self, path, page_number):
+        with self.documents.acquire(path) as processor:
+            _check_page(processor, page_number)
+            return processor.get_page_text(page_number)
+
+    def _render(self, path, page_number, zoom):
+        with self.documents.acquire(path) as processor:
+            _check_page(processor, page_number)
+            pixmap = processor.render_page(page_number, zoom)
+        # Encoded outside the document's lock; the pixmap is not tied to it.
+        return pixmap.tobytes("png")
+
+    def submit_export(self, source, output, manifest=None, profile=None, on_conflict=None, straighten=False, index=True):
+        """Queue the export of a source by its manifest and return the job id."""
+        source = self.check_path(source)
+        output = self.check_path(output)
+        manifest = self.check_path(manifest) if manifest else cli.find_manifest(source)
+        if manifest is None:
+            raise FileNotFoundError(f"No manifest found for {source}")
+        if not os.path.isfile(source):
+            raise FileNotFoundError(f"{source} does not exist")
+        if not os.path.isdir(output):
+            raise FileNotFoundError(f"{output} is not a folder")
+        if profile is not None and profile not in SAVE_PROFILES:
+            raise ValueError(f"Unknown save profile '{profile}'")
+        if on_conflict is not None and on_conflict not in COLLISION_POLICIES:
+            raise ValueError(f"Unknown collision policy '{on_conflict}'")
+        future = self.exports.submit(cli.export_document, source, output, manifest, self.export_processes, profile,
+                                     on_conflict, bool(index), bool(straighten), self.export_context)
+        with self._lock:
+            job_id = str(next(self._job_ids))
+            self._export_jobs[job_id] = future
+            finished = [job for job, job_future in self._export_jobs.items() if job_future.done()]
+            for job in finished[:max(0, len(finished) - MAX_FINISHED_EXPORTS)]:
+                del self._export_jobs[job]
+        logger.info("Queued export %s of %s", job_id, source)
+        return job_id
+
+    def job(self, job_id, wait=0.0):
+        """{"job", "state", "result"} of an export, waiting up to wait seconds for it to finish; UnknownJob if unknown."""
+        with self._lock:
+            future = self._export_jobs.get(job_id)
+        if future is None:
+            raise UnknownJob(f"No export job {job_id}")
+        if wait:
+            with contextlib.suppress(TimeoutError):
+                future.exception(timeout=wait)
+        if not future.done():
+            return {"job": job_id, "state": "running" if future.running() else "queued", "result": None}
+        if future.exception() is not None:
+            error = future.exception()
+            return {"job": job_id, "state": "failed", "result": {"error": f"{type(error).__name__}: {error}"}}
+        return {"job": job_id, "state": "done", "result": future.result()}
+
+    def status(self):
+        with self._lock:
+            exports_pending = sum(not future.done() for future in self._export_jobs.values())
+        return {"requests_waiting": self.requests.waiting(), "exports_waiting": self.exports.waiting(),
+                "exports_pending": exports_pending, "documents": self.documents.stats()}
+
+    def close(self):
+        self.requests.close()
+        self.exports.close()
+        self.documents.close()
+
+
+def _check_page(processor, page_number):
+    if not 0 <= page_number < processor.get_total_pages():
+        raise ValueError(f"Page {page_number} is out of range (the document has {processor.get_total_pages()} pages)")
+
+
+# Exceptions raised by SplitService, and the status each is answered with.
+_ERROR_STATUSES = [
+    (PermissionError, HTTPStatus.FORBIDDEN),
+    (FileNotFoundError, HTTPStatus.NOT_FOUND),
+    (UnknownJob, HTTPStatus.NOT_FOUND),
+    (UnknownEndpoint, HTTPStatus.NOT_FOUND),
+    (ValueError, HTTPStatus.BAD_REQUEST),
+    (QueueFullError, HTTPStatus.SERVICE_UNAVAILABLE),
+    (TimeoutError, HTTPStatus.GATEWAY_TIMEOUT),
+]
+
+
+class ServiceRequestHandler(BaseHTTPRequestHandler):
+    """Maps the HTTP endpoints onto the server's SplitService; connections are kept alive between requests."""
+
+    protocol_version = "HTTP/1.1"
+    # Headers and body are written separately; with Nagle's algorithm the body of
+    # a kept-alive response would wait for the client's delayed ACK, about 40 ms.
+    disable_nagle_algorithm = True
+
+    def do_GET(self):
+        url = urlsplit(self.path)
+        parameters = {name: values[-1] for name, values in parse_qs(url.query).items()}
+        self._respond(lambda: self._get(url.path, parameters))
+
+    def do_POST(self):
+        url = urlsplit(self.path)
+        self._respond(lambda: self._post(url.path, self._read_json()))
+
+    def _get(self, path, parameters):
+        service = self.server.service
+        if path == "/page_count":
+            return {"pages": service.page_count(_parameter(parameters, "path"))}
+        if path == "/text":
+            return {"text": service.text(_parameter(parameters, "path"), int(_parameter(parameters, "page")))}
+        if path == "/render":
+            return service.render(_parameter(parameters, "path"), int(_parameter(parameters, "page")),
+                                  float(parameters.get("zoom", 1.0)))
+        if path.startswith("/jobs/"):
+            return service.job(path[len("/jobs/"):], min(float(parameters.get("wait", 0.0)), REQUEST_TIMEOUT))
+        if path == "/status":
+            return service.status()
+        raise UnknownEndpoint(f"No endpoint {path}")
+
+    def _post(self, path, body):
+        if path != "/export":
+            raise UnknownEndpoint(f"No endpoint {path}")
+        if not isinstance(body, dict):
+            raise ValueError("The request body must be a JSON object")
+        job_id = self.server.service.submit_export(
+            _parameter(body, "source"), _parameter(body, "output"), body.get("manifest"), body.get("profile"),
+            body.get("on_conflict"), body.get("straighten", False), body.get("index", True))
+        return HTTPStatus.ACCEPTED, {"job": job_id}
+
+    def _read_json(self):
+        length = int(self.headers.get("Content-Length") or 0)
+        try:
+            return json.loads(self.rfile.read(length) or b"null")
+        except ValueError:
+            raise ValueError("The request body is not valid JSON")
+
+    def _respond(self, handle):
+        start = time.perf_counter()
+        status = HTTPStatus.OK
+        try:
+            result = handle()
+            if isinstance(result, tuple):
+                status, result = result
+        except Exception as e:
+            status = next((error_status for error_type, error_status in _ERROR_STATUSES if isinstance(e, error_type)),
+                          HTTPStatus.INTERNAL_SERVER_ERROR)
+            if status == HTTPStatus.INTERNAL_SERVER_ERROR:
+                logger.exception("Error handling %s", self.path)
+            result = {"error": str(e)}
+        if isinstance(result, bytes):
+            body, content_type = result, "image/png"
+        else:
+            body, content_type = json.dumps(result).encode(), "application/json"
+        self.send_response(status)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+        logger.debug("%s %s -> %d in %.1f ms", self.command, self.path, status, (time.perf_counter() - start) * 1000)
+
+    def log_message(self, format, *args):
+        logger.debug(format, *args)
+
+
+def _parameter(parameters, name):
+    if name not in parameters:
+        raise ValueError(f"Missing parameter '{name}'")
+    return parameters[name]
+
+
+def make_server(service, port=DEFAULT_PORT, host=DEFAULT_HOST):
+    """An HTTP server for service on host:port (0 picks a free port); call serve_forever() to run it."""
+    server = ThreadingHTTPServer((host, port), ServiceRequestHandler)
+    server.daemon_threads = True
+    server.service = service
+    return server
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--root", action="append", required=True,
+                        help="Folder whose sources and output roots may be used; repeat for several.")
+    parser.add_argument("--host", default=DEFAULT_HOST,
+                        help="Address to listen on, e.g. 0.0.0.0 for every interface (default: this machine only).")
+    parser.add_argument("--port", type=int, default=DEFAULT_PORT)
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1,
+                        help="Threads serving page counts, text and renders.")
+    parser.add_argument("--export-workers", type=int, default=1, help="Exports run at once.")
+    parser.add_argument("--export-processes", type=int, default=os.cpu_count() or 1,
+                        help="Worker processes used by each export.")
+    parser.add_argument("--max-documents", type=int, default=MAX_OPEN_DOCUMENTS, help="Sources kept open.")
+    parser.add_argument("--log-level", help="Logging level for messages on stderr (default INFO).")
+    args = parser.parse_args(argv)
+    for root in args.root:
+        if not os.path.isdir(root):
+            parser.error(f"{root} is not a folder")
+    instrumentation.configure_logging(args.log_level)
+
+    service = SplitService(args.root, args.workers, args.export_workers, args.export_processes, args.max_documents)
+    server = make_server(service, args.port, args.host)
+    logger.info("Serving on http://%s:%d", *server.server_address[:2])
+    if args.host != DEFAULT_HOST:
+        logger.warning("Listening on %s without authentication; anything under the roots can be read and exported "
+                       "into by whoever can reach the port", args.host)
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+        service.close()
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -0,0 +1,138 @@
+import json
+import os
+import re
+from collections import defaultdict
+
+import fitz  # PyMuPDF
+
+from document_cache import get_document_cache_dir, map_page_chunks, read_cache, write_cache_atomically
+from instrumentation import span
+
+# Keywords (matched case-insensitively against the page text) that suggest each doc type.
+DEFAULT_KEYWORD_RULES = {
+    "Insurance Auth": ["authorization", "prior auth", "pre-authorization", "insurance", "member id"],
+    "ID": ["driver license", "driver's license", "identification card", "date of birth", "dob"],
+    "OrthoK": ["orthokeratology", "ortho-k", "orthok", "corneal reshaping"],
+    "Outside Rx": ["outside prescription", "spectacle rx", "contact lens rx", "prescribed by"],
+    "POF Waiver": ["waiver", "proof of financial", "financial responsibility"],
+    "Rx Request": ["prescription request", "rx request", "refill", "request for records"],
+    "Referrals": ["referral", "referred by", "reason for referral", "referring"],
+    "Summaries": ["summary", "visit summary", "discharge", "assessment and plan"],
+}
+
+PAGES_PER_CHUNK = 25
+TOKEN_PATTERN = re.compile(r"[a-z0-9][a-z0-9'\-]*")
+PATIENT_NAME_PATTERN = re.compile(
+    r"(?i:patient(?:\s+name)?|name)\s*[:\-]\s*([A-Z][A-Za-z'\-]+),?\s+([A-Z][A-Za-z'\-]+)"
+)
+
+
+def load_keyword_rules(rules_path):
+    """Read keyword rules from a JSON object of {doc type: [keywords]}, or use the defaults.
+
+    Raises ValueError if the file is not such an object, names a doc type
+    that is not in pdf_processor.DOC_TYPE_DICTIONARY or has a keyword with no words."""
+    from pdf_processor import DOC_TYPE_DICTIONARY  # pdf_processor imports this module through page_boundaries
+
+    if not rules_path or not os.path.isfile(rules_path):
+        return DEFAULT_KEYWORD_RULES
+    with open(rules_path, encoding="utf-8") as rules_file:
+        rules = json.load(rules_file)
+    if not isinstance(rules, dict) or not all(
+            isinstance(keywords, list) and all(isinstance(keyword, str) for keyword in keywords)
+            for keywords in rules.values()):
+        raise ValueError(f"{rules_path} must hold a JSON object of {{doc type: [keywords]}}")
+    unknown = sorted(doc_type for doc_type in rules if doc_type not in DOC_TYPE_DICTIONARY)
+    if unknown:
+        raise ValueError(f"{rules_path} names unknown doc types: {', '.join(unknown)}")
+    empty = sorted(doc_type for doc_type, keywords in rules.items() if not all(tokenize(keyword) for keyword in keywords))
+    if empty:
+        raise ValueError(f"{rules_path} has keywords with no words for: {', '.join(empty)}")
+    return rules
+
+
+def tokenize(text):
+    return TOKEN_PATTERN.findall(text.lower())
+
+
+def _extract_chunk(document, page_numbers):
+    return [(page_number, document.load_page(page_number).get_text()) for page_number in page_numbers]
+
+
+def iter_page_texts(file_path, workers=None, cancelled=None, mp_context=None):
+    """Yield (page_number, text) for every page, in parallel, as chunks of pages finish.
+
+    Texts are cached per document (by content hash), so a document that was
+    already extracted is read back from the cache instead. cancelled is
+    checked as chunks finish, and mp_context sets how the worker processes
+    are started (see document_cache.map_page_chunks)."""
+    cache_path = os.path.join(get_document_cache_dir(file_path, "text"), "pages.json")
+    with span("load_text_cache"):
+        texts = read_cache(cache_path)
+    if texts is not None:
+        yield from enumerate(texts)
+        return
+
+    with fitz.open(file_path) as document:
+        total_pages = document.page_count
+    texts = [None] * total_pages
+    # Closing this generator early (e.g. another document was opened) drops the chunks not yet started.
+    for _, chunk_texts in map_page_chunks(file_path, total_pages, _extract_chunk, pages_per_chunk=PAGES_PER_CHUNK,
+                                          workers=workers, span_name="extract_text", mp_context=mp_context,
+                                          cancelled=cancelled):
+        for page_number, text in chunk_texts:
+            texts[page_number] = text
+            yield page_number, text
+    write_cache_atomically(cache_path, texts)
+
+
+class TextIndex:
+    """In-memory index of the words on each page, used to suggest a doc type and file name per page.
+
+    Keywords match whole words, and keywords of several words match only as
+    that phrase, so "dob" does not match "Dobson" and "prior auth" does not
+    match "prior" and "auth" far apart."""
+
+    def __init__(self, keyword_rules=None):
+        self.keyword_rules = {
+            doc_type: [tuple(tokenize(keyword)) for keyword in keywords]
+            for doc_type, keywords in (keyword_rules or DEFAULT_KEYWORD_RULES).items()
+        }
+        self.page_texts = {}
+        self.positions = {}  # page -> {word: [positions on the page]}
+        self.page_tokens = {}
+
+    def add_page(self, page_number, text):
+        tokens = tokenize(text)
+        positions = defaultdict(list)
+        for position, token in enumerate(tokens):
+            positions[token].append(position)
+        self.page_texts[page_number] = text
+        self.page_tokens[page_number] = tokens
+        self.positions[page_number] = positions
+
+    def count_phrase(self, page_number, phrase):
+        """How often the words of phrase (a tuple of tokens) appear on the page, in order and next to each other."""
+        positions = self.positions.get(page_number, {})
+        starts = positions.get(phrase[0], ())
+        if len(phrase) == 1:
+            return len(starts)
+        tokens = self.page_tokens[page_number]
+        return sum(tuple(tokens[start:start + len(phrase)]) == phrase for start in starts)
+
+    def suggest_doc_type(self, page_number):
+        """The doc type whose keywords appear most often on the page, or None."""
+        best_doc_type, best_score = None, 0
+        for doc_type, phrases in self.keyword_rules.items():
+            score = sum(self.count_phrase(page_number, phrase) for phrase in phrases if phrase)
+            if score > best_score:
+                best_doc_type, best_score = doc_type, score
+        return best_doc_type
+
+    def suggest_file_name(self, page_number):
+        """A file name made from the first two words of a patient name on the page
+        (e.g. "Name: Smith, John" gives "Smith_John"), or None."""
+        match = PATIENT_NAME_PATTERN.search(self.page_texts.get(page_number, ""))
+        if not match:
+            return None
+        return f"{match.group(1)}_{match.group(2)}"
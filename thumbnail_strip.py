@@ -0,0 +1,220 @@
+import logging
+import os
+import threading
+from collections import OrderedDict
+from concurrent.futures import CancelledError
+
+import fitz  # PyMuPDF
+from PyQt6.QtCore import QAbstractListModel, QModelIndex, QSize, Qt, QThread, QTimer, pyqtSignal
+from PyQt6.QtGui import QIcon, QImage, QPixmap
+from PyQt6.QtWidgets import QAbstractItemView, QListView
+
+from document_cache import get_document_cache_dir, write_cache_atomically
+from instrumentation import span
+
+logger = logging.getLogger(__name__)
+
+THUMBNAIL_WIDTH = 96
+# Thumbnails kept in memory at once; the rest go back to a placeholder and are
+# reloaded from the disk cache when scrolled back into view.
+MAX_LOADED_THUMBNAILS = 120
+
+
+class ThumbnailRenderer(QThread):
+    """Renders thumbnails off the GUI thread, reading and writing the on-disk cache."""
+    thumbnail_ready = pyqtSignal(int, QImage)
+
+    def __init__(self, file_path, parent=None):
+        super().__init__(parent)
+        self.file_path = file_path
+        self.cache_dir = None  # Found in run(), since it hashes the whole file
+        self._pending = []
+        self._condition = threading.Condition()
+        self._stopped = False
+
+    def request(self, page_numbers):
+        """Replace the pages waiting to be rendered with page_numbers, in that order."""
+        with self._condition:
+            self._pending = list(page_numbers)
+            self._condition.notify()
+
+    def stop(self):
+        """Stop rendering and wait for the thread, which at most finishes the step it is on."""
+        with self._condition:
+            self._stopped = True
+            self._condition.notify()
+        self.wait()
+
+    def run(self):
+        # The renderer has its own document so it never waits on the preview's.
+        try:
+            # Hashing a large file takes a while, so give up on it as soon as stop() is called.
+            self.cache_dir = get_document_cache_dir(self.file_path, "thumbnails", cancelled=lambda: self._stopped)
+            document = fitz.open(self.file_path)
+        except CancelledError:
+            return
+        except Exception:
+            logger.exception("Error opening %s for thumbnails", self.file_path)
+            return
+        try:
+            while True:
+                with self._condition:
+                    while not self._pending and not self._stopped:
+                        self._condition.wait()
+                    if self._stopped:
+                        return
+                    page_number = self._pending.pop(0)
+                try:
+                    with span("thumbnail", page=page_number):
+                        image = self.load_thumbnail(document, page_number)
+                    self.thumbnail_ready.emit(page_number, image)
+                except Exception:
+                    logger.exception("Error rendering thumbnail for page %d", page_number)
+        finally:
+            document.close()
+
+    def load_thumbnail(self, document, page_number):
+        cache_path = os.path.join(self.cache_dir, f"{page_number}_{THUMBNAIL_WIDTH}.png")
+        image = QImage()
+        if os.path.exists(cache_path) and image.load(cache_path):
+            return image
+
+        page = document.load_page(page_number)
+        zoom = THUMBNAIL_WIDTH / page.rect.width
+        png_data = page.get_pixmap(matrix=fitz.Matrix(zoom, zoom)).tobytes("png")
+        write_cache_atomically(cache_path, png_data)
+        image.loadFromData(png_data, "PNG")
+        return image
+
+
+class ThumbnailModel(QAbstractListModel):
+    """One row per page; only the thumbnails that have been rendered and not evicted are kept."""
+
+    def __init__(self, placeholder, parent=None):
+        super().__init__(parent)
+        self.placeholder = placeholder
+        self.page_count = 0
+        self.icons = OrderedDict()
+
+    def rowCount(self, parent=QModelIndex()):
+        return 0 if parent.isValid() else self.page_count
+
+    def data(self, index, role=Qt.ItemDataRole.DisplayRole):
+        if not index.isValid():
+            return None
+        if role == Qt.ItemDataRole.DisplayRole:
+            return str(index.row() + 1)
+        if role == Qt.ItemDataRole.DecorationRole:
+            return self.icons.get(index.row(), self.placeholder)
+        if role == Qt.ItemDataRole.TextAlignmentRole:
+            return Qt.AlignmentFlag.AlignHCenter
+        return None
+
+    def set_page_count(self, page_count):
+        self.beginResetModel()
+        self.page_count = page_count
+        self.icons.clear()
+        self.endResetModel()
+
+    def set_thumbnail(self, page_number, image, keep=()):
+        """Show image for page_number, then evict the least recently shown icons not in keep."""
+        self.icons[page_number] = QIcon(QPixmap.fromImage(image))
+        self.icons.move_to_end(page_number)
+        self.page_changed(page_number)
+        while len(self.icons) > MAX_LOADED_THUMBNAILS:
+            evicted = next((page for page in self.icons if page not in keep), None)
+            if evicted is None:
+                break
+            del self.icons[evicted]
+            self.page_changed(evicted)
+
+    def page_changed(self, page_number):
+        index = self.index(page_number)
+        self.dataChanged.emit(index, index, [Qt.ItemDataRole.DecorationRole])
+
+
+class ThumbnailStrip(QListView):
+    """Sidebar of page thumbnails that only renders the ones scrolled into view.
+
+    The view asks the model only for the rows it draws, so a document of any
+    length costs one placeholder plus at most MAX_LOADED_THUMBNAILS icons."""
+    page_selected = pyqtSignal(int)
+
+    def __init__(self, parent=None):
+        super().__init__(parent)
+        self.setViewMode(QListView.ViewMode.ListMode)
+        self.setFlow(QListView.Flow.TopToBottom)
+        self.setUniformItemSizes(True)
+        self.setIconSize(QSize(THUMBNAIL_WIDTH, int(THUMBNAIL_WIDTH * 1.3)))
+        self.setFixedWidth(THUMBNAIL_WIDTH + 40)
+        self.setVerticalScrollMode(QAbstractItemView.ScrollMode.ScrollPerPixel)
+        self.setHorizontalScrollBarPolicy(Qt.ScrollBarPolicy.ScrollBarAlwaysOff)
+        self.setEditTriggers(QAbstractItemView.EditTrigger.NoEditTriggers)
+
+        self.renderer = None
+        self.thumbnails = ThumbnailModel(QIcon(self.make_placeholder()), self)
+        self.setModel(self.thumbnails)
+
+        # Wait for scrolling to settle before asking for thumbnails.
+        self.visible_timer = QTimer(self)
+        self.visible_timer.setSingleShot(True)
+        self.visible_timer.setInterval(30)
+        self.visible_timer.timeout.connect(self.request_visible_thumbnails)
+        # valueChanged passes the scroll position, which must not become the timer interval.
+        self.verticalScrollBar().valueChanged.connect(lambda value: self.visible_timer.start())
+        self.clicked.connect(lambda index: self.page_selected.emit(index.row()))
+
+    def make_placeholder(self):
+        placeholder = QPixmap(self.iconSize())
+        placeholder.fill(Qt.GlobalColor.lightGray)
+        return placeholder
+
+    def set_document(self, file_path, total_pages):
+        """Show a placeholder row for each page of a newly opened document."""
+        self.close_document()
+        self.thumbnails.set_page_count(total_pages)
+        self.renderer = ThumbnailRenderer(file_path, self)
+        self.renderer.thumbnail_ready.connect(self.set_thumbnail)
+        self.renderer.start()
+        self.visible_timer.start()
+
+    def close_document(self):
+        if self.renderer is not None:
+            self.renderer.thumbnail_ready.disconnect(self.set_thumbnail)
+            self.renderer.stop()
+            self.renderer = None
+        self.thumbnails.set_page_count(0)
+
+    def set_current_page(self, page_number):
+        index = self.thumbnails.index(page_number)
+        if not index.isValid():
+            return
+        self.setCurrentIndex(index)
+        self.scrollTo(index, QAbstractItemView.ScrollHint.EnsureVisible)
+
+    def visible_rows(self):
+        viewport_rect = self.viewport().rect()
+        first = self.indexAt(viewport_rect.topLeft())
+        last = self.indexAt(viewport_rect.bottomLeft())
+        if not first.isValid():
+            return range(0)
+        last_row = last.row() if last.isValid() else self.thumbnails.rowCount() - 1
+        return range(first.row(), last_row + 1)
+
+    def request_visible_thumbnails(self):
+        if self.renderer is None:
+            return
+        rows = [row for row in self.visible_rows() if row not in self.thumbnails.icons]
+        self.renderer.request(rows)
+
+    def set_thumbnail(self, page_number, image):
+        # Ignore thumbnails still queued from a previously opened document.
+        if self.sender() is not self.renderer or page_number >= self.thumbnails.rowCount():
+            return
+        # Drop the least recently shown thumbnails that are out of view, so memory
+        # stays flat however long the document is.
+        self.thumbnails.set_thumbnail(page_number, image, keep=set(self.visible_rows()))
+
+    def resizeEvent(self, event):
+        super().resizeEvent(event)
+        self.visible_timer.start()
@@ -1,70 +1,51 @@
-# -*- coding: utf-8 -*-
+# Form implementation generated from reading ui file 'pdfProcessingWidget.ui'
+#
+# Created by: PyQt6 UI code generator 6.11.0
+#
+# WARNING: Any manual changes made to this file will be lost when pyuic6 is
+# run again.  Do not edit this file unless you know what you are doing.
 
-################################################################################
-## Form generated from reading UI file 'pdfProcessingWidget.ui'
-##
-## Created by: Qt User Interface Compiler version 6.8.0
-##
-## WARNING! All changes made in this file will be lost when recompiling UI file!
-################################################################################
 
-from PySide6.QtCore import (QCoreApplication, QDate, QDateTime, QLocale,
-    QMetaObject, QObject, QPoint, QRect,
-    QSize, QTime, QUrl, Qt)
-from PySide6.QtGui import (QBrush, QColor, QConicalGradient, QCursor,
-    QFont, QFontDatabase, QGradient, QIcon,
-    QImage, QKeySequence, QLinearGradient, QPainter,
-    QPalette, QPixmap, QRadialGradient, QTransform)
-from PySide6.QtWidgets import (QApplication, QComboBox, QGraphicsView, QHBoxLayout,
-    QLabel, QLineEdit, QPushButton, QSizePolicy,
-    QVBoxLayout, QWidget)
+from PyQt6 import QtCore, QtGui, QtWidgets
+
 
 class Ui_Form(object):
     def setupUi(self, Form):
-        if not Form.objectName():
-            Form.setObjectName(u"Form")
+        Form.setObjectName("Form")
         Form.resize(685, 663)
-        self.verticalLayoutWidget = QWidget(Form)
-        self.verticalLayoutWidget.setObjectName(u"verticalLayoutWidget")
-        self.verticalLayoutWidget.setGeometry(QRect(20, 0, 641, 641))
-        self.verticalLayout = QVBoxLayout(self.verticalLayoutWidget)
-        self.verticalLayout.setObjectName(u"verticalLayout")
+        self.verticalLayoutWidget = QtWidgets.QWidget(parent=Form)
+        self.verticalLayoutWidget.setGeometry(QtCore.QRect(20, 0, 641, 641))
+        self.verticalLayoutWidget.setObjectName("verticalLayoutWidget")
+        self.verticalLayout = QtWidgets.QVBoxLayout(self.verticalLayoutWidget)
         self.verticalLayout.setContentsMargins(0, 0, 0, 0)
-        self.graphicsView = QGraphicsView(self.verticalLayoutWidget)
-        self.graphicsView.setObjectName(u"graphicsView")
-
+        self.verticalLayout.setObjectName("verticalLayout")
+        self.graphicsView = QtWidgets.QGraphicsView(parent=self.verticalLayoutWidget)
+        self.graphicsView.setObjectName("graphicsView")
         self.verticalLayout.addWidget(self.graphicsView)
-
-        self.horizontalLayout_5 = QHBoxLayout()
-        self.horizontalLayout_5.setObjectName(u"horizontalLayout_5")
-        self.currentPageLabel = QLabel(self.verticalLayoutWidget)
-        self.currentPageLabel.setObjectName(u"currentPageLabel")
-        self.currentPageLabel.setAlignment(Qt.AlignmentFlag.AlignRight|Qt.AlignmentFlag.AlignTrailing|Qt.AlignmentFlag.AlignVCenter)
-
+        self.horizontalLayout_5 = QtWidgets.QHBoxLayout()
+        self.horizontalLayout_5.setObjectName("horizontalLayout_5")
+        self.currentPageLabel = QtWidgets.QLabel(parent=self.verticalLayoutWidget)
+        self.currentPageLabel.setAlignment(QtCore.Qt.AlignmentFlag.AlignRight|QtCore.Qt.AlignmentFlag.AlignTrailing|QtCore.Qt.AlignmentFlag.AlignVCenter)
+        self.currentPageLabel.setObjectName("currentPageLabel")
         self.horizontalLayout_5.addWidget(self.currentPageLabel)
-
-        self.currentPageLineEdit = QLineEdit(self.verticalLayoutWidget)
-        self.currentPageLineEdit.setObjectName(u"currentPageLineEdit")
-        self.currentPageLineEdit.setMaximumSize(QSize(40, 16777215))
-
+        self.currentPageLineEdit = QtWidgets.QLineEdit(parent=self.verticalLayoutWidget)
+        self.currentPageLineEdit.setMaximumSize(QtCore.QSize(40, 16777215))
+        self.currentPageLineEdit.setInputMask("")
+        self.currentPageLineEdit.setObjectName("currentPageLineEdit")
         self.horizontalLayout_5.addWidget(self.currentPageLineEdit)
-
-        self.totalPagesLabel = QLabel(self.verticalLayoutWidget)
-        self.totalPagesLabel.setObjectName(u"totalPagesLabel")
-
+        self.totalPagesLabel = QtWidgets.QLabel(parent=self.verticalLayoutWidget)
+        self.totalPagesLabel.setText("")
+        self.totalPagesLabel.setObjectName("totalPagesLabel")
         self.horizontalLayout_5.addWidget(self.totalPagesLabel)
-
-
         self.verticalLayout.addLayout(self.horizontalLayout_5)
-
-        self.horizontalLayout_2 = QHBoxLayout()
-        self.horizontalLayout_2.setObjectName(u"horizontalLayout_2")
-        self.fileNameLineEdit = QLineEdit(self.verticalLayoutWidget)
-        self.fileNameLineEdit.setObjectName(u"fileNameLineEdit")
-
+        self.horizontalLayout_2 = QtWidgets.QHBoxLayout()
+        self.horizontalLayout_2.setObjectName("horizontalLayout_2")
+        self.fileNameLineEdit = QtWidgets.QLineEdit(parent=self.verticalLayoutWidget)
+        self.fileNameLineEdit.setObjectName("fileNameLineEdit")
         self.horizontalLayout_2.addWidget(self.fileNameLineEdit)
-
-        self.docTypeDropdownBox = QComboBox(self.verticalLayoutWidget)
+        self.docTypeDropdownBox = QtWidgets.QComboBox(parent=self.verticalLayoutWidget)
+        self.docTypeDropdownBox.setMinimumSize(QtCore.QSize(100, 0))
+        self.docTypeDropdownBox.setObjectName("docTypeDropdownBox")
         self.docTypeDropdownBox.addItem("")
         self.docTypeDropdownBox.addItem("")
         self.docTypeDropdownBox.addItem("")
@@ -74,75 +55,49 @@ class Ui_Form(object):
         self.docTypeDropdownBox.addItem("")
         self.docTypeDropdownBox.addItem("")
         self.docTypeDropdownBox.addItem("")
-        self.docTypeDropdownBox.setObjectName(u"docTypeDropdownBox")
-        self.docTypeDropdownBox.setMinimumSize(QSize(100, 0))
-
         self.horizontalLayout_2.addWidget(self.docTypeDropdownBox)
-
-
         self.verticalLayout.addLayout(self.horizontalLayout_2)
-
-        self.horizontalLayout = QHBoxLayout()
-        self.horizontalLayout.setObjectName(u"horizontalLayout")
-        self.prevPageButton = QPushButton(self.verticalLayoutWidget)
-        self.prevPageButton.setObjectName(u"prevPageButton")
-
+        self.horizontalLayout = QtWidgets.QHBoxLayout()
+        self.horizontalLayout.setObjectName("horizontalLayout")
+        self.prevPageButton = QtWidgets.QPushButton(parent=self.verticalLayoutWidget)
+        self.prevPageButton.setObjectName("prevPageButton")
         self.horizontalLayout.addWidget(self.prevPageButton)
-
-        self.saveButton = QPushButton(self.verticalLayoutWidget)
-        self.saveButton.setObjectName(u"saveButton")
-
+        self.saveButton = QtWidgets.QPushButton(parent=self.verticalLayoutWidget)
+        self.saveButton.setObjectName("saveButton")
         self.horizontalLayout.addWidget(self.saveButton)
-
-        self.nextPageButton = QPushButton(self.verticalLayoutWidget)
-        self.nextPageButton.setObjectName(u"nextPageButton")
-
+        self.nextPageButton = QtWidgets.QPushButton(parent=self.verticalLayoutWidget)
+        self.nextPageButton.setObjectName("nextPageButton")
         self.horizontalLayout.addWidget(self.nextPageButton)
-
-
         self.verticalLayout.addLayout(self.horizontalLayout)
-
-        self.horizontalLayout_3 = QHBoxLayout()
-        self.horizontalLayout_3.setObjectName(u"horizontalLayout_3")
-        self.clearAllButton = QPushButton(self.verticalLayoutWidget)
-        self.clearAllButton.setObjectName(u"clearAllButton")
-
+        self.horizontalLayout_3 = QtWidgets.QHBoxLayout()
+        self.horizontalLayout_3.setObjectName("horizontalLayout_3")
+        self.clearAllButton = QtWidgets.QPushButton(parent=self.verticalLayoutWidget)
+        self.clearAllButton.setObjectName("clearAllButton")
         self.horizontalLayout_3.addWidget(self.clearAllButton)
-
-        self.saveAllPagesButton = QPushButton(self.verticalLayoutWidget)
-        self.saveAllPagesButton.setObjectName(u"saveAllPagesButton")
-
+        self.saveAllPagesButton = QtWidgets.QPushButton(parent=self.verticalLayoutWidget)
+        self.saveAllPagesButton.setObjectName("saveAllPagesButton")
         self.horizontalLayout_3.addWidget(self.saveAllPagesButton)
-
-
         self.verticalLayout.addLayout(self.horizontalLayout_3)
 
-
         self.retranslateUi(Form)
-
-        QMetaObject.connectSlotsByName(Form)
-    # setupUi
+        QtCore.QMetaObject.connectSlotsByName(Form)
 
     def retranslateUi(self, Form):
-        Form.setWindowTitle(QCoreApplication.translate("Form", u"Form", None))
-        self.currentPageLabel.setText(QCoreApplication.translate("Form", u"Current Page: ", None))
-        self.currentPageLineEdit.setInputMask("")
-        self.totalPagesLabel.setText("")
-        self.fileNameLineEdit.setText(QCoreApplication.translate("Form", u"Enter file name", None))
-        self.docTypeDropdownBox.setItemText(0, QCoreApplication.translate("Form", u"Choose file type", None))
-        self.docTypeDropdownBox.setItemText(1, QCoreApplication.translate("Form", u"Insurance Auth", None))
-        self.docTypeDropdownBox.setItemText(2, QCoreApplication.translate("Form", u"ID", None))
-        self.docTypeDropdownBox.setItemText(3, QCoreApplication.translate("Form", u"OrthoK", None))
-        self.docTypeDropdownBox.setItemText(4, QCoreApplication.translate("Form", u"Outside Rx", None))
-        self.docTypeDropdownBox.setItemText(5, QCoreApplication.translate("Form", u"POF Waiver", None))
-        self.docTypeDropdownBox.setItemText(6, QCoreApplication.translate("Form", u"Rx Request", None))
-        self.docTypeDropdownBox.setItemText(7, QCoreApplication.translate("Form", u"Referrals", None))
-        self.docTypeDropdownBox.setItemText(8, QCoreApplication.translate("Form", u"Summaries", None))
-
-        self.prevPageButton.setText(QCoreApplication.translate("Form", u"Previous Page", None))
-        self.saveButton.setText(QCoreApplication.translate("Form", u"Save Page as PDF", None))
-        self.nextPageButton.setText(QCoreApplication.translate("Form", u"Next Page", None))
-        self.clearAllButton.setText(QCoreApplication.translate("Form", u"Clear All", None))
-        self.saveAllPagesButton.setText(QCoreApplication.translate("Form", u"Save All Pages", None))
-    # retranslateUi
-
+        _translate = QtCore.QCoreApplication.translate
+        Form.setWindowTitle(_translate("Form", "Form"))
+        self.currentPageLabel.setText(_translate("Form", "Current Page: "))
+        self.fileNameLineEdit.setText(_translate("Form", "Enter file name"))
+        self.docTypeDropdownBox.setItemText(0, _translate("Form", "Choose file type"))
+        self.docTypeDropdownBox.setItemText(1, _translate("Form", "Insurance Auth"))
+        self.docTypeDropdownBox.setItemText(2, _translate("Form", "ID"))
+        self.docTypeDropdownBox.setItemText(3, _translate("Form", "OrthoK"))
+        self.docTypeDropdownBox.setItemText(4, _translate("Form", "Outside Rx"))
+        self.docTypeDropdownBox.setItemText(5, _translate("Form", "POF Waiver"))
+        self.docTypeDropdownBox.setItemText(6, _translate("Form", "Rx Request"))
+        self.docTypeDropdownBox.setItemText(7, _translate("Form", "Referrals"))
+        self.docTypeDropdownBox.setItemText(8, _translate("Form", "Summaries"))
+        self.prevPageButton.setText(_translate("Form", "Previous Page"))
+        self.saveButton.setText(_translate("Form", "Save Page as PDF"))
+        self.nextPageButton.setText(_translate("Form", "Next Page"))
+        self.clearAllButton.setText(_translate("Form", "Clear All"))
+        self.saveAllPagesButton.setText(_translate("Form", "Save All Pages"))